@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client.__main__
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Command line utilities of the client library, i.e.
+
+    .. code-block:: bash
+
+        $ python -m datagator.api.client cache export <archive>
+        $ python -m datagator.api.client cache import <archive>
+        $ python -m datagator.api.client cache seed <repo> <directory>
+        $ python -m datagator.api.client cache daemon
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/23
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import importlib
+import logging
+import optparse
+import sys
+
+from . import environ
+from ._cache.archive import export_cache, import_cache, seed_cache
+from ._cache.daemon import CacheDaemon
+from ._cache.policy import EvictionPolicy
+from ._compat import to_native
+from ._entity import Entity
+
+
+__all__ = ['main', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger("datagator.api.client")
+
+
+# persistent backend shared by the cache daemon
+DAEMON_BACKEND = "datagator.api.client._cache.leveldb.PersistentLevelDbCache"
+
+
+def serve(path, backend):
+    """
+    Run the cache daemon with ``backend`` (bounded by the budgets of the
+    environment) until interrupted.
+    """
+    mod, sep, cls = backend.rpartition(".")
+    store = getattr(importlib.import_module(mod), cls)()
+    if environ.DATAGATOR_CACHE_MAX_BYTES > 0 or \
+            environ.DATAGATOR_CACHE_MAX_ENTRIES > 0 or \
+            environ.DATAGATOR_CACHE_TTL > 0:
+        store = EvictionPolicy(
+            store,
+            max_bytes=environ.DATAGATOR_CACHE_MAX_BYTES,
+            max_entries=environ.DATAGATOR_CACHE_MAX_ENTRIES,
+            ttl=environ.DATAGATOR_CACHE_TTL,
+            order=environ.DATAGATOR_CACHE_EVICTION)
+    try:
+        server = CacheDaemon(store, path)
+    except (IOError, OSError, ) as e:
+        _log.error(e)
+        return 1
+    _log.info("serving cache at '{0}'".format(server.path))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if isinstance(store, EvictionPolicy):
+            store.flush()
+    return 0
+
+
+USAGE = """%prog cache export <archive>
+       %prog cache import [--keep] <archive>
+       %prog cache seed [--rev <rev>] <repo> <path>
+       %prog cache daemon [--socket <path>] [--backend <class>]"""
+
+# number of positional arguments of each cache action
+ACTIONS = {
+    "export": 1,
+    "import": 1,
+    "seed": 2,
+    "daemon": 0, }
+
+
+def main(argv=None):
+
+    # python 2.6 ships without `argparse`, thus `optparse` with positional
+    # arguments (i.e. command and action) checked by hand
+    parser = optparse.OptionParser(
+        prog="python -m datagator.api.client", usage=USAGE,
+        description="utilities of the DataGator client library, i.e. "
+                    "managing the local cache ({0})".format(
+                        environ.DATAGATOR_CACHE_BACKEND))
+    parser.add_option("--keep", action="store_true", default=False,
+                      help="import: keep entities already in the cache")
+    parser.add_option("--rev", type="int", default=1,
+                      help="seed: revision of the datasets (default: 1)")
+    parser.add_option("--socket", default=environ.DATAGATOR_CACHE_SOCKET,
+                      help="daemon: path of the Unix domain socket "
+                           "(default: %default)")
+    parser.add_option("--backend", default=DAEMON_BACKEND,
+                      help="daemon: cache manager backend "
+                           "(default: %default)")
+
+    opts, args = parser.parse_args(argv)
+    if len(args) < 2 or args[0] != "cache" or args[1] not in ACTIONS or \
+            len(args) != ACTIONS[args[1]] + 2:
+        parser.print_help()
+        return 2
+    action, args = args[1], args[2:]
+
+    logging.basicConfig(level=logging.DEBUG if environ.DEBUG else
+                        logging.INFO)
+
+    if action == "daemon":
+        return serve(opts.socket, opts.backend)
+
+    store = Entity.store
+    if not store.persistent and action != "export":
+        _log.warning("cache backend is not persistent, loaded entities "
+                     "will be discarded upon exit")
+
+    try:
+        if action == "export":
+            count = export_cache(store, args[0])
+        elif action == "import":
+            count = import_cache(store, args[0], not opts.keep)
+        else:
+            count = seed_cache(store, args[1], args[0], opts.rev)
+    except NotImplementedError:
+        _log.error("cache backend does not support enumerating entities")
+        return 1
+    except (AssertionError, IOError, OSError, ) as e:
+        _log.error(e)
+        return 1
+
+    print(count)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client._aio
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Implementation of :mod:`datagator.api.client.aio`, which bears syntax of
+    Python 3.6+ (i.e. asynchronous generators and comprehensions).
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/19
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import asyncio
+import logging
+
+from ._backend.aio import AsyncDataGatorService
+from ._compat import to_native
+from ._entity import Entity
+
+
+__all__ = ['fetch', 'fetch_many', 'getdataset', 'getitem', 'iter_repo',
+           'patch', 'service', 'walk', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger(__name__)
+
+
+_service = None
+
+
+def service():
+    """
+    Awaitable service shared by all entities, which shares authentication
+    (and rate limit) with ``Entity.service``, but holds its own HTTP session.
+    """
+    global _service
+    if _service is None:
+        _service = AsyncDataGatorService(Entity.service)
+    return _service
+
+
+async def fetch(entity):
+    """
+    Awaitable counterpart of ``entity.cache``.
+    """
+    # the cache getter blocks on both the backend service and the local cache
+    # manager, run it as a whole on the (bounded) worker pool of the service,
+    # and request through its (equally bounded) connection pool
+    return await service().run(entity._cache_getter, service().service)
+
+
+async def fetch_many(entities):
+    """
+    Fetch multiple entities concurrently, returns their JSON-decoded
+    contents in the same order as ``entities``.
+    """
+    return await asyncio.gather(*[fetch(e) for e in entities])
+
+
+async def iter_repo(repo):
+    """
+    Awaitable counterpart of ``iter(repo)``, yields dataset names.
+    """
+    data = await fetch(repo)
+    for ref in data.get("items", []):
+        yield ref.get("name")
+    pass
+
+
+async def getitem(dataset, key):
+    """
+    Awaitable counterpart of ``dataset[key]``, returns the data item with
+    its content fetched.
+    """
+    item = await service().run(dataset.__getitem__, key)
+    await fetch(item)
+    return item
+
+
+async def getdataset(repo, name):
+    """
+    Awaitable counterpart of ``repo[name]``, returns the latest revision of
+    the dataset with its content fetched.
+    """
+    return await service().run(repo._dataset, name, service().service)
+
+
+async def patch(dataset, changes):
+    """
+    Awaitable counterpart of ``dataset.patch(changes)``.
+    """
+    return await service().run(dataset.patch, changes, service().service)
+
+
+async def walk(repo):
+    """
+    Fetch all datasets of ``repo`` and all of their data items concurrently,
+    returns a `list` of the (fetched) datasets.
+    """
+    names = [name async for name in iter_repo(repo)]
+    datasets = await asyncio.gather(*[
+        getdataset(repo, name) for name in names])
+    await asyncio.gather(*[
+        getitem(ds, key) for ds in datasets for key in ds])
+    return datasets
@@ -16,8 +16,10 @@
 
 from __future__ import unicode_literals
 
+from .metrics import RequestMetrics
+from .ratelimit import RateLimitGovernor
 from .service import DataGatorService
 from .._compat import to_native
 
-__all__ = ['DataGatorService', ]
+__all__ = ['DataGatorService', 'RateLimitGovernor', 'RequestMetrics', ]
 __all__ = [to_native(n) for n in __all__]
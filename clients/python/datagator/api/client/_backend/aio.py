@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client._backend.aio
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    `asyncio`-native front-end of :class:`DataGatorService` (Python 3.6+).
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/19
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import asyncio
+import functools
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from .service import DataGatorService, TLSv1Adapter
+from .._compat import to_native
+
+
+__all__ = ['AsyncDataGatorService', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger(__package__)
+
+
+class AsyncDataGatorService(object):
+    """
+    Awaitable HTTP client for DataGator's backend services.
+
+    Blocking requests are issued through a :class:`DataGatorService` of its
+    own, and off-loaded to a bounded pool of worker threads, whose size
+    matches the number of keep-alive connections of the underlying HTTP
+    session, so that at most ``pool_size`` requests are in flight at any
+    moment.
+    """
+
+    DEFAULT_POOL_SIZE = 16
+
+    __slots__ = ['__service', '__executor', '__loop', ]
+
+    def __init__(self, service=None, pool_size=DEFAULT_POOL_SIZE):
+        """
+        Optional arguments:
+
+        :param service: blocking :class:`DataGatorService` whose credentials,
+            SSL verification, rate-limit governor and hooks are shared (but
+            not its HTTP session, i.e. ``Entity.service`` is left intact).
+        :param pool_size: maximal number of concurrent requests.
+        """
+        if service is not None:
+            self.__service = DataGatorService(
+                service.auth, service.http.verify, service.http.governor,
+                service.http.request_hooks)
+        else:
+            self.__service = DataGatorService()
+
+        # block (instead of discarding connections) when the pool is drained,
+        # the executor already bounds concurrency, this is merely a safe-guard
+        for prefix, Adapter in (('https://', TLSv1Adapter),
+                                ('http://', HTTPAdapter)):
+            self.http.mount(prefix, Adapter(
+                pool_connections=pool_size, pool_maxsize=pool_size,
+                pool_block=True))
+
+        self.__executor = ThreadPoolExecutor(max_workers=pool_size)
+
+        # python 3.6 lacks `asyncio.get_running_loop()`, thus the loop at the
+        # time of construction is used for running blocking calls
+        self.__loop = asyncio.get_event_loop() \
+            if not hasattr(asyncio, "get_running_loop") else None
+
+        super(AsyncDataGatorService, self).__init__()
+        pass
+
+    @property
+    def service(self):
+        """
+        underlying blocking service (:class:`DataGatorService`)
+        """
+        return self.__service
+
+    @property
+    def http(self):
+        """
+        underlying HTTP session (:class:`requests.Session`)
+        """
+        return self.service.http
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking callable on the worker pool of this service, i.e. for
+        consuming a streamed response body.
+        """
+        loop = self.__loop or asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.__executor, functools.partial(func, *args, **kwargs))
+
+    async def delete(self, path, headers={}):
+        return await self.run(self.service.delete, path, dict(headers))
+
+    async def get(self, path, headers={}, stream=False, **kwargs):
+        return await self.run(
+            self.service.get, path, dict(headers), stream, **kwargs)
+
+    async def head(self, path, headers={}):
+        return await self.run(self.service.head, path, dict(headers))
+
+    async def patch(self, path, data, headers={}):
+        return await self.run(self.service.patch, path, data, dict(headers))
+
+    async def post(self, path, data, files={}, headers={}):
+        return await self.run(
+            self.service.post, path, data, files, dict(headers))
+
+    async def put(self, path, data, headers={}):
+        return await self.run(self.service.put, path, data, dict(headers))
+
+    def close(self):
+        """
+        wait for pending requests and release the worker pool
+        """
+        self.__executor.shutdown(wait=True)
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, ext_type, exc_value, traceback):
+        self.close()
+        return False  # re-raise exception
+
+    pass
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client._backend.metrics
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/20
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import copy
+import logging
+
+from .. import environ
+from .._compat import to_native, _thread
+
+try:
+    # python 3
+    from urllib.parse import urlparse
+except ImportError:
+    # python 2
+    from urlparse import urlparse
+
+
+__all__ = ['RequestMetrics', 'uri_template', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger(__package__)
+
+
+def uri_template(url):
+    """
+    Template of the request URI with entity names replaced by placeholders,
+    e.g. ``repo/{repo}/{dataset}/{item}``.
+    """
+    path = urlparse(url).path
+    _, _, prefix = environ.DATAGATOR_API_URL.partition("://")
+    _, _, prefix = prefix.partition("/")
+    path = path.lstrip("/")
+    if path.startswith(prefix):
+        path = path[len(prefix):]
+    segments = [s for s in path.split("/") if s]
+    if not segments:
+        return "/"
+    if segments[0] == "repo":
+        names = ["{repo}", "{dataset}", "{item}"]
+    else:
+        names = []
+    names += ["{id}"] * (len(segments) - 1 - len(names))
+    return "/".join(segments[:1] + names[:len(segments) - 1])
+
+
+class RequestMetrics(object):
+    """
+    Request hook of :class:`DataGatorService` aggregating per method and URI
+    template the count, latency histogram, time to first byte, bytes
+    transferred and status codes of all requests.
+
+    Latency of a streamed request covers reading the response body, which
+    is reported once read through (or closed), and bytes are those of the
+    body actually read (after content decoding).
+    """
+
+    BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+               60.0, float("inf"), )
+
+    __slots__ = ['__lock', '__stats', ]
+
+    def __init__(self):
+        super(RequestMetrics, self).__init__()
+        self.__lock = _thread.allocate_lock()
+        self.__stats = {}
+        pass
+
+    def __call__(self, method, url, response, elapsed):
+        """
+        :param method: HTTP method of the request.
+        :param url: URL of the request.
+        :param response: response object, or ``None`` if request failed.
+        :param elapsed: wall time of the request in seconds.
+        """
+        key = "{0} {1}".format(method, uri_template(url))
+        ttfb = nbytes = 0
+        status = "error"
+        if response is not None:
+            status = "{0}".format(response.status_code)
+            ttfb = response.elapsed.total_seconds()
+            nbytes = getattr(response, "body_size", 0)
+        with self.__lock:
+            stats = self.__stats.get(key, None)
+            if stats is None:
+                stats = self.__stats[key] = {
+                    "count": 0,
+                    "latency": {
+                        "sum": 0.0,
+                        "buckets": [0] * len(RequestMetrics.BUCKETS), },
+                    "ttfb": {"sum": 0.0, "max": 0.0, },
+                    "bytes": 0,
+                    "status": {}, }
+            stats['count'] += 1
+            stats['latency']['sum'] += elapsed
+            for i, bound in enumerate(RequestMetrics.BUCKETS):
+                if elapsed <= bound:
+                    stats['latency']['buckets'][i] += 1
+                    break
+            stats['ttfb']['sum'] += ttfb
+            stats['ttfb']['max'] = max(stats['ttfb']['max'], ttfb)
+            stats['bytes'] += nbytes
+            stats['status'][status] = stats['status'].get(status, 0) + 1
+        pass
+
+    def reset(self):
+        with self.__lock:
+            self.__stats = {}
+        pass
+
+    def snapshot(self):
+        """
+        ``dict`` of metrics keyed by ``"<method> <uri template>"``, latency
+        histogram buckets are listed in the order of :attr:`BUCKETS` (not
+        cumulative).
+        """
+        with self.__lock:
+            return copy.deepcopy(self.__stats)
+        pass
+
+    def prometheus(self, prefix="datagator_client"):
+        """
+        metrics in the text exposition format of Prometheus
+        """
+        def labels(key, **extra):
+            method, _, uri = key.partition(" ")
+            pairs = [("method", method), ("uri", uri)] + sorted(extra.items())
+            return "{{{0}}}".format(",".join([
+                '{0}="{1}"'.format(k, v.replace("\\", "\\\\").replace(
+                    '"', '\\"')) for k, v in pairs]))
+
+        stats = self.snapshot()
+        lines = []
+
+        lines.append("# TYPE {0}_requests_total counter".format(prefix))
+        for key in sorted(stats):
+            for status, n in sorted(stats[key]['status'].items()):
+                lines.append("{0}_requests_total{1} {2}".format(
+                    prefix, labels(key, status=status), n))
+
+        lines.append("# TYPE {0}_request_seconds histogram".format(prefix))
+        for key in sorted(stats):
+            cumulative = 0
+            for bound, n in zip(RequestMetrics.BUCKETS,
+                                stats[key]['latency']['buckets']):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append("{0}_request_seconds_bucket{1} {2}".format(
+                    prefix, labels(key, le=le), cumulative))
+            lines.append("{0}_request_seconds_sum{1} {2!r}".format(
+                prefix, labels(key), stats[key]['latency']['sum']))
+            lines.append("{0}_request_seconds_count{1} {2}".format(
+                prefix, labels(key), stats[key]['count']))
+
+        lines.append("# TYPE {0}_ttfb_seconds summary".format(prefix))
+        for key in sorted(stats):
+            lines.append("{0}_ttfb_seconds_sum{1} {2!r}".format(
+                prefix, labels(key), stats[key]['ttfb']['sum']))
+            lines.append("{0}_ttfb_seconds_count{1} {2}".format(
+                prefix, labels(key),
+                stats[key]['count'] - stats[key]['status'].get("error", 0)))
+
+        lines.append("# TYPE {0}_response_bytes_total counter".format(prefix))
+        for key in sorted(stats):
+            lines.append("{0}_response_bytes_total{1} {2}".format(
+                prefix, labels(key), stats[key]['bytes']))
+
+        return "\n".join(lines) + "\n"
+
+    pass
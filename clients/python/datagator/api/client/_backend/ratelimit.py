@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client._backend.ratelimit
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/19
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import logging
+import time
+
+from .._compat import to_native, _thread
+
+
+__all__ = ['RateLimitGovernor', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger(__package__)
+
+
+class RateLimitGovernor(object):
+    """
+    Token bucket pacing outgoing requests with the ``X-RateLimit-*`` headers
+    of the backend service, such that the remaining budget of requests lasts
+    until the rate limit is reset.
+
+    The bucket holds at most ``min(burst, remaining)`` tokens, and is refilled
+    at the rate of ``remaining / (reset - now)`` tokens per second, such that
+    requests are held back until ``reset`` once the budget is exhausted.
+    Budget is shared by all threads acquiring tokens from the same governor.
+    """
+
+    DEFAULT_BURST = 64
+
+    __slots__ = ['__lock', '__burst', '__tokens', '__stamp', '__limit',
+                 '__remaining', '__reset', ]
+
+    def __init__(self, burst=DEFAULT_BURST):
+        """
+        Optional arguments:
+
+        :param burst: maximal number of requests to be sent without pacing.
+        """
+        super(RateLimitGovernor, self).__init__()
+        self.__lock = _thread.allocate_lock()
+        self.__burst = float(max(1, burst))
+        self.__tokens = self.__burst
+        self.__stamp = time.time()
+        self.__limit = None
+        self.__remaining = None
+        self.__reset = None
+        pass
+
+    @property
+    def status(self):
+        """
+        ``dict`` of the rate limit (``limit``), the remaining budget of
+        requests (``remaining``) and the time (UNIX epoch) when the budget
+        is reset (``reset``), or ``None`` if not reported by the backend.
+        """
+        with self.__lock:
+            return {
+                "limit": self.__limit,
+                "remaining": self.__remaining,
+                "reset": self.__reset, }
+        pass
+
+    def _refill(self, now):
+        # budget is fully restored (though yet unknown) after reset, so stop
+        # pacing until the backend reports the new budget
+        if self.__reset is None or now >= self.__reset:
+            self.__tokens = self.__burst
+        else:
+            rate = float(self.__remaining) / (self.__reset - now)
+            self.__tokens = min(
+                self.__burst, self.__remaining,
+                self.__tokens + rate * (now - self.__stamp))
+        self.__stamp = now
+        pass
+
+    def acquire(self, blocking=True):
+        """
+        Block until a request can be sent without exhausting the budget, i.e.
+        until the budget is reset once no request remains.
+
+        Optional arguments:
+
+        :param blocking: if ``False``, return immediately instead of waiting.
+        :returns: ``True`` if a request can be sent, ``False`` otherwise.
+        """
+        while True:
+            with self.__lock:
+                now = time.time()
+                self._refill(now)
+                if self.__tokens >= 1.0:
+                    self.__tokens -= 1.0
+                    if self.__remaining is not None and \
+                            self.__reset is not None and now < self.__reset:
+                        # track local consumption until the backend reports
+                        self.__remaining = max(0, self.__remaining - 1)
+                    return True
+                if not blocking:
+                    return False
+                # wait for the next token, or the reset of the budget
+                if self.__remaining > 0:
+                    rate = float(self.__remaining) / (self.__reset - now)
+                    delay = min((1.0 - self.__tokens) / rate,
+                                self.__reset - now)
+                else:
+                    delay = self.__reset - now
+            _log.debug("pacing request for {0:.3f} sec".format(delay))
+            time.sleep(max(0.0, delay))
+        pass
+
+    def update(self, headers):
+        """
+        Synchronize budget with the ``X-RateLimit-*`` headers of a response.
+        """
+        try:
+            limit = int(headers['X-RateLimit-Limit'])
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset = int(headers['X-RateLimit-Reset'])
+        except (KeyError, ValueError, TypeError):
+            return
+        with self.__lock:
+            self._refill(time.time())
+            self.__limit = limit
+            self.__remaining = max(0, remaining)
+            self.__reset = reset
+            # never grant more requests than the backend has left
+            if time.time() < reset:
+                self.__tokens = min(self.__tokens, self.__remaining)
+        pass
+
+    pass
@@ -13,14 +13,16 @@
 from __future__ import unicode_literals, with_statement
 
 import io
-import json
 import logging
 import os
 import requests
 import ssl
+import time
 
 from .. import environ
-from .._compat import to_bytes, to_native
+from .._compat import json_dumps, to_native, _thread
+from .metrics import RequestMetrics
+from .ratelimit import RateLimitGovernor
 
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.poolmanager import PoolManager
@@ -47,6 +49,90 @@ class TLSv1Adapter(HTTPAdapter):
     pass
 
 
+class GovernedSession(requests.Session):
+    """
+    HTTP session pacing requests with a :class:`RateLimitGovernor`, and
+    reporting each request to a list of hooks (see :class:`RequestMetrics`)
+    upon completion, i.e. once the response body is read through (or the
+    response is closed) for a streamed request, with the size of the body
+    read so far (after content decoding) as ``response.body_size``
+    """
+
+    def __init__(self, governor=None, hooks=None):
+        super(GovernedSession, self).__init__()
+        self.governor = governor
+        self.request_hooks = list(hooks or [])
+        pass
+
+    def request(self, method, url, *args, **kwargs):
+        if self.governor is not None:
+            self.governor.acquire()
+        start = time.time()
+        try:
+            r = super(GovernedSession, self).request(
+                method, url, *args, **kwargs)
+        except:
+            self._report(method, url, None, start)
+            raise
+        if self.governor is not None:
+            self.governor.update(r.headers)
+        stream = kwargs.get("stream", False)
+        r.body_size = 0 if stream else len(r.content or b"")
+        if stream and self.request_hooks:
+            self._report_on_close(method, url, r, start)
+        else:
+            self._report(method, url, r, start)
+        return r
+
+    def _report(self, method, url, r, start):
+        elapsed = time.time() - start
+        for hook in self.request_hooks:
+            try:
+                hook(method, url, r, elapsed)
+            except Exception as e:
+                _log.warning("failed request hook: {0}".format(e))
+        pass
+
+    def _report_on_close(self, method, url, r, start):
+        """
+        Defer reporting a streamed request until its body is read through via
+        ``iter_content()`` (which also backs ``content`` and ``json()``), or
+        the response is closed, whichever comes first.
+        """
+        iter_content, close = r.iter_content, r.close
+        lock = _thread.allocate_lock()
+        reported = []
+
+        def report():
+            with lock:
+                if reported:
+                    return
+                reported.append(True)
+                # restore the methods of the response (i.e. break the cycle)
+                del r.iter_content, r.close
+            self._report(method, url, r, start)
+            pass
+
+        def iter_content_then_report(*args, **kwargs):
+            for chunk in iter_content(*args, **kwargs):
+                r.body_size += len(chunk)
+                yield chunk
+            report()
+            pass
+
+        def close_then_report():
+            try:
+                close()
+            finally:
+                report()
+            pass
+
+        r.iter_content, r.close = iter_content_then_report, close_then_report
+        pass
+
+    pass
+
+
 def safe_url(path):
 
     request_uri = path
@@ -71,7 +157,7 @@ def safe_url(path):
 def make_payload(data):
     if hasattr(data, "read"):
         return data
-    return to_bytes(json.dumps(data))
+    return json_dumps(data)
 
 
 class DataGatorService(object):
@@ -79,9 +165,14 @@ class DataGatorService(object):
     HTTP client for DataGator's backend services.
     """
 
+    # rate limit is imposed per user (or client address) by the backend, so
+    # all service instances within the process share one governor by default
+    governor = RateLimitGovernor()
+
     __slots__ = ['__http', ]
 
-    def __init__(self, auth=None, verify=not environ.DEBUG):
+    def __init__(self, auth=None, verify=not environ.DEBUG,
+                 governor=governor, hooks=None):
         """
         Optional arguments:
 
@@ -89,9 +180,16 @@ class DataGatorService(object):
             in HTTP basic authentication, defaults to ``None``.
         :param verify: perform SSL verification, defaults to ``False`` in
             debugging mode and ``True`` otherwise.
+        :param governor: :class:`RateLimitGovernor` for pacing requests,
+            defaults to the one shared by all services, or ``None`` to send
+            requests without pacing.
+        :param hooks: ``list`` of callables to be invoked upon completion of
+            each request as ``hook(method, url, response, elapsed)``, where
+            ``response`` is ``None`` if the request failed, i.e. an instance
+            of :class:`RequestMetrics`.
         """
 
-        self.__http = requests.Session()
+        self.__http = GovernedSession(governor, hooks)
 
         # force TLSv1, this resolves SSL error (EOF occurred in violation of
         # protocol), see http://stackoverflow.com/questions/14102416/
@@ -233,6 +331,32 @@ class DataGatorService(object):
             headers=headers)
         return r
 
+    @property
+    def hooks(self):
+        """
+        ``list`` of request hooks (mutable)
+        """
+        return self.http.request_hooks
+
+    @property
+    def metrics(self):
+        """
+        snapshot of the first :class:`RequestMetrics` hook, if any
+        """
+        for hook in self.hooks:
+            if isinstance(hook, RequestMetrics):
+                return hook.snapshot()
+        return None
+
+    @property
+    def ratelimit(self):
+        """
+        status of the rate limit (see :attr:`RateLimitGovernor.status`)
+        """
+        if self.http.governor is None:
+            return None
+        return self.http.governor.status
+
     @property
     def status(self):
         """
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client._buffer
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/26
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import mmap
+import os
+import tempfile
+
+from ._compat import memoryview, to_bytes, to_native
+
+
+__all__ = ['ResponseBuffer', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+class ResponseBuffer(object):
+    """
+    Binary buffer of a response body, written once and then shared by the
+    JSON decoder and the cache writer without copying, i.e. through the
+    memory view returned by :meth:`getbuffer` (as with ``io.BytesIO``).
+
+    Bodies are held in memory, unless larger than ``mmap_threshold``, in
+    which case they are spilled to a temporary file mapped into memory.
+
+    The buffer is also a read-only binary file-like object once written,
+    e.g. for incremental parsing of the body.
+    """
+
+    DEFAULT_MMAP_THRESHOLD = 2 ** 24  # 16MB
+
+    __slots__ = ['__data', '__file', '__map', '__size', '__pos',
+                 '__threshold', '__views', ]
+
+    def __init__(self, mmap_threshold=DEFAULT_MMAP_THRESHOLD):
+        super(ResponseBuffer, self).__init__()
+        self.__data = bytearray()
+        self.__file = None
+        self.__map = None
+        self.__size = 0
+        self.__pos = 0
+        self.__threshold = mmap_threshold
+        self.__views = []
+        pass
+
+    @property
+    def mapped(self):
+        """
+        Whether the body is spilled to a (memory-mapped) temporary file
+        """
+        return self.__file is not None
+
+    def write(self, chunk):
+        assert(self.__map is None and not self.__views), \
+            "buffer is no longer writable"
+        if self.__file is None and \
+                self.__size + len(chunk) > self.__threshold:
+            self.__file = tempfile.TemporaryFile(suffix=".DataGatorEntity")
+            self.__file.write(self.__data)
+            self.__data = None
+        if self.__file is not None:
+            self.__file.write(chunk)
+        else:
+            self.__data += chunk
+        self.__size += len(chunk)
+        return len(chunk)
+
+    def getbuffer(self):
+        """
+        Read-only memory view of the whole body (regardless of the current
+        position), valid until the buffer is closed. Python 2.6 gets a
+        ``buffer`` object instead (see ``_compat.memoryview``).
+        """
+        if self.__file is not None:
+            if self.__map is None:
+                self.__file.flush()
+                self.__map = mmap.mmap(
+                    self.__file.fileno(), 0, access=mmap.ACCESS_READ) \
+                    if self.__size > 0 else b""
+            data = self.__map
+        else:
+            data = self.__data
+        try:
+            view = memoryview(data)
+        except TypeError:
+            # py27 cannot take memory views of mapped files
+            return data
+        self.__views.append(view)
+        return view
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return self.__map is None
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.__size - self.__pos
+        end = min(self.__pos + size, self.__size)
+        if end <= self.__pos:
+            return b""
+        if self.__file is not None:
+            self.__file.seek(self.__pos)
+            chunk = self.__file.read(end - self.__pos)
+        else:
+            chunk = to_bytes(memoryview(self.__data)[self.__pos:end])
+        self.__pos = end
+        return chunk
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.__pos
+        elif whence == os.SEEK_END:
+            offset += self.__size
+        self.__pos = max(0, offset)
+        return self.__pos
+
+    def tell(self):
+        return self.__pos
+
+    def __len__(self):
+        return self.__size
+
+    def close(self):
+        # views still held by consumers become invalid, unless exported
+        # further, in which case the mapping is left to garbage collection
+        try:
+            for view in self.__views:
+                if hasattr(view, "release"):
+                    view.release()
+            if self.__map is not None and hasattr(self.__map, "close"):
+                self.__map.close()
+        except BufferError:
+            pass
+        self.__views = []
+        self.__map = None
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+        self.__data = None
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    pass
@@ -13,19 +13,48 @@
 from __future__ import unicode_literals, with_statement
 
 import abc
+import io
+import re
 
-from .._compat import to_native
+from .._compat import json_dumps, to_bytes, to_native
 
 
-__all__ = ['CacheManager', ]
+__all__ = ['CacheManager', 'immutable', 'serialized', ]
 __all__ = [to_native(n) for n in __all__]
 
 
+_IMMUTABLE_KEY = re.compile(r"^repo/[^/#]+/\w+\.[0-9]+(?:/|#|$)")
+
+
+def immutable(key):
+    """
+    Whether a cache key refers to an immutable entity, i.e. a dataset (or a
+    data item of a dataset) with an explicit revision ``<name>.<rev>``
+    """
+    return _IMMUTABLE_KEY.match(key) is not None
+
+
+def serialized(value):
+    """
+    JSON-encoded ``value`` as a bytes-like object, where file-like values
+    exposing their underlying buffers (i.e. ``getbuffer()`` of response
+    bodies and ``io.BytesIO``) are taken as-is without copying.
+    """
+    if hasattr(value, "getbuffer"):
+        return value.getbuffer()
+    if hasattr(value, "read"):
+        return to_bytes(value.read())
+    return json_dumps(value)
+
+
 class CacheManager(object):
     """
     Abstract base class of disk-persisted cache manager
     """
 
+    # whether cached entries outlive the process (and thus may be stale)
+    persistent = False
+
     @abc.abstractmethod
     def get(self, key, value=None):
         pass
@@ -42,4 +71,83 @@ class CacheManager(object):
     def exists(self, key):
         pass
 
+    # batched operations, backends are encouraged to override these methods
+    # with native (and preferrably atomic) implementations.
+
+    def get_many(self, keys):
+        """
+        :returns: ``dict`` of values of the found ``keys``.
+        """
+        found = {}
+        for key in keys:
+            value = self.get(key, None)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def put_many(self, items):
+        """
+        :param items: ``dict`` or sequence of key-value pairs.
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        for key, value in items:
+            self.put(key, value)
+        pass
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.delete(key)
+        pass
+
+    def get_raw(self, key):
+        """
+        JSON-encoded value of ``key`` as a binary file-like object, or
+        ``None`` if not found, which is to be closed by the caller. Backends
+        storing encoded values should override this method to spare a round
+        of decoding and encoding, and preferrably stream the stored value
+        rather than reading it in whole.
+        """
+        value = self.get(key, None)
+        if value is None:
+            return None
+        return io.BytesIO(json_dumps(value))
+
+    def forget(self, key):
+        """
+        Drop process-local copies (if any) of ``key``, i.e. after the entry
+        is updated by another process.
+        """
+        pass
+
+    def keys(self):
+        """
+        Iterate over all cached keys (including metadata entries), which is
+        optional for backends.
+        """
+        raise NotImplementedError()
+
+    # metadata of a cached entry (i.e. HTTP validators such as ``ETag`` and
+    # ``Last-Modified``) is kept in a sibling entry with a reserved suffix,
+    # which never collides with entity URIs (since they never contain `#`).
+    # backends are free to override these methods with native storage.
+
+    META_SUFFIX = "#meta"
+
+    # response headers kept in the metadata, i.e. validators along with the
+    # kind of the entity
+    META_HEADERS = ("ETag", "Last-Modified", "X-DataGator-Entity", )
+
+    def meta_key(self, key):
+        return "{0}{1}".format(key, self.META_SUFFIX)
+
+    def get_meta(self, key, value=None):
+        return self.get(self.meta_key(key), value)
+
+    def put_meta(self, key, meta):
+        return self.put(self.meta_key(key), meta)
+
+    def delete_meta(self, key):
+        return self.delete(self.meta_key(key))
+
     pass
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client._cache.archive
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/23
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import contextlib
+import email.utils
+import hashlib
+import io
+import logging
+import os
+import re
+import zipfile
+
+from datagator.api.client._cache import immutable
+from datagator.api.client._compat import json_dumps, json_loads, to_native
+
+
+__all__ = ['export_cache', 'import_cache', 'seed_cache', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger(__name__)
+
+
+# an archive is a zip file with an index of all cached entities, i.e.
+#
+#   index.json            {"format": ..., "version": ..., "entries": [...]}
+#   blobs/<sha1>.json     body shared by all entities of identical content
+#
+# each entry of the index bears the ``uri``, ``kind`` (if known) and (if
+# applicable) ``rev`` of the entity, the ``blob`` of its body, and its metadata
+# (``meta``, i.e. validators such as ``ETag`` and ``Last-Modified``).
+
+ARCHIVE_FORMAT = "datagator#CacheArchive"
+ARCHIVE_VERSION = 1
+INDEX_NAME = "index.json"
+
+# number of entities loaded into the cache per batch
+BATCH_SIZE = 256
+
+_REV = re.compile(r"^repo/[^/#]+/\w+\.([0-9]+)(?:/|$)")
+
+
+def export_cache(store, filename):
+    """
+    Serialize all entities in ``store`` into the archive ``filename``.
+
+    :param store: :class:`CacheManager` supporting ``keys()``.
+    :returns: number of exported entities.
+    """
+    entries = []
+    blobs = set()
+    zf = zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED)
+    with contextlib.closing(zf):
+        for uri in sorted(store.keys()):
+            # skip metadata and other reserved entries
+            if "#" in uri:
+                continue
+            # bodies are copied as-is, without decoding
+            raw = store.get_raw(uri)
+            if raw is None:
+                continue
+            with contextlib.closing(raw):
+                body = raw.read()
+            digest = hashlib.sha1(body).hexdigest()
+            if digest not in blobs:
+                zf.writestr(to_native("blobs/{0}.json".format(digest)), body)
+                blobs.add(digest)
+            meta = store.get_meta(uri, None) or {}
+            entry = {
+                "uri": uri,
+                "blob": digest,
+                "kind": meta.get("X-DataGator-Entity", None),
+                "meta": meta, }
+            if immutable(uri):
+                entry['rev'] = int(_REV.match(uri).group(1))
+            entries.append(entry)
+        zf.writestr(to_native(INDEX_NAME), json_dumps({
+            "format": ARCHIVE_FORMAT,
+            "version": ARCHIVE_VERSION,
+            "entries": entries, }))
+    _log.info("exported {0} entities ({1} unique) to '{2}'".format(
+        len(entries), len(blobs), filename))
+    return len(entries)
+
+
+def import_cache(store, filename, overwrite=True):
+    """
+    Load all entities in the archive ``filename`` into ``store`` in batches.
+
+    :param overwrite: replace entities already in ``store``.
+    :returns: number of imported entities.
+    """
+    count = 0
+    zf = zipfile.ZipFile(filename, "r")
+    with contextlib.closing(zf):
+        try:
+            index = json_loads(zf.read(to_native(INDEX_NAME)))
+            assert(index.get("format") == ARCHIVE_FORMAT), \
+                "unknown archive format"
+            assert(index.get("version") == ARCHIVE_VERSION), \
+                "unsupported archive version '{0}'".format(
+                    index.get("version"))
+        except (KeyError, ValueError, ) as e:
+            raise AssertionError("invalid cache archive: {0}".format(e))
+        entries = index.get("entries", [])
+        for i in range(0, len(entries), BATCH_SIZE):
+            batch = []
+            for entry in entries[i:i + BATCH_SIZE]:
+                uri = entry['uri']
+                if not overwrite and store.exists(uri):
+                    continue
+                body = zf.read(to_native("blobs/{0}.json".format(
+                    entry['blob'])))
+                batch.append((uri, io.BytesIO(body)))
+                batch.append((store.meta_key(uri), entry.get("meta", {})))
+            store.put_many(batch)
+            count += len(batch) // 2
+    _log.info("imported {0} entities from '{1}'".format(count, filename))
+    return count
+
+
+def seed_cache(store, path, repo, rev=1):
+    """
+    Populate ``store`` with a repo laid out in directory ``path``, i.e.
+    ``<path>/<DataSet>/<Item>.json``, as revision ``rev`` of all datasets.
+
+    Seeded entities bear the time of seeding as ``Last-Modified``, so that
+    the listing of datasets is revalidated with a conditional request.
+
+    :returns: number of seeded entities.
+    """
+    repo_uri = "repo/{0}".format(repo)
+    modified = email.utils.formatdate(usegmt=True)
+
+    def seeded(uri, kind, body):
+        return [(uri, body), (store.meta_key(uri), {
+            "Last-Modified": modified, "X-DataGator-Entity": kind, })]
+
+    datasets = []
+    count = 0
+    for dsname in sorted(os.listdir(path)):
+        dspath = os.path.join(path, dsname)
+        if not os.path.isdir(dspath):
+            continue
+        ds_uri = "{0}/{1}.{2}".format(repo_uri, dsname, rev)
+        items = []
+        batch = []
+        for filename in sorted(os.listdir(dspath)):
+            key, ext = os.path.splitext(filename)
+            if ext != ".json":
+                continue
+            with io.open(os.path.join(dspath, filename), "rb") as f:
+                body = f.read()
+            kind = json_loads(body).get("kind")
+            # recipes are keyed with the ``.recipe`` suffix
+            if kind == "datagator#Recipe" and not key.endswith(".recipe"):
+                key = "{0}.recipe".format(key)
+            items.append({"kind": kind, "name": key})
+            batch.extend(seeded("{0}/{1}".format(ds_uri, key), kind,
+                                io.BytesIO(body)))
+        ref = {
+            "kind": "datagator#DataSet",
+            "name": dsname,
+            "repo": {"kind": "datagator#Repo", "name": repo},
+            "rev": rev, }
+        dataset = dict(ref)
+        dataset['items'] = items
+        dataset['itemsCount'] = len(items)
+        batch.extend(seeded(ds_uri, "datagator#DataSet", dataset))
+        store.put_many(batch)
+        datasets.append(ref)
+        count += len(batch) // 2
+    # the (mutable) listing of datasets is revalidated upon use
+    store.put_many(seeded(repo_uri, "datagator#Repo", {
+        "kind": "datagator#Repo",
+        "name": repo,
+        "items": datasets,
+        "itemsCount": len(datasets), }))
+    count += 1
+    _log.info("seeded {0} entities of repo '{1}' from '{2}'".format(
+        count, repo, path))
+    return count
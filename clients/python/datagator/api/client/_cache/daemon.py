@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client._cache.daemon
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/23
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import errno
+import hashlib
+import io
+import logging
+import os
+import socket
+import struct
+import threading
+
+from datagator.api.client import environ
+from datagator.api.client._cache import CacheManager, serialized
+from datagator.api.client._compat import json_dumps, json_loads, to_native
+from datagator.api.client._compat import _socketserver
+
+
+__all__ = ['CacheDaemon', 'DaemonCache', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger(__name__)
+
+
+# messages (both requests and responses) are sequences of frames, each of
+# which is prefixed by its length (4-byte unsigned integer, big-endian). the
+# first frame is a JSON-encoded header, followed by the JSON-encoded values
+# of the keys listed in the header, i.e.
+#
+#   {"op": "get", "keys": [...]}  ->  {"found": [...]}, <value>, ...
+#   {"op": "put", "keys": [...]}, <value>, ...  ->  {}
+#   {"op": "delete", "keys": [...]}  ->  {}
+#   {"op": "exists", "keys": [...]}  ->  {"exists": [...]}
+#   {"op": "keys"}  ->  {"keys": [...]}
+#   {"op": "fetch", "uri": ..., "kind": ..., "revalidate": ...}
+#       ->  {"found": [true], "status": 200}, <value>
+#       ->  {"found": [false], "status": 404}
+#
+# failed requests are answered with ``{"error": <message>}``.
+
+_LENGTH = struct.Struct(">I")
+
+
+def _read_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 2 ** 16))
+        if not chunk:
+            raise IOError("connection closed by peer")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv_frame(sock):
+    size, = _LENGTH.unpack(_read_exactly(sock, _LENGTH.size))
+    return _read_exactly(sock, size)
+
+
+def _send_frames(sock, frames):
+    sock.sendall(b"".join([
+        _LENGTH.pack(len(f)) + f for f in frames]))
+    pass
+
+
+def _encode(obj):
+    return json_dumps(obj)
+
+
+def _decode(raw):
+    # `raw` may be any bytes-like object, i.e. a memory view
+    return json_loads(raw)
+
+
+class CacheDaemon(_socketserver.ThreadingMixIn,
+                  _socketserver.UnixStreamServer, object):
+
+    """
+    Host-local server sharing one cache manager (i.e. a persistent backend)
+    with all client processes connected through :class:`DaemonCache`.
+
+    The daemon also fetches entities from the backend service on behalf of
+    the clients with its own (keep-alive) connections, where concurrent
+    misses of the same entity across processes share one request.
+    """
+
+    daemon_threads = True
+
+    class Handler(_socketserver.BaseRequestHandler):
+
+        def handle(self):
+            # serve requests of a client connection until closed
+            while True:
+                try:
+                    header = _decode(_recv_frame(self.request))
+                    values = [_recv_frame(self.request)
+                              for k in header.get("keys", [])] \
+                        if header.get("op") == "put" else []
+                except (IOError, socket.error, ValueError, struct.error):
+                    break
+                try:
+                    frames = self.server.dispatch(header, values)
+                except Exception as e:
+                    _log.warning("failed request {0}: {1}".format(
+                        header.get("op"), e))
+                    frames = [_encode({"error": "{0}".format(e)})]
+                try:
+                    _send_frames(self.request, frames)
+                except (IOError, socket.error):
+                    break
+            pass
+
+        pass
+
+    def __init__(self, store, path=None):
+        """
+        :param store: cache manager to be shared.
+        :param path: path of the Unix domain socket, defaults to
+            ``<DATAGATOR_HOME>/cache/daemon.sock``.
+        """
+        self.store = store
+        self.path = path or environ.DATAGATOR_CACHE_SOCKET
+        from datagator.api.client._entity import SingleFlight
+        self.flight = SingleFlight()
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname, 0o700)
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(to_native(self.path))
+            except socket.error as e:
+                # socket left behind by a previous daemon, which is only
+                # removed when nobody is listening (i.e. connection refused)
+                if e.errno == errno.ECONNREFUSED:
+                    os.unlink(self.path)
+                elif e.errno != errno.ENOENT:
+                    raise
+            else:
+                raise IOError(errno.EADDRINUSE, "cache daemon already "
+                              "running at '{0}'".format(self.path))
+            finally:
+                probe.close()
+        # only accessible by the owner, i.e. created with restrictive mode
+        # rather than chmod'ed after binding (and listening)
+        umask = os.umask(0o077)
+        try:
+            super(CacheDaemon, self).__init__(
+                to_native(self.path), CacheDaemon.Handler)
+        finally:
+            os.umask(umask)
+        pass
+
+    def dispatch(self, header, values):
+        op = header.get("op")
+        keys = header.get("keys", [])
+        if op == "get":
+            found = self.store.get_many(keys)
+            return [_encode({"found": [k in found for k in keys]})] + \
+                [_encode(found[k]) for k in keys if k in found]
+        if op == "put":
+            self.store.put_many([
+                (k, io.BytesIO(v)) for k, v in zip(keys, values)])
+            return [_encode({})]
+        if op == "delete":
+            self.store.delete_many(keys)
+            return [_encode({})]
+        if op == "exists":
+            return [_encode({
+                "exists": [self.store.exists(k) for k in keys]})]
+        if op == "keys":
+            return [_encode({"keys": list(self.store.keys())})]
+        if op == "fetch":
+            data = self.flight.do(
+                header['uri'], self.fetch, header['uri'], header['kind'],
+                header.get("revalidate", False))
+            if data is None:
+                return [_encode({"found": [False], "status": 404})]
+            return [_encode({"found": [True], "status": 200}), _encode(data)]
+        raise ValueError("unknown operation '{0}'".format(op))
+
+    def fetch(self, uri, kind, revalidate=False):
+        """
+        Pull an entity from the backend service into the shared cache.
+
+        :returns: JSON-decoded entity, or ``None`` if missing from the
+            backend service.
+        """
+        from datagator.api.client._entity import Entity, normalized, \
+            validated
+        headers = {}
+        if not revalidate:
+            # populated by another client in the meantime
+            data = self.store.get(uri, None)
+            if data is not None:
+                return data
+        else:
+            meta = self.store.get_meta(uri, None) or {}
+            if meta.get("ETag"):
+                headers['If-None-Match'] = meta['ETag']
+            if meta.get("Last-Modified"):
+                headers['If-Modified-Since'] = meta['Last-Modified']
+        response = Entity.service.get(uri, headers, stream=True)
+        if response.status_code == 404:
+            # the miss is recorded by the client
+            response.close()
+            return None
+        with validated(response, (200, 304)) as r:
+            if r.status_code == 304:
+                data = self.store.get(uri, None)
+                if data is not None:
+                    return data
+                # the cached entry vanished since the conditional request
+                # was issued, fallback to an unconditional request
+                return self.fetch(uri, kind)
+            assert(normalized(r.headers.get("X-DataGator-Entity", None)) ==
+                   normalized(kind)), "unexpected entity kind"
+            if r.headers.get("Cache-Control", "private") != "no-cache":
+                self.store.put_many([
+                    (uri, r.body),
+                    (self.store.meta_key(uri), dict([
+                        (k, r.headers[k]) for k in self.store.META_HEADERS
+                        if k in r.headers])), ])
+            data = r.json()
+        return data
+
+    def server_close(self):
+        super(CacheDaemon, self).server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        pass
+
+    pass
+
+
+class DaemonCache(CacheManager):
+
+    """
+    Cache manager backend delegating to the :class:`CacheDaemon` of the
+    host, to which each thread (of each process) holds a connection.
+
+    Operations degrade to cache misses (with a warning) while the daemon is
+    unavailable, so that entities are fetched by the process itself.
+
+    Entities served by the daemon are checked with :attr:`verify` (if set),
+    i.e. a function of the decoded entity and the digest of its serialized
+    form, and those failing the check are taken as cache misses.
+    """
+
+    persistent = True
+
+    # seconds to wait for the daemon before giving up (as a cache miss),
+    # on top of the timeout of the backend service when fetching entities
+    TIMEOUT = 10.0
+
+    __slots__ = ['__path', '__timeout', '__local', 'verify', ]
+
+    def __init__(self, path=None, timeout=None):
+        """
+        :param path: path of the Unix domain socket, defaults to
+            ``<DATAGATOR_HOME>/cache/daemon.sock``.
+        :param timeout: seconds to wait for the daemon, defaults to
+            :attr:`TIMEOUT`.
+        """
+        super(DaemonCache, self).__init__()
+        self.__path = path or environ.DATAGATOR_CACHE_SOCKET
+        self.__timeout = timeout or DaemonCache.TIMEOUT
+        self.__local = threading.local()
+        self.verify = None
+        pass
+
+    @property
+    def sock(self):
+        sock = getattr(self.__local, "sock", None)
+        # connections must not be shared with forked child processes
+        if sock is None or self.__local.pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(to_native(self.__path))
+            except socket.error:
+                sock.close()
+                raise
+            self.__local.sock = sock
+            self.__local.pid = os.getpid()
+        return sock
+
+    def _call(self, header, values=(), timeout=None):
+        """
+        :param timeout: seconds to wait for the daemon, defaults to the one
+            given upon initialization.
+        :returns: 2-``tuple`` of response header and values, or ``None`` if
+            the daemon is unavailable (or hung).
+        """
+        try:
+            sock = self.sock
+            sock.settimeout(timeout or self.__timeout)
+            _send_frames(sock, [_encode(header)] + list(values))
+            response = _decode(_recv_frame(sock))
+            found = response.get("found", [])
+            values = [_recv_frame(sock) for f in found if f]
+        except (IOError, socket.error, ValueError, struct.error) as e:
+            _log.warning("cache daemon unavailable: {0}".format(e))
+            sock = getattr(self.__local, "sock", None)
+            self.__local.sock = None
+            if sock is not None:
+                sock.close()
+            return None
+        if "error" in response:
+            raise RuntimeError(response['error'])
+        return response, values
+
+    def _verified(self, key, raw):
+        """
+        :returns: decoded value of ``key``, or ``None`` if failing
+            :attr:`verify`.
+        """
+        data = _decode(raw)
+        if self.verify is not None and "#" not in key and \
+                not self.verify(data, hashlib.sha1(raw).digest()):
+            _log.warning("invalid entity from cache daemon: '{0}'".format(
+                key))
+            return None
+        return data
+
+    def _value(self, value):
+        if hasattr(value, "read"):
+            value = serialized(value)
+            # validate locally rather than failing the whole batch remotely
+            _decode(value)
+            return value
+        return _encode(value)
+
+    def delete(self, key):
+        self._call({"op": "delete", "keys": [key]})
+        pass
+
+    def delete_many(self, keys):
+        self._call({"op": "delete", "keys": list(keys)})
+        pass
+
+    def exists(self, key):
+        result = self._call({"op": "exists", "keys": [key]})
+        return result is not None and result[0]['exists'][0]
+
+    def get(self, key, value=None):
+        return self.get_many([key]).get(key, value)
+
+    def get_raw(self, key):
+        result = self._call({"op": "get", "keys": [key]})
+        if result is None or not result[1]:
+            return None
+        return io.BytesIO(result[1][0])
+
+    def get_many(self, keys):
+        keys = list(keys)
+        result = self._call({"op": "get", "keys": keys})
+        if result is None:
+            return {}
+        response, values = result
+        found = [k for k, f in zip(keys, response['found']) if f]
+        found = [(k, self._verified(k, v)) for k, v in zip(found, values)]
+        return dict([(k, v) for k, v in found if v is not None])
+
+    def keys(self):
+        result = self._call({"op": "keys"})
+        return iter(result[0]['keys'] if result is not None else [])
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+        pass
+
+    def put_many(self, items):
+        if isinstance(items, dict):
+            items = items.items()
+        keys, values = [], []
+        for key, value in items:
+            keys.append(key)
+            values.append(self._value(value))
+        self._call({"op": "put", "keys": keys}, values)
+        pass
+
+    def fetch(self, uri, kind, revalidate=False):
+        """
+        Have the daemon pull an entity from the backend service into the
+        shared cache.
+
+        :returns: 2-``tuple`` of the status code of the backend service
+            (i.e. ``404`` if the entity is missing) and the JSON-decoded
+            entity (``None`` if missing or failing :attr:`verify`), or
+            ``None`` if the daemon is unavailable.
+        """
+        result = self._call({
+            "op": "fetch",
+            "uri": uri,
+            "kind": kind,
+            "revalidate": revalidate, },
+            timeout=environ.DATAGATOR_API_TIMEOUT + self.__timeout)
+        if result is None:
+            return None
+        response, values = result
+        if not values:
+            return response.get("status", 404), None
+        return response.get("status", 200), self._verified(uri, values[0])
+
+    pass
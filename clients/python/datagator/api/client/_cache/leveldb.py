@@ -12,14 +12,18 @@
 
 from __future__ import unicode_literals, with_statement
 
+import hashlib
 import io
-import json
 import logging
+import os
 import shutil
 import tempfile
+import zlib
 
-from datagator.api.client._cache import CacheManager
-from datagator.api.client._compat import to_bytes, to_native
+from datagator.api.client import environ
+from datagator.api.client._cache import CacheManager, immutable, serialized
+from datagator.api.client._compat import json_loads, to_bytes, to_native
+from datagator.api.client._compat import to_unicode, _thread
 
 # this has to be absolute import, otherwise we will be self-importing.
 try:
@@ -28,38 +32,268 @@ except ImportError:
     raise ImportError("""Could not load `leveldb` dependency.
         See http://code.google.com/p/leveldb/""")
 
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
 
-__all__ = ['LevelDbCache', ]
+__all__ = ['LevelDbCache', 'PersistentLevelDbCache', ]
 __all__ = [to_native(n) for n in __all__]
 
 
 _log = logging.getLogger(__name__)
 
 
+# header bytes of stored values identifying the compression codec
+IDENTITY, ZLIB, ZSTD = b"\x00", b"\x01", b"\x02"
+# header byte of stored values referring to a shared body by its digest
+REFERENCE = b"\x10"
+
+
+def _compress(codec, data):
+    if codec == ZLIB:
+        return zlib.compress(data, LevelDbCache.COMPRESS_LEVEL)
+    if codec == ZSTD:
+        return _zstd.ZstdCompressor(
+            level=LevelDbCache.ZSTD_LEVEL).compress(data)
+    return data
+
+
+def _decompress(codec, data):
+    if codec == ZLIB:
+        return zlib.decompress(data)
+    if codec == ZSTD:
+        if _zstd is None:
+            raise RuntimeError("value compressed with missing codec `zstd`")
+        return _zstd.ZstdDecompressor().decompress(data)
+    if codec == IDENTITY:
+        return data
+    raise RuntimeError("unknown codec of cached value")
+
+
+class _Inflater(object):
+    """
+    Binary file-like object over a stored value, which is decompressed
+    incrementally (one block of input at a time) as it is read.
+    """
+
+    BLOCK_SIZE = 2 ** 16  # 64KB
+
+    __slots__ = ['__data', '__pos', '__decoder', '__buf', ]
+
+    def __init__(self, codec, data, offset=0):
+        super(_Inflater, self).__init__()
+        if codec == ZLIB:
+            self.__decoder = zlib.decompressobj()
+        elif codec == ZSTD:
+            if _zstd is None:
+                raise RuntimeError(
+                    "value compressed with missing codec `zstd`")
+            self.__decoder = _zstd.ZstdDecompressor().decompressobj()
+        else:
+            raise RuntimeError("unknown codec of cached value")
+        self.__data = data
+        self.__pos = offset
+        self.__buf = b""
+        pass
+
+    def _inflate(self):
+        """
+        Decompress the next block of input, returns ``False`` upon EOF.
+        """
+        if self.__pos >= len(self.__data):
+            return False
+        block = self.__data[self.__pos:self.__pos + self.BLOCK_SIZE]
+        self.__pos += len(block)
+        try:
+            self.__buf += self.__decoder.decompress(block)
+            if self.__pos >= len(self.__data) and \
+                    hasattr(self.__decoder, "flush"):
+                self.__buf += self.__decoder.flush()
+        except Exception as e:
+            raise IOError("corrupted cache value: {0}".format(e))
+        return True
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = [self.__buf]
+            self.__buf = b""
+            while self._inflate():
+                chunks.append(self.__buf)
+                self.__buf = b""
+            return b"".join(chunks)
+        while len(self.__buf) < size and self._inflate():
+            pass
+        chunk, self.__buf = self.__buf[:size], self.__buf[size:]
+        return chunk
+
+    def close(self):
+        self.__data = self.__buf = b""
+        self.__pos = 0
+        pass
+
+    pass
+
+
 class LevelDbCache(CacheManager):
 
     """
     LevelDB backend for disk-persisted cache management
     """
 
-    __slots__ = ['__db', '__fs', ]
+    # version of the on-disk layout, persistent caches bearing a different
+    # version are discarded upon opening
+    FORMAT_VERSION = 3
+    VERSION_KEY = "#version"
+
+    DEFAULT_MAX_BYTES = 2 ** 30  # 1 GB
+
+    # values smaller than the threshold (in bytes) are stored uncompressed
+    COMPRESS_THRESHOLD = 1024
+    COMPRESS_LEVEL = 6
+    ZSTD_LEVEL = 3
+
+    # values of at least the threshold (in bytes) are stored by content, i.e.
+    # the key refers to a body (keyed by its digest) shared by all keys of
+    # identical values, which is reference-counted and deleted along with
+    # the last referring key.
+    DEDUP_THRESHOLD = 1024
+    BLOB_PREFIX = "#blob/"
+    REFS_PREFIX = "#refs/"
+
+    __slots__ = ['__db', '__fs', '__persistent', '__max_bytes', '__codec',
+                 '__lock', ]
 
-    def __init__(self, fs=None):
+    def __init__(self, fs=None, persistent=False,
+                 max_bytes=DEFAULT_MAX_BYTES, compression="auto"):
+        """
+        Optional arguments:
+
+        :param fs: directory of the database, defaults to a temporary
+            directory, or ``<DATAGATOR_HOME>/cache/leveldb`` if persistent.
+        :param persistent: keep the database upon garbage collection, and
+            reuse it in later processes.
+        :param max_bytes: size limit of a persistent database on disk, which
+            is enforced upon opening.
+        :param compression: codec of values, one of ``"zstd"``, ``"zlib"``,
+            ``None`` (no compression), or ``"auto"`` for ``"zstd"`` if
+            the ``zstandard`` module is available, otherwise ``"zlib"``.
+        """
+        if persistent and not fs:
+            fs = os.path.join(environ.DATAGATOR_HOME, "cache", "leveldb")
         self.__fs = fs or tempfile.mkdtemp(suffix=".DataGatorCache")
+        self.__persistent = bool(persistent)
+        self.__max_bytes = max_bytes
         self.__db = None
+        # serializes updates of reference counts
+        self.__lock = _thread.allocate_lock()
+        if compression == "auto":
+            compression = "zstd" if _zstd is not None else "zlib"
+        if compression == "zstd" and _zstd is None:
+            raise ImportError("Could not load `zstandard` dependency.")
+        try:
+            self.__codec = {
+                None: IDENTITY, "zlib": ZLIB, "zstd": ZSTD, }[compression]
+        except KeyError:
+            raise ValueError("unknown compression '{0}'".format(compression))
         pass
 
+    @property
+    def persistent(self):
+        return self.__persistent
+
     @property
     def db(self):
         if self.__db is None:
             _log.debug("initializing local cache")
             _log.debug("  - '{0}'".format(self.__fs))
-            self.__db = _leveldb.LevelDB(filename=to_native(self.__fs))
+            if self.persistent:
+                self.__db = self._reopen()
+            else:
+                self.__db = _leveldb.LevelDB(filename=to_native(self.__fs))
         return self.__db
 
+    def _reopen(self):
+
+        fs = to_native(self.__fs)
+        if not os.path.isdir(fs):
+            os.makedirs(fs)
+
+        try:
+            db = _leveldb.LevelDB(filename=fs)
+        except _leveldb.LevelDBError as e:
+            if "lock" in "{0}".format(e).lower():
+                # LevelDB admits one process per database, fallback to a
+                # private (non-persistent) cache for this process
+                _log.warning("local cache in use by another process")
+                self.__fs = tempfile.mkdtemp(suffix=".DataGatorCache")
+                self.__persistent = False
+                return _leveldb.LevelDB(filename=to_native(self.__fs))
+            # recover from a crashed process
+            _log.warning("repairing local cache: {0}".format(e))
+            try:
+                _leveldb.RepairDB(fs)
+                db = _leveldb.LevelDB(filename=fs)
+            except _leveldb.LevelDBError as e:
+                _log.warning("resetting local cache: {0}".format(e))
+                _leveldb.DestroyDB(fs)
+                db = _leveldb.LevelDB(filename=fs)
+
+        # discard incompatible layout
+        try:
+            version = to_unicode(bytes(db.Get(to_bytes(self.VERSION_KEY))))
+        except KeyError:
+            version = None
+        if version != "{0}".format(self.FORMAT_VERSION):
+            if version is not None:
+                _log.warning("resetting local cache of version {0}".format(
+                    version))
+                db = None
+                _leveldb.DestroyDB(fs)
+                db = _leveldb.LevelDB(filename=fs)
+            db.Put(to_bytes(self.VERSION_KEY),
+                   to_bytes("{0}".format(self.FORMAT_VERSION)), sync=True)
+
+        # enforce size limit, mutable entries go first
+        if self._disk_usage() > self.__max_bytes:
+            _log.warning("pruning local cache")
+            keys = []
+            for key in db.RangeIter(include_value=False):
+                key = to_unicode(bytes(key))
+                if key == self.VERSION_KEY or immutable(key) or \
+                        key.startswith(self.BLOB_PREFIX) or \
+                        key.startswith(self.REFS_PREFIX):
+                    continue
+                keys.append(key)
+            self._write(db, (), keys, sync=True)
+            db.CompactRange()
+            if self._disk_usage() > self.__max_bytes:
+                _log.warning("resetting local cache")
+                db = None
+                _leveldb.DestroyDB(fs)
+                db = _leveldb.LevelDB(filename=fs)
+                db.Put(to_bytes(self.VERSION_KEY),
+                       to_bytes("{0}".format(self.FORMAT_VERSION)), sync=True)
+
+        return db
+
+    def _disk_usage(self):
+        fs = to_native(self.__fs)
+        total = 0
+        for name in os.listdir(fs):
+            try:
+                total += os.path.getsize(os.path.join(fs, name))
+            except OSError:
+                pass
+        return total
+
     def delete(self, key):
         _log.debug("deleting '{0}' from cache".format(key))
-        return self.db.Delete(to_bytes(key))
+        return self._write(self.db, (), (key, ))
 
     def exists(self, key):
         _log.debug("looking up '{0}' in cache".format(key))
@@ -74,24 +308,171 @@ class LevelDbCache(CacheManager):
     def get(self, key, value=None):
         _log.debug("fetching '{0}' from cache".format(key))
         try:
-            raw = self.db.Get(to_bytes(key))
+            raw = bytes(self.db.Get(to_bytes(key)))
         except KeyError:
             return value
         else:
-            return json.loads(to_native(raw))
+            return self._unpack(key, raw, value)
         return value  # should NOT reach here
 
+    def get_raw(self, key):
+        try:
+            raw = bytes(self.db.Get(to_bytes(key)))
+            if raw[:1] == REFERENCE:
+                raw = bytes(self.db.Get(to_bytes(
+                    self.BLOB_PREFIX + to_unicode(raw[1:]))))
+            if raw[:1] == IDENTITY:
+                return io.BytesIO(raw[1:])
+            # compressed values are decompressed as they are read
+            return _Inflater(raw[:1], raw, 1)
+        except KeyError:
+            return None
+        except Exception as e:
+            _log.warning("corrupted cache of '{0}': {1}".format(key, e))
+            return None
+        pass
+
+    def get_many(self, keys):
+        found = {}
+        for key in keys:
+            try:
+                raw = bytes(self.db.Get(to_bytes(key)))
+            except KeyError:
+                continue
+            value = self._unpack(key, raw, None)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def keys(self):
+        for key in self.db.RangeIter(include_value=False):
+            key = to_unicode(bytes(key))
+            if key == self.VERSION_KEY or \
+                    key.startswith(self.BLOB_PREFIX) or \
+                    key.startswith(self.REFS_PREFIX):
+                continue
+            yield key
+        pass
+
     def put(self, key, value):
         _log.debug("putting '{0}' to cache".format(key))
+        return self._write(self.db, ((key, value), ), ())
+
+    def put_many(self, items):
+        if isinstance(items, dict):
+            items = items.items()
+        return self._write(self.db, items, ())
+
+    def delete_many(self, keys):
+        return self._write(self.db, (), keys)
+
+    def _write(self, db, items, keys, sync=False):
+        """
+        Put ``items`` and delete ``keys`` in one atomic batch, maintaining
+        reference counts of shared bodies.
+        """
+        batch = _leveldb.WriteBatch()
+        with self.__lock:
+            # records of keys written in this batch
+            staged = {}
+            # digest -> [current count, delta]
+            refs = {}
+            # digest -> packed body to be written
+            blobs = {}
+
+            def count(digest):
+                if digest not in refs:
+                    try:
+                        n = int(bytes(db.Get(to_bytes(
+                            self.REFS_PREFIX + digest))))
+                    except KeyError:
+                        n = 0
+                    refs[digest] = [n, 0]
+                return refs[digest]
+
+            def unref(key):
+                record = staged.get(key, None)
+                if record is None:
+                    try:
+                        record = bytes(db.Get(to_bytes(key)))
+                    except KeyError:
+                        return
+                if record[:1] == REFERENCE:
+                    count(to_unicode(record[1:]))[1] -= 1
+                pass
+
+            for key in keys:
+                _log.debug("deleting '{0}' from cache".format(key))
+                unref(key)
+                staged[key] = b""
+                batch.Delete(to_bytes(key))
+
+            for key, value in items:
+                _log.debug("putting '{0}' to cache".format(key))
+                raw = self._serialize(value)
+                unref(key)
+                if len(raw) >= LevelDbCache.DEDUP_THRESHOLD:
+                    digest = hashlib.sha1(raw).hexdigest()
+                    ref = count(digest)
+                    # only compress bodies not yet stored
+                    if ref[0] + ref[1] <= 0 and digest not in blobs:
+                        blobs[digest] = self._pack(raw)
+                    ref[1] += 1
+                    record = REFERENCE + to_bytes(digest)
+                else:
+                    record = self._pack(raw)
+                staged[key] = record
+                batch.Put(to_bytes(key), record)
+
+            for digest, (n, delta) in refs.items():
+                if delta == 0:
+                    continue
+                if n + delta <= 0:
+                    batch.Delete(to_bytes(self.BLOB_PREFIX + digest))
+                    batch.Delete(to_bytes(self.REFS_PREFIX + digest))
+                    continue
+                if n <= 0:
+                    batch.Put(to_bytes(self.BLOB_PREFIX + digest),
+                              blobs[digest])
+                batch.Put(to_bytes(self.REFS_PREFIX + digest),
+                          to_bytes("{0:d}".format(n + delta)))
+
+            return db.Write(batch, sync=sync)
+        pass
+
+    def _unpack(self, key, raw, value):
+        try:
+            if raw[:1] == REFERENCE:
+                raw = bytes(self.db.Get(to_bytes(
+                    self.BLOB_PREFIX + to_unicode(raw[1:]))))
+            raw = _decompress(raw[:1], raw[1:])
+        except Exception as e:
+            _log.warning("corrupted cache of '{0}': {1}".format(key, e))
+            return value
+        return json_loads(raw)
+
+    def _serialize(self, value):
         if hasattr(value, "read"):
             _log.debug("  - file-like object")
-            value = value.read()
         else:
             _log.debug("  - JSON-serializable object")
-            value = json.dumps(value)
-        return self.db.Put(to_bytes(key), to_bytes(value))
+        return serialized(value)
+
+    def _pack(self, value):
+        codec = IDENTITY
+        if self.__codec != IDENTITY and \
+                len(value) >= LevelDbCache.COMPRESS_THRESHOLD:
+            packed = _compress(self.__codec, value)
+            # keep incompressible values as-is
+            if len(packed) < len(value):
+                codec, value = self.__codec, packed
+        return codec + value
 
     def __del__(self):
+        if self.__persistent:
+            _log.debug("closing local cache")
+            self.__db = None
+            return
         _log.debug("destroying local cache")
         try:
             self.__db = None
@@ -105,3 +486,21 @@ class LevelDbCache(CacheManager):
         pass
 
     pass
+
+
+class PersistentLevelDbCache(LevelDbCache):
+
+    """
+    LevelDB backend for cache management that survives process restarts,
+    rooted at ``<DATAGATOR_HOME>/cache/leveldb`` by default
+    """
+
+    __slots__ = []
+
+    def __init__(self, fs=None, max_bytes=LevelDbCache.DEFAULT_MAX_BYTES,
+                 compression="auto"):
+        super(PersistentLevelDbCache, self).__init__(
+            fs, True, max_bytes, compression)
+        pass
+
+    pass
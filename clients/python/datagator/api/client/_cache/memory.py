@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client._cache.memory
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/21
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import io
+import logging
+
+from datagator.api.client._cache import CacheManager
+from datagator.api.client._compat import OrderedDict, to_bytes, to_native
+from datagator.api.client._compat import json_dumps, _thread
+
+
+__all__ = ['MemoryCache', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger(__name__)
+
+
+class MemoryCache(CacheManager):
+
+    """
+    In-process tier of JSON-decoded objects in front of another cache
+    manager (the backend), with least-recently-used entries evicted when
+    the (estimated) total size exceeds ``max_bytes``.
+
+    Objects returned by :meth:`get` are shared by all callers, and should
+    be treated as read-only.
+    """
+
+    DEFAULT_MAX_BYTES = 2 ** 26  # 64 MB
+
+    __slots__ = ['__backend', '__max_bytes', '__lock', '__lru', '__bytes',
+                 '__sizes', ]
+
+    def __init__(self, backend, max_bytes=DEFAULT_MAX_BYTES):
+        super(MemoryCache, self).__init__()
+        self.__backend = backend
+        self.__max_bytes = max_bytes
+        self.__lock = _thread.allocate_lock()
+        # key -> (size, value) in the order of recent use
+        self.__lru = OrderedDict()
+        self.__bytes = 0
+        # sizes of encoded values put through this tier but not yet decoded
+        self.__sizes = {}
+        pass
+
+    @property
+    def backend(self):
+        return self.__backend
+
+    @property
+    def persistent(self):
+        return self.backend.persistent
+
+    @property
+    def size(self):
+        """
+        estimated total size (in bytes) of cached objects
+        """
+        return self.__bytes
+
+    def _discard(self, key):
+        # must be called with `self.__lock` held
+        entry = self.__lru.pop(key, None)
+        if entry is not None:
+            self.__bytes -= entry[0]
+        pass
+
+    def _remember(self, key, value, size):
+        if size > self.__max_bytes:
+            return
+        with self.__lock:
+            self._discard(key)
+            self.__lru[key] = (size, value)
+            self.__bytes += size
+            while self.__bytes > self.__max_bytes:
+                _, (size, _) = self.__lru.popitem(last=False)
+                self.__bytes -= size
+        pass
+
+    def delete(self, key):
+        with self.__lock:
+            self._discard(key)
+            self.__sizes.pop(key, None)
+        return self.backend.delete(key)
+
+    def exists(self, key):
+        with self.__lock:
+            if key in self.__lru:
+                return True
+        return self.backend.exists(key)
+
+    def get(self, key, value=None):
+        with self.__lock:
+            entry = self.__lru.pop(key, None)
+            if entry is not None:
+                # move to the most-recently-used end
+                self.__lru[key] = entry
+                return entry[1]
+            size = self.__sizes.pop(key, None)
+        obj = self.backend.get(key, None)
+        if obj is None:
+            return value
+        if size is None:
+            # entries populated out of this tier, i.e. by another process
+            size = len(json_dumps(obj))
+        self._remember(key, obj, size)
+        return obj
+
+    def get_many(self, keys):
+        found = {}
+        missing = []
+        with self.__lock:
+            for key in keys:
+                entry = self.__lru.pop(key, None)
+                if entry is not None:
+                    self.__lru[key] = entry
+                    found[key] = entry[1]
+                else:
+                    missing.append(key)
+        if missing:
+            loaded = self.backend.get_many(missing)
+            for key, obj in loaded.items():
+                with self.__lock:
+                    size = self.__sizes.pop(key, None)
+                if size is None:
+                    size = len(json_dumps(obj))
+                self._remember(key, obj, size)
+            found.update(loaded)
+        return found
+
+    def get_raw(self, key):
+        # bypass this tier, since the caller does not want decoded objects,
+        # and the backend streams the value as stored
+        raw = self.backend.get_raw(key)
+        if raw is not None:
+            return raw
+        with self.__lock:
+            entry = self.__lru.get(key, None)
+        if entry is None:
+            return None
+        return io.BytesIO(json_dumps(entry[1]))
+
+    def forget(self, key):
+        with self.__lock:
+            self._discard(key)
+            self.__sizes.pop(key, None)
+        return self.backend.forget(key)
+
+    def keys(self):
+        return self.backend.keys()
+
+    def _prepare(self, key, value):
+        if hasattr(value, "getbuffer"):
+            # shared with the backend, no need to rewind
+            size = len(value.getbuffer())
+        elif hasattr(value, "read"):
+            value = value.read()
+            size = len(value)
+            value = io.BytesIO(to_bytes(value))
+        else:
+            size = None
+        with self.__lock:
+            self._discard(key)
+            if size is not None:
+                self.__sizes[key] = size
+        return value
+
+    def put(self, key, value):
+        return self.backend.put(key, self._prepare(key, value))
+
+    def put_many(self, items):
+        if isinstance(items, dict):
+            items = items.items()
+        return self.backend.put_many([
+            (key, self._prepare(key, value)) for key, value in items])
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        with self.__lock:
+            for key in keys:
+                self._discard(key)
+                self.__sizes.pop(key, None)
+        return self.backend.delete_many(keys)
+
+    pass
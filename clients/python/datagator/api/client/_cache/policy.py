@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client._cache.policy
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/22
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import contextlib
+import io
+import logging
+import time
+
+from datagator.api.client._cache import CacheManager
+from datagator.api.client._compat import json_dumps, to_bytes, to_native
+from datagator.api.client._compat import _thread
+
+
+__all__ = ['EvictionPolicy', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger(__name__)
+
+
+class EvictionPolicy(CacheManager):
+
+    """
+    Cache manager bounding another cache manager (the backend) by the total
+    size of values (``max_bytes``), the number of entries (``max_entries``)
+    and the age of entries (``ttl``), evicting the least recently (``lru``)
+    or least frequently (``lfu``) used entries first.
+
+    The policy tracks entity entries put through it in a compact index,
+    which is saved to persistent backends every so often. Metadata entries
+    (i.e. keys with the ``#`` suffix) go along with their entities.
+
+    Persistent backends may be shared by other processes (or outlive their
+    saved index), so the index is reconciled with the keys of the backend
+    upon loading, and merged with the saved index upon saving.
+    """
+
+    ORDERS = ("lru", "lfu", )
+
+    # evict down to this fraction of the budget, to amortize the cost of
+    # ordering the index over a batch of evictions
+    LOW_WATER = 0.9
+
+    # reserved key of the saved index in persistent backends
+    INDEX_KEY = "#policy"
+    # number of mutations between saving the index
+    FLUSH_INTERVAL = 64
+
+    __slots__ = ['__backend', '__max_bytes', '__max_entries', '__ttl',
+                 '__order', '__lock', '__index', '__bytes', '__stats',
+                 '__dirty', '__dropped', ]
+
+    def __init__(self, backend, max_bytes=None, max_entries=None, ttl=None,
+                 order="lru"):
+        """
+        :param backend: cache manager to be bounded.
+
+        Optional arguments (``None`` or ``0`` for no limit):
+
+        :param max_bytes: size limit (in bytes) of cached values.
+        :param max_entries: limit of the number of cached entities.
+        :param ttl: seconds before a cached entity expires.
+        :param order: ``"lru"`` or ``"lfu"``.
+        """
+        super(EvictionPolicy, self).__init__()
+        if order not in EvictionPolicy.ORDERS:
+            raise ValueError("unknown eviction order '{0}'".format(order))
+        self.__backend = backend
+        self.__max_bytes = max_bytes or None
+        self.__max_entries = max_entries or None
+        self.__ttl = ttl or None
+        self.__order = order
+        self.__lock = _thread.allocate_lock()
+        # key -> [size, ctime, atime, hits]
+        self.__index = None
+        self.__bytes = 0
+        self.__stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0, }
+        self.__dirty = 0
+        # keys dropped since the index was last saved
+        self.__dropped = set()
+        pass
+
+    @property
+    def backend(self):
+        return self.__backend
+
+    @property
+    def persistent(self):
+        return self.backend.persistent
+
+    @property
+    def stats(self):
+        """
+        ``dict`` of counters of ``hits``, ``misses``, ``evictions`` (due to
+        budgets) and ``expirations`` (due to ttl), along with the current
+        number of ``entries`` and their total size in ``bytes``.
+        """
+        self._load()
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats['entries'] = len(self.__index)
+            stats['bytes'] = self.__bytes
+        return stats
+
+    def _tracked(self, key):
+        return "#" not in key
+
+    def _saved(self):
+        # the saved index may have been updated by another process
+        self.backend.forget(EvictionPolicy.INDEX_KEY)
+        saved = self.backend.get(EvictionPolicy.INDEX_KEY, None)
+        return saved if isinstance(saved, dict) else {}
+
+    def _reconcile(self, index):
+        """
+        Track entries of the backend missing from ``index`` (i.e. written by
+        other processes, or lost along with an unsaved index), and forget
+        entries no longer in the backend.
+        """
+        try:
+            keys = set([k for k in self.backend.keys() if self._tracked(k)])
+        except NotImplementedError:
+            return index
+        for key in [k for k in index if k not in keys]:
+            del index[key]
+        now = time.time()
+        for key in keys.difference(index):
+            raw = self.backend.get_raw(key)
+            if raw is None:
+                continue
+            # age and use of such entries are unknown, they expire after ttl
+            # from now, and are evicted before entries of known use
+            with contextlib.closing(raw):
+                index[key] = [len(raw.read()), now, 0.0, 0]
+        return index
+
+    def _load(self):
+        # must be called without `self.__lock` held
+        if self.__index is not None:
+            return
+        index = {}
+        if self.persistent:
+            index = self._reconcile(self._saved())
+        with self.__lock:
+            if self.__index is None:
+                self.__index = index
+                self.__bytes = sum([e[0] for e in index.values()])
+        pass
+
+    def _flush(self, force=False):
+        # must be called with `self.__lock` held, returns whether the index
+        # is due to be saved (by the caller, without `self.__lock` held)
+        self.__dirty += 1
+        if not self.persistent or \
+                (not force and self.__dirty < EvictionPolicy.FLUSH_INTERVAL):
+            return False
+        self.__dirty = 0
+        return True
+
+    def _save(self):
+        # must be called without `self.__lock` held
+        try:
+            saved = self._saved()
+            with self.__lock:
+                for key, entry in saved.items():
+                    if key not in self.__index and \
+                            key not in self.__dropped:
+                        self.__index[key] = entry
+                        self.__bytes += entry[0]
+                self.__dropped = set()
+                index = dict([(k, list(e)) for k, e in self.__index.items()])
+            self.backend.put(EvictionPolicy.INDEX_KEY, index)
+        except Exception as e:
+            _log.warning("failed to save cache index: {0}".format(e))
+        pass
+
+    def flush(self):
+        """
+        Save the index to a persistent backend.
+        """
+        if self.__index is not None and self.persistent:
+            self._save()
+        pass
+
+    def _forget(self, key):
+        # must be called with `self.__lock` held
+        entry = self.__index.pop(key, None)
+        if entry is not None:
+            self.__bytes -= entry[0]
+            self.__dropped.add(key)
+        return entry
+
+    def _drop(self, keys):
+        # must be called with `self.__lock` held, returns the keys to be
+        # deleted (by the caller, without `self.__lock` held)
+        for key in keys:
+            self._forget(key)
+        return [k for key in keys for k in (key, self.meta_key(key))]
+
+    def _delete(self, keys, save=False):
+        # must be called without `self.__lock` held
+        if keys:
+            self.backend.delete_many(keys)
+        if save:
+            self._save()
+        pass
+
+    def _expired(self, entry, now):
+        return self.__ttl is not None and now - entry[1] > self.__ttl
+
+    def _evict(self, now):
+        # must be called with `self.__lock` held, returns the keys to be
+        # deleted (see :meth:`_drop`)
+        over_bytes = self.__max_bytes is not None and \
+            self.__bytes > self.__max_bytes
+        over_entries = self.__max_entries is not None and \
+            len(self.__index) > self.__max_entries
+        if not over_bytes and not over_entries:
+            return []
+        if self.__order == "lru":
+            order = (lambda e: (e[2], ))
+        else:
+            order = (lambda e: (e[3], e[2]))
+        # expired entries go first, regardless of their recency or frequency
+        rank = (lambda k: (not self._expired(self.__index[k], now), ) +
+                order(self.__index[k]))
+        max_bytes = self.__max_bytes and \
+            int(self.__max_bytes * EvictionPolicy.LOW_WATER)
+        max_entries = self.__max_entries and \
+            int(self.__max_entries * EvictionPolicy.LOW_WATER)
+        nbytes, entries = self.__bytes, len(self.__index)
+        victims = []
+        for key in sorted(self.__index, key=rank):
+            if (max_bytes is None or nbytes <= max_bytes) and \
+                    (max_entries is None or entries <= max_entries):
+                break
+            if self._expired(self.__index[key], now):
+                self.__stats['expirations'] += 1
+            else:
+                self.__stats['evictions'] += 1
+            victims.append(key)
+            nbytes -= self.__index[key][0]
+            entries -= 1
+        keys = self._drop(victims)
+        _log.debug("evicted cache down to {0} entries ({1} bytes)".format(
+            len(self.__index), self.__bytes))
+        return keys
+
+    def delete(self, key):
+        return self.delete_many([key])
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        # entries stay tracked unless the (atomic) batch succeeds
+        result = self.backend.delete_many(keys)
+        self._load()
+        save = False
+        with self.__lock:
+            for key in keys:
+                if self._tracked(key) and self._forget(key) is not None:
+                    save = self._flush() or save
+        if save:
+            self._save()
+        return result
+
+    def _expire(self, keys, now, miss=False):
+        """
+        Drop expired entries of ``keys``.
+
+        :returns: ``list`` of ``keys`` not (yet) expired.
+        """
+        self._load()
+        alive, victims, save = [], [], False
+        with self.__lock:
+            for key in keys:
+                entry = self.__index.get(key, None) \
+                    if self._tracked(key) else None
+                if entry is not None and self._expired(entry, now):
+                    self.__stats['expirations'] += 1
+                    if miss:
+                        self.__stats['misses'] += 1
+                    victims.extend(self._drop([key]))
+                    save = self._flush() or save
+                    continue
+                alive.append(key)
+        self._delete(victims, save)
+        return alive
+
+    def _hit(self, keys, found, now):
+        with self.__lock:
+            for key in keys:
+                if not self._tracked(key):
+                    continue
+                if key not in found:
+                    self.__stats['misses'] += 1
+                    continue
+                self.__stats['hits'] += 1
+                entry = self.__index.get(key, None)
+                if entry is not None:
+                    entry[2] = now
+                    entry[3] += 1
+        pass
+
+    def exists(self, key):
+        if not self._expire([key], time.time()):
+            return False
+        return self.backend.exists(key)
+
+    def get(self, key, value=None):
+        if not self._tracked(key):
+            return self.backend.get(key, value)
+        now = time.time()
+        if not self._expire([key], now, miss=True):
+            return value
+        obj = self.backend.get(key, None)
+        self._hit([key], {} if obj is None else {key: obj}, now)
+        return value if obj is None else obj
+
+    def get_many(self, keys):
+        now = time.time()
+        alive = self._expire(keys, now)
+        found = self.backend.get_many(alive)
+        self._hit(alive, found, now)
+        return found
+
+    def get_raw(self, key):
+        if not self.exists(key):
+            return None
+        return self.backend.get_raw(key)
+
+    def forget(self, key):
+        return self.backend.forget(key)
+
+    def keys(self):
+        return self.backend.keys()
+
+    def _measure(self, key, value):
+        if not self._tracked(key):
+            return value, None
+        if hasattr(value, "getbuffer"):
+            return value, len(value.getbuffer())
+        if hasattr(value, "read"):
+            value = to_bytes(value.read())
+            return io.BytesIO(value), len(value)
+        return value, len(json_dumps(value))
+
+    def _record(self, sizes):
+        now = time.time()
+        self._load()
+        save = False
+        with self.__lock:
+            for key, size in sizes:
+                hits = 0
+                entry = self._forget(key)
+                if entry is not None:
+                    hits = entry[3]
+                self.__index[key] = [size, now, now, hits]
+                self.__bytes += size
+                save = self._flush() or save
+            victims = self._evict(now)
+        self._delete(victims, save)
+        pass
+
+    def put(self, key, value):
+        value, size = self._measure(key, value)
+        result = self.backend.put(key, value)
+        if size is not None:
+            self._record([(key, size)])
+        return result
+
+    def put_many(self, items):
+        if isinstance(items, dict):
+            items = items.items()
+        batch, sizes = [], []
+        for key, value in items:
+            value, size = self._measure(key, value)
+            batch.append((key, value))
+            if size is not None:
+                sizes.append((key, size))
+        result = self.backend.put_many(batch)
+        self._record(sizes)
+        return result
+
+    def __del__(self):
+        try:
+            self.flush()
+        except Exception:
+            pass
+        pass
+
+    pass
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client._cache.sqlite
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/22
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import contextlib
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from datagator.api.client import environ
+from datagator.api.client._cache import CacheManager, serialized
+from datagator.api.client._compat import PY2, json_loads, memoryview
+from datagator.api.client._compat import to_bytes, to_native
+
+
+__all__ = ['SqliteCache', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger(__name__)
+
+
+class SqliteCache(CacheManager):
+
+    """
+    SQLite backend for disk-persisted cache management, shared by multiple
+    processes (i.e. worker processes of a web server) on the same host.
+
+    The database runs in write-ahead-logging mode, which admits concurrent
+    readers along with one writer. Each thread (of each process) holds its
+    own connection, and batched writes are atomic, i.e. committed (or rolled
+    back) in one transaction.
+    """
+
+    FORMAT_VERSION = 1
+
+    DEFAULT_MAX_BYTES = 2 ** 30  # 1 GB
+
+    # access time is refreshed (i.e. written) at most once per interval
+    ATIME_RESOLUTION = 60.0
+
+    # size limit is enforced (i.e. least recently used entries are evicted)
+    # every so many writes
+    EVICT_INTERVAL = 256
+
+    # seconds to wait for the lock held by another writer
+    TIMEOUT = 30.0
+
+    persistent = True
+
+    __slots__ = ['__fs', '__max_bytes', '__local', '__lock', '__writes', ]
+
+    def __init__(self, fs=None, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Optional arguments:
+
+        :param fs: path to the database file, defaults to
+            ``<DATAGATOR_HOME>/cache/cache.sqlite3``.
+        :param max_bytes: size limit of cached values, ``None`` for no limit.
+        """
+        super(SqliteCache, self).__init__()
+        self.__fs = fs or os.path.join(
+            environ.DATAGATOR_HOME, "cache", "cache.sqlite3")
+        self.__max_bytes = max_bytes
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__writes = 0
+        pass
+
+    @property
+    def db(self):
+        conn = getattr(self.__local, "conn", None)
+        # connections must not be shared with forked child processes
+        if conn is None or self.__local.pid != os.getpid():
+            conn = self._connect()
+            self.__local.conn = conn
+            self.__local.pid = os.getpid()
+        return conn
+
+    def _connect(self):
+        _log.debug("connecting to local cache")
+        _log.debug("  - '{0}'".format(self.__fs))
+        dirname = os.path.dirname(to_native(self.__fs))
+        if dirname and not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # created by another process in the meantime
+                pass
+        conn = sqlite3.connect(
+            to_native(self.__fs), timeout=self.TIMEOUT,
+            isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        version, = conn.execute("PRAGMA user_version").fetchone()
+        if version != self.FORMAT_VERSION:
+            with self._transaction(conn):
+                # re-check, another process may have upgraded the layout
+                version, = conn.execute("PRAGMA user_version").fetchone()
+                if version != self.FORMAT_VERSION:
+                    if version:
+                        _log.warning(
+                            "resetting local cache of version {0}".format(
+                                version))
+                    conn.execute("DROP TABLE IF EXISTS entries")
+                    conn.execute(
+                        "CREATE TABLE entries ("
+                        "  key TEXT PRIMARY KEY,"
+                        "  value BLOB NOT NULL,"
+                        "  size INTEGER NOT NULL,"
+                        "  atime REAL NOT NULL)")
+                    conn.execute(
+                        "CREATE INDEX entries_atime ON entries (atime)")
+                    conn.execute("PRAGMA user_version={0:d}".format(
+                        self.FORMAT_VERSION))
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self, conn=None):
+        # connections are in autocommit mode, where `with conn` does not open
+        # a transaction, hence explicit BEGIN / COMMIT / ROLLBACK
+        conn = conn or self.db
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        pass
+
+    def _encode(self, value):
+        value = serialized(value)
+        if isinstance(value, memoryview):
+            # py2 only binds `buffer` objects to blobs
+            return to_bytes(value) if PY2 else value
+        return sqlite3.Binary(value)
+
+    def _decode(self, raw):
+        return json_loads(raw)
+
+    def delete(self, key):
+        _log.debug("deleting '{0}' from cache".format(key))
+        self.db.execute("DELETE FROM entries WHERE key = ?", (key, ))
+        pass
+
+    def delete_many(self, keys):
+        with self._transaction() as conn:
+            conn.executemany(
+                "DELETE FROM entries WHERE key = ?", [(k, ) for k in keys])
+        pass
+
+    def exists(self, key):
+        _log.debug("looking up '{0}' in cache".format(key))
+        row = self.db.execute(
+            "SELECT 1 FROM entries WHERE key = ?", (key, )).fetchone()
+        return row is not None
+
+    def get(self, key, value=None):
+        _log.debug("fetching '{0}' from cache".format(key))
+        row = self.db.execute(
+            "SELECT value, atime FROM entries WHERE key = ?",
+            (key, )).fetchone()
+        if row is None:
+            return value
+        raw, atime = row
+        self._touch([key] if atime < time.time() - self.ATIME_RESOLUTION
+                    else [])
+        return self._decode(raw)
+
+    def get_raw(self, key):
+        conn = self.db
+        # values are read incrementally through blob handles if supported
+        # (py311+), which are bound to the row of the key at the time
+        if hasattr(conn, "blobopen"):
+            row = conn.execute(
+                "SELECT rowid FROM entries WHERE key = ?", (key, )).fetchone()
+            if row is None:
+                return None
+            try:
+                return conn.blobopen("entries", "value", row[0],
+                                     readonly=True)
+            except sqlite3.OperationalError:
+                # deleted by another connection in the meantime
+                return None
+        row = conn.execute(
+            "SELECT value FROM entries WHERE key = ?", (key, )).fetchone()
+        if row is None:
+            return None
+        return io.BytesIO(bytes(row[0]))
+
+    def get_many(self, keys):
+        """
+        :returns: ``dict`` of decoded values of found ``keys``.
+        """
+        keys = list(keys)
+        found = {}
+        stale = []
+        threshold = time.time() - self.ATIME_RESOLUTION
+        # stay below the limit of host parameters per statement
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            for key, raw, atime in self.db.execute(
+                    "SELECT key, value, atime FROM entries "
+                    "WHERE key IN ({0})".format(",".join("?" * len(chunk))),
+                    chunk):
+                found[key] = self._decode(raw)
+                if atime < threshold:
+                    stale.append(key)
+        self._touch(stale)
+        return found
+
+    def keys(self):
+        for key, in self.db.execute("SELECT key FROM entries").fetchall():
+            yield key
+        pass
+
+    def put(self, key, value):
+        _log.debug("putting '{0}' to cache".format(key))
+        self.put_many([(key, value)])
+        pass
+
+    def put_many(self, items):
+        """
+        :param items: ``dict`` or sequence of key-value pairs.
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        now = time.time()
+        rows = []
+        for key, value in items:
+            value = self._encode(value)
+            rows.append((key, value, len(value), now))
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, size, atime) "
+                "VALUES (?, ?, ?, ?)", rows)
+        with self.__lock:
+            self.__writes += len(rows)
+            due = self.__writes >= self.EVICT_INTERVAL
+            if due:
+                self.__writes = 0
+        if due:
+            self.evict()
+        pass
+
+    def _touch(self, keys):
+        if not keys:
+            return
+        try:
+            with self._transaction() as conn:
+                conn.executemany(
+                    "UPDATE entries SET atime = ? WHERE key = ?",
+                    [(time.time(), k) for k in keys])
+        except sqlite3.OperationalError as e:
+            # access time is advisory, do not fail reads on a busy database
+            _log.debug("failed to refresh access time: {0}".format(e))
+        pass
+
+    @property
+    def size(self):
+        """
+        total size (in bytes) of cached values
+        """
+        total, = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return total
+
+    def evict(self, max_bytes=None):
+        """
+        Evict least recently used entries until the total size of values
+        fits in ``max_bytes`` (defaults to the limit of this cache). Entries
+        are evicted along with their metadata, in one transaction.
+
+        :returns: number of evicted entries.
+        """
+        max_bytes = self.__max_bytes if max_bytes is None else max_bytes
+        if max_bytes is None:
+            return 0
+        suffix = self.META_SUFFIX
+        with self._transaction() as conn:
+            excess, = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+            excess -= max_bytes
+            if excess <= 0:
+                return 0
+            keys = set()
+            for key, size in conn.execute(
+                    "SELECT key, size FROM entries ORDER BY atime"):
+                if key.endswith(suffix):
+                    key = key[:-len(suffix)]
+                keys.add(key)
+                excess -= size
+                if excess <= 0:
+                    break
+            _log.debug("evicting {0} entries from cache".format(len(keys)))
+            conn.executemany(
+                "DELETE FROM entries WHERE key = ?",
+                [(k, ) for k in keys] +
+                [(self.meta_key(k), ) for k in keys])
+        return len(keys)
+
+    pass
@@ -64,6 +64,8 @@ SOFTWARE.
 
 from __future__ import unicode_literals, with_statement
 
+import codecs
+import json
 import sys
 
 try:
@@ -74,6 +76,22 @@ except ImportError:
     import thread as _thread
 
 
+try:
+    # python 3
+    import queue as _queue
+except ImportError:
+    # python 2
+    import Queue as _queue
+
+
+try:
+    # python 3
+    import socketserver as _socketserver
+except ImportError:
+    # python 2
+    import SocketServer as _socketserver
+
+
 try:
     # python 3
     from collections import OrderedDict
@@ -85,6 +103,14 @@ except ImportError:
 PY2 = (sys.version_info[0] == 2)
 
 
+try:
+    memoryview = memoryview
+except NameError:
+    # py26 lacks memory views, whereas (read-only) `buffer` objects share the
+    # memory of bytes-like objects in the same way, and are sliced to bytes
+    memoryview = buffer
+
+
 if PY2:
 
     text_type = unicode
@@ -92,6 +118,9 @@ if PY2:
     def to_bytes(x, charset=sys.getdefaultencoding(), errors='strict'):
         if x is None:
             return None
+        if isinstance(x, memoryview) and hasattr(x, "tobytes"):
+            # py27 memory views are not converted by `bytes()`
+            return x.tobytes()
         if isinstance(x, (bytes, bytearray, buffer)):
             return bytes(x)
         if isinstance(x, unicode):
@@ -138,3 +167,132 @@ def with_metaclass(meta, *bases):
         def __new__(cls, name, this_bases, d):
             return meta(to_native(name), bases, d)
     return type.__new__(metaclass, to_native("temporary_class"), (), {})
+
+
+# JSON codecs of bytes-like objects (UTF-8) in and bytes out, the fast ones
+# of which are optional dependencies. `stdlib` is always available and used
+# as the fallback of the others.
+
+class JsonCodec(object):
+
+    __slots__ = ['name', 'loads', 'dumps', ]
+
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        pass
+
+    pass
+
+
+def _stdlib_codec():
+
+    def loads(raw):
+        if not isinstance(raw, text_type):
+            raw = codecs.decode(raw, "utf-8")
+        return json.loads(raw)
+
+    def dumps(obj):
+        return to_bytes(json.dumps(obj, separators=(",", ":")))
+
+    return JsonCodec("stdlib", loads, dumps)
+
+
+def _orjson_codec():
+    import orjson
+
+    def loads(raw):
+        # i.e. memory-mapped files
+        if not isinstance(raw, (bytes, bytearray, memoryview, text_type)):
+            raw = memoryview(raw)
+        return orjson.loads(raw)
+
+    def dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    return JsonCodec("orjson", loads, dumps)
+
+
+def _ujson_codec():
+    import ujson
+
+    def loads(raw):
+        if not isinstance(raw, (bytes, text_type)):
+            raw = bytes(raw)
+        return ujson.loads(raw)
+
+    def dumps(obj):
+        return to_bytes(ujson.dumps(obj, escape_forward_slashes=False),
+                        "utf-8")
+
+    return JsonCodec("ujson", loads, dumps)
+
+
+def _simplejson_codec():
+    import simplejson
+
+    def loads(raw):
+        if not isinstance(raw, text_type):
+            raw = codecs.decode(raw, "utf-8")
+        return simplejson.loads(raw)
+
+    def dumps(obj):
+        return to_bytes(simplejson.dumps(obj, separators=(",", ":")))
+
+    return JsonCodec("simplejson", loads, dumps)
+
+
+JSON_CODECS = OrderedDict([
+    ("orjson", _orjson_codec),
+    ("ujson", _ujson_codec),
+    ("simplejson", _simplejson_codec),
+    ("stdlib", _stdlib_codec), ])
+
+
+def json_codec(name="stdlib"):
+    """
+    JSON codec by ``name``, or the fastest one available for ``auto``, where
+    unavailable codecs fallback to ``stdlib``.
+    """
+    if name != "auto" and name not in JSON_CODECS:
+        raise AssertionError("unknown JSON codec '{0}'".format(name))
+    for candidate in (JSON_CODECS if name == "auto" else (name, "stdlib")):
+        try:
+            return JSON_CODECS[candidate]()
+        except ImportError:
+            continue
+    pass
+
+
+_json = None
+
+
+def set_json_codec(name):
+    """
+    Switch the JSON codec used by the client library (defaults to that of
+    ``DATAGATOR_JSON_CODEC``), returns the name of the effective codec.
+    """
+    global _json
+    _json = json_codec(name)
+    return _json.name
+
+
+def json_loads(raw):
+    """
+    Decode JSON document from ``raw`` bytes-like object or text.
+    """
+    if _json is None:
+        from . import environ
+        set_json_codec(environ.DATAGATOR_JSON_CODEC)
+    return _json.loads(raw)
+
+
+def json_dumps(obj):
+    """
+    Encode ``obj`` as JSON document in (UTF-8) bytes.
+    """
+    if _json is None:
+        from . import environ
+        set_json_codec(environ.DATAGATOR_JSON_CODEC)
+    return _json.dumps(obj)
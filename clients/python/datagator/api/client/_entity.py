@@ -14,22 +14,28 @@ from __future__ import unicode_literals, with_statement
 
 import abc
 import atexit
+import hashlib
 import importlib
-import io
-import json
 import jsonschema
 import logging
 import os
-import tempfile
+import requests
+import threading
+import time
 
 from . import environ
 from ._backend import DataGatorService
-from ._cache import CacheManager
+from ._buffer import ResponseBuffer
+from ._cache import CacheManager, immutable
+from ._cache.memory import MemoryCache
+from ._cache.policy import EvictionPolicy
 from ._compat import OrderedDict, with_metaclass
-from ._compat import to_bytes, to_native, to_unicode
+from ._compat import json_dumps, json_loads, set_json_codec
+from ._compat import to_native, to_unicode, _thread
+from ._schema import CompiledValidator
 
 
-__all__ = ['Entity', 'validated', 'normalized', ]
+__all__ = ['Entity', 'SingleFlight', 'validated', 'normalized', ]
 __all__ = [to_native(n) for n in __all__]
 
 
@@ -54,12 +60,14 @@ class validated(object):
     DEFAULT_CHUNK_SIZE = 2 ** 21  # 2MB
 
     __slots__ = ['__response', '__expected_status', '__raw_body',
-                 '__decoded_body', '__size', ]
+                 '__decoded_body', '__stream', ]
 
-    def __init__(self, response, verify_status=True):
+    def __init__(self, response, verify_status=True, stream=False):
         """
         :param response: response object from the backend service
         :param exptected: `list` or `tuple` of expected status codes
+        :param stream: leave the body of an expected response unread, to be
+            consumed with :meth:`iter_content`
         """
         assert(environ.DATAGATOR_API_VERSION == "v2"), \
             "incompatible backend service version"
@@ -69,7 +77,7 @@ class validated(object):
             if verify_status else None
         self.__raw_body = None
         self.__decoded_body = None
-        self.__size = 0
+        self.__stream = stream
         pass
 
     @property
@@ -89,7 +97,8 @@ class validated(object):
     @property
     def body(self):
         """
-        HTTP message body stored as a file-like object
+        HTTP message body stored as a (rewound) file-like object, whose
+        underlying buffer is shared by consumers via ``getbuffer()``
         """
         if self.__raw_body is not None:
             self.__raw_body.seek(0)
@@ -100,20 +109,53 @@ class validated(object):
         JSON-decoded message body of the underlying response
         """
         if self.__decoded_body is None:
+            if self.__raw_body is None:
+                raise RuntimeError("no message body from backend service")
             try:
-                # py3k cannot `json.load()` binary files directly, it needs a
-                # text IO wrapper to handle decoding (to unicode / str)
-                data = json.load(io.TextIOWrapper(self.body))
+                # decoded straight from the buffer of the body, no copies
+                raw = self.body.getbuffer()
+                data = json_loads(raw)
+                # identical contents (e.g. revalidated entities) are only
+                # validated once, as told by their digests
                 if validate_schema:
-                    Entity.schema.validate(data)
+                    Entity.schema.validate(
+                        data, hashlib.sha1(raw).digest(),
+                        environ.DATAGATOR_VALIDATION != "full")
             except (jsonschema.ValidationError, AssertionError, IOError, ):
                 raise RuntimeError("invalid response from backend service")
             else:
                 self.__decoded_body = data
         return self.__decoded_body
 
+    def iter_content(self, chunk_size=DEFAULT_CHUNK_SIZE, spool=None):
+        """
+        Iterate over chunks of a streamed message body (see ``stream``),
+        which are also spooled into :attr:`body` unless larger (in total)
+        than ``spool`` bytes (see :class:`ResponseBuffer` for spilling).
+        """
+        assert(self.__stream and self.__raw_body is None), \
+            "message body not streamed, or already consumed"
+        f = ResponseBuffer() if spool is not None else None
+        try:
+            for chunk in self.__response.iter_content(chunk_size=chunk_size):
+                if not chunk:
+                    continue
+                if f is not None and len(f) + len(chunk) > spool:
+                    f.close()
+                    f = None
+                if f is not None:
+                    f.write(chunk)
+                yield chunk
+        except:
+            # incomplete (i.e. abandoned) bodies are not spooled
+            if f is not None:
+                f.close()
+            raise
+        self.__raw_body = f
+        pass
+
     def __len__(self):
-        return self.__size
+        return len(self.__raw_body) if self.__raw_body is not None else 0
 
     def __enter__(self):
         # validate content-type and body data
@@ -122,25 +164,37 @@ class validated(object):
         _log.debug("  - status code: {0}".format(self.__response.status_code))
         _log.debug("  - response time: {0}".format(self.__response.elapsed))
         try:
+            # not-modified response to a conditional request has no body,
+            # whose connection is released to the pool right away
+            if self.status_code == 304:
+                _log.debug("  - not modified")
+                self.__stream = False
+                self.__response.content
+                self.__response.close()
+                if self.__expected_status is not None and \
+                        self.status_code not in self.__expected_status:
+                    raise RuntimeError(
+                        "unexpected response from backend service (304)")
+                return self
             # response body should be a valid JSON object
             assert(self.headers['Content-Type'] == "application/json")
-            f = tempfile.SpooledTemporaryFile(
-                max_size=self.DEFAULT_CHUNK_SIZE, mode="w+b",
-                suffix=".DataGatorEntity")
-            # make sure f conforms to the prototype of `io.IOBase`
-            for attr in ("readable", "writable", "seekable"):
-                if not hasattr(f, attr):
-                    setattr(f, attr, lambda: True)
-            # wrie decoded response body
+            if self.__stream and (self.__expected_status is None or
+                                  self.status_code in self.__expected_status):
+                _log.debug("  - streamed")
+                return self
+            self.__stream = False
+            # write (content-decoded) response body, as raw bytes which are
+            # decoded to text by the JSON decoder
+            f = ResponseBuffer()
             for chunk in self.__response.iter_content(
-                    chunk_size=self.DEFAULT_CHUNK_SIZE,
-                    decode_unicode=True):
+                    chunk_size=self.DEFAULT_CHUNK_SIZE):
                 if not chunk:
                     continue
                 f.write(chunk)
             self.__raw_body = f
-            self.__size = f.tell()
             _log.debug("  - decoded size: {0}".format(len(self)))
+            if f.mapped:
+                _log.debug("  - memory-mapped")
         except (AssertionError, IOError, ):
             # re-raise as runtime error
             raise RuntimeError("invalid response from backend service")
@@ -162,15 +216,132 @@ class validated(object):
     def __exit__(self, ext_type, exc_value, traceback):
         if isinstance(exc_value, Exception):
             _log.error("failed response validation")
-        # discard temporary file
+        # discard buffer (and temporary file)
         if self.__raw_body is not None:
             self.__raw_body.close()
             self.__raw_body = None
+        # release the connection of a (partially) streamed body
+        if self.__stream:
+            self.__response.close()
         return False  # re-raise exception
 
     pass
 
 
+class SingleFlight(object):
+    """
+    Coalesce concurrent calls bearing the same key into one in-flight call,
+    whose result (or exception) is shared by all callers
+    """
+
+    class Call(object):
+
+        __slots__ = ['done', 'result', 'error', ]
+
+        def __init__(self):
+            super(SingleFlight.Call, self).__init__()
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+            pass
+
+        pass
+
+    __slots__ = ['__lock', '__calls', ]
+
+    def __init__(self):
+        super(SingleFlight, self).__init__()
+        self.__lock = _thread.allocate_lock()
+        self.__calls = {}
+        pass
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Invoke ``func(*args, **kwargs)`` unless a call with the same ``key``
+        is already in flight, in which case wait for and share its result.
+        """
+        with self.__lock:
+            call = self.__calls.get(key, None)
+            leader = call is None
+            if leader:
+                call = self.__calls[key] = SingleFlight.Call()
+        if not leader:
+            _log.debug("waiting for in-flight call '{0}'".format(key))
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+            call.done.set()
+        return call.result
+
+    pass
+
+
+class NegativeCache(object):
+    """
+    Short-lived record of URIs known to be missing from the backend service
+    (i.e. responded with ``404 Not Found``), sparing repeated round trips
+    for the same missing entities
+    """
+
+    # expired records are swept once the number of records exceeds this
+    MAX_ENTRIES = 4096
+
+    __slots__ = ['__lock', '__ttl', '__expiry', ]
+
+    def __init__(self, ttl):
+        """
+        :param ttl: seconds before a record expires (``0`` to disable).
+        """
+        super(NegativeCache, self).__init__()
+        self.__lock = _thread.allocate_lock()
+        self.__ttl = ttl
+        self.__expiry = {}
+        pass
+
+    def add(self, uri):
+        if self.__ttl <= 0:
+            return
+        now = time.time()
+        with self.__lock:
+            self.__expiry[uri] = now + self.__ttl
+            if len(self.__expiry) > NegativeCache.MAX_ENTRIES:
+                self.__expiry = dict([
+                    (k, t) for k, t in self.__expiry.items() if t > now])
+        pass
+
+    def __contains__(self, uri):
+        with self.__lock:
+            expiry = self.__expiry.get(uri, None)
+            if expiry is None:
+                return False
+            if expiry <= time.time():
+                del self.__expiry[uri]
+                return False
+            return True
+        pass
+
+    def discard(self, prefix):
+        """
+        Forget records of ``prefix`` and all URIs under it, i.e. entities
+        created (or about to be created) by this process.
+        """
+        with self.__lock:
+            for uri in [k for k in self.__expiry if k.startswith(prefix)]:
+                del self.__expiry[uri]
+        pass
+
+    pass
+
+
 class EntityType(type):
     """
     Meta class for initializing class members of the Entity class
@@ -178,6 +349,13 @@ class EntityType(type):
 
     def __new__(cls, name, parent, prop):
 
+        # select JSON codec shared by all entities and cache backends
+        codec = set_json_codec(environ.DATAGATOR_JSON_CODEC)
+        if codec != environ.DATAGATOR_JSON_CODEC and \
+                environ.DATAGATOR_JSON_CODEC != "auto":
+            _log.warning("JSON codec '{0}' unavailable, using '{1}'".format(
+                environ.DATAGATOR_JSON_CODEC, codec))
+
         # initialize cache manager shared by all entities
         try:
             mod, sep, cm_cls = environ.DATAGATOR_CACHE_BACKEND.rpartition(".")
@@ -189,6 +367,30 @@ class EntityType(type):
         else:
             prop['store'] = CacheManagerBackend()
 
+        # backend able to fetch entities on behalf of this process (i.e. the
+        # cache daemon), which also enforces the budgets of the cache
+        prop['proxy'] = prop['store'] \
+            if callable(getattr(prop['store'], "fetch", None)) else None
+
+        # keep hot entities decoded in memory in front of the backend
+        if environ.DATAGATOR_CACHE_MEMORY_BYTES > 0:
+            prop['store'] = MemoryCache(
+                prop['store'], environ.DATAGATOR_CACHE_MEMORY_BYTES)
+
+        # bound the backend by size, count and age of entities, in front of
+        # the memory tier such that expired or evicted entities are dropped
+        # from both tiers
+        if prop['proxy'] is None and (
+                environ.DATAGATOR_CACHE_MAX_BYTES > 0 or
+                environ.DATAGATOR_CACHE_MAX_ENTRIES > 0 or
+                environ.DATAGATOR_CACHE_TTL > 0):
+            prop['store'] = EvictionPolicy(
+                prop['store'],
+                max_bytes=environ.DATAGATOR_CACHE_MAX_BYTES,
+                max_entries=environ.DATAGATOR_CACHE_MAX_ENTRIES,
+                ttl=environ.DATAGATOR_CACHE_TTL,
+                order=environ.DATAGATOR_CACHE_EVICTION)
+
         # initialize backend service shared by all entities
         try:
             service = DataGatorService()
@@ -197,14 +399,26 @@ class EntityType(type):
         else:
             prop['service'] = service
 
+        # coalesce concurrent cache misses shared by all entities
+        prop['flight'] = SingleFlight()
+
+        # URIs of entities fetched or revalidated by this process
+        prop['fresh'] = set()
+
+        # URIs of entities recently found missing by this process
+        prop['missing'] = NegativeCache(environ.DATAGATOR_CACHE_NEGATIVE_TTL)
+
         # initialize schema validator shared by all entities
+        if environ.DATAGATOR_VALIDATION not in CompiledValidator.MODES:
+            raise AssertionError("invalid validation mode '{0}'".format(
+                environ.DATAGATOR_VALIDATION))
         try:
             # load schema from local file if exists (fast but may be staled)
             filename = os.path.join(os.path.dirname(__file__), "schema.json")
             schema = None
             if os.access(filename, os.F_OK | os.R_OK):
-                with open(filename, "r") as f:
-                    schema = json.load(f)
+                with open(filename, "rb") as f:
+                    schema = json_loads(f.read())
                     f.close()
             # load schema from service backend (slow but always up-to-date)
             if schema is None:
@@ -212,7 +426,14 @@ class EntityType(type):
         except:
             raise RuntimeError("failed to initialize schema validator")
         else:
-            prop['schema'] = jsonschema.Draft4Validator(schema)
+            prop['schema'] = CompiledValidator(schema)
+
+        # entities served by the cache daemon may be cached by other (versions
+        # of) clients, and are verified by this process unless trusted
+        if prop['proxy'] is not None and \
+                environ.DATAGATOR_VALIDATION != "trusted":
+            prop['proxy'].verify = prop['schema'].verifier(
+                environ.DATAGATOR_VALIDATION != "full")
 
         return type(to_native(name), parent, prop)
 
@@ -227,7 +448,7 @@ class Entity(with_metaclass(EntityType, object)):
     class Ref(OrderedDict):
 
         def __hash__(self):
-            return json.dumps(self).__hash__()
+            return json_dumps(self).__hash__()
 
         pass
 
@@ -262,27 +483,135 @@ class Entity(with_metaclass(EntityType, object)):
     # subclass may need to access `super(SubClass, self)._cache_getter()` and
     # `._cache_deleter()` to extend / override the default caching behaviour.
 
-    def _cache_getter(self):
+    def _cache_getter(self, service=None):
         data = Entity.store.get(self.uri, None)
         if data is None:
-            with validated(Entity.service.get(self.uri, stream=True)) as r:
-                # valid response should bear a matching entity kind
-                kind = normalized(r.headers.get("X-DataGator-Entity", None))
-                assert(kind == self.kind), \
-                    "unexpected entity kind '{0}'".format(kind)
-                # cache data for reuse (iff. advised by the backend)
-                if r.headers.get("Cache-Control", "private") != "no-cache":
-                    # cache backend typically only support byte-string values,
-                    # so passing `r.body` (file-like object) instead of `data`
-                    # (dictionary) can save an extra round of JSON-encoding.
-                    Entity.store.put(self.uri, r.body)
-                # this should come last since calling `r.json()` will close the
-                # temporary file under `r.body` implicitly (observed in py27).
-                data = r.json()
+            # concurrent misses on the same entity share one request
+            data = Entity.flight.do(
+                self.uri, self._cache_fetch, False, service)
+        elif Entity.store.persistent and not immutable(self.uri) and \
+                self.uri not in Entity.fresh:
+            # mutable entities persisted by previous processes may be stale
+            data = self._cache_revalidate(data, service)
         return data
 
+    def _cache_revalidate(self, stale=None, service=None):
+        """
+        Revalidate the cached entity with the backend service, and fallback
+        to the ``stale`` copy (if any) if the service is unreachable, i.e.
+        for caches exported, imported or seeded for offline use.
+
+        :returns: JSON-decoded entity.
+        """
+        try:
+            # concurrent revalidations share one conditional request
+            return Entity.flight.do(
+                self.uri, self._cache_fetch, True, service)
+        except (requests.ConnectionError, requests.Timeout, ) as e:
+            if stale is None:
+                raise
+            _log.warning("serving stale '{0}' from cache: {1}".format(
+                self.uri, e))
+        return stale
+
+    def _cache_fetch(self, revalidate=False, service=None):
+        """
+        Pull the entity from the backend service into the local cache.
+
+        :param revalidate: issue a conditional request with the validators
+            (``ETag`` and ``Last-Modified``) of the cached entry, if any, so
+            that an unmodified entity is not downloaded again.
+        :param service: :class:`DataGatorService` (and its HTTP session) for
+            requesting the entity, defaults to ``Entity.service``.
+        :returns: JSON-decoded entity.
+        """
+        service = service or Entity.service
+        headers = {}
+        if revalidate:
+            meta = Entity.store.get_meta(self.uri, None) or {}
+            if meta.get("ETag"):
+                headers['If-None-Match'] = meta['ETag']
+            if meta.get("Last-Modified"):
+                headers['If-Modified-Since'] = meta['Last-Modified']
+        # the cache daemon shares (anonymous) fetches with other processes
+        if Entity.proxy is not None and not service.auth and \
+                self.uri not in Entity.missing:
+            status, data = Entity.proxy.fetch(
+                self.uri, self.kind, revalidate) or (None, None)
+            if data is not None:
+                Entity.store.forget(self.uri)
+                Entity.fresh.add(self.uri)
+                return data
+            # found missing by the daemon, as if by this process, such that
+            # the request below fails without reaching the backend service
+            if status == 404:
+                Entity.missing.add(self.uri)
+        with validated(self._cache_request(headers, service),
+                       (200, 304)) as r:
+            if r.status_code == 304:
+                data = Entity.store.get(self.uri, None)
+                if data is not None:
+                    Entity.fresh.add(self.uri)
+                    return data
+                # the cached entry vanished since the conditional request
+                # was issued, fallback to an unconditional request
+                return self._cache_fetch(False, service)
+            # the cache and the JSON decoder share the buffer of `r.body`
+            self._cache_store(r)
+            data = r.json()
+        Entity.fresh.add(self.uri)
+        return data
+
+    def _cache_request(self, headers={}, service=None):
+        """
+        Request the entity from the backend service (through ``service``, if
+        given), unless it was recently found missing.
+
+        :returns: streamed response object.
+        """
+        if self.uri in Entity.missing:
+            raise RuntimeError(
+                "unexpected response from backend service (404): "
+                "'{0}' recently found missing".format(self.uri))
+        response = (service or Entity.service).get(
+            self.uri, headers, stream=True)
+        if response.status_code == 404:
+            Entity.missing.add(self.uri)
+        return response
+
+    def _cache_store(self, r, max_bytes=None):
+        """
+        Store the body of a valid response in the local cache, iff. advised
+        by the backend and no larger than ``max_bytes``.
+        """
+        # valid response should bear a matching entity kind
+        kind = normalized(r.headers.get("X-DataGator-Entity", None))
+        assert(kind == self.kind), \
+            "unexpected entity kind '{0}'".format(kind)
+        # streamed bodies are not spooled beyond their limit
+        if r.headers.get("Cache-Control", "private") == "no-cache" or \
+                r.body is None or \
+                (max_bytes is not None and len(r) > max_bytes):
+            return
+        # cache backend typically only support byte-string values, so
+        # passing `r.body` (file-like object) instead of decoded data
+        # (dictionary) can save an extra round of JSON-encoding. the entity
+        # and its validators are stored in one batch.
+        Entity.store.put_many([
+            (self.uri, r.body),
+            (Entity.store.meta_key(self.uri), dict([
+                (k, r.headers[k]) for k in Entity.store.META_HEADERS
+                if k in r.headers])), ])
+        pass
+
+    def _cache_keys(self):
+        """
+        keys of the entity and its metadata in the local cache
+        """
+        return [self.uri, Entity.store.meta_key(self.uri)]
+
     def _cache_deleter(self):
-        Entity.store.delete(self.uri)
+        Entity.store.delete_many(self._cache_keys())
         pass
 
     cache = property(_cache_getter, None, _cache_deleter)
@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client._schema
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/25
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import jsonschema
+import logging
+import re
+
+from ._compat import OrderedDict, text_type, to_native, _thread
+
+
+__all__ = ['CompiledValidator', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger(__name__)
+
+
+# python types of JSON values, probed against the interpreted validator so
+# that both agree on corner cases (e.g. whether ``1.0`` is an integer)
+
+_STRING = tuple(set([str, text_type]))
+_INTEGER = tuple(set([int, type(2 ** 64)]))
+_NUMBER = _INTEGER + (float, )
+_ARRAY = (list, tuple) \
+    if jsonschema.Draft4Validator({"type": "array"}).is_valid(()) \
+    else (list, )
+_FLOAT_INTEGER = jsonschema.Draft4Validator(
+    {"type": "integer"}).is_valid(1.0)
+
+
+def _is_integer(x):
+    if isinstance(x, bool):
+        return False
+    if isinstance(x, _INTEGER):
+        return True
+    return _FLOAT_INTEGER and isinstance(x, float) and x.is_integer()
+
+
+def _is_number(x):
+    return isinstance(x, _NUMBER) and not isinstance(x, bool)
+
+
+_TYPES = {
+    "object": lambda x: isinstance(x, dict),
+    "array": lambda x: isinstance(x, _ARRAY),
+    "string": lambda x: isinstance(x, _STRING),
+    "integer": _is_integer,
+    "number": _is_number,
+    "boolean": lambda x: isinstance(x, bool),
+    "null": lambda x: x is None,
+}
+
+
+def _frozen(x):
+    """
+    Hashable equivalent of a JSON value, where ``1 == 1.0`` but ``1 != True``
+    """
+    if isinstance(x, dict):
+        return frozenset([(k, _frozen(v)) for k, v in x.items()])
+    if isinstance(x, _ARRAY):
+        return tuple([_frozen(v) for v in x])
+    if isinstance(x, bool):
+        return (bool, x)
+    return x
+
+
+def _all(checks):
+    if len(checks) == 1:
+        return checks[0]
+
+    def check(x):
+        for c in checks:
+            if not c(x):
+                return False
+        return True
+
+    return check
+
+
+class CompiledValidator(object):
+    """
+    Validator of the entity schema, compiled ahead of time into one python
+    function per entity ``kind``, as a drop-in replacement of the generic
+    (interpreted) ``jsonschema.Draft4Validator``.
+
+    The compiled functions only tell valid from invalid instances. Errors
+    are reported by the interpreted validator, which also takes over the
+    whole schema if it uses keywords unknown to the compiler.
+    """
+
+    # keywords without effects on validation
+    ANNOTATIONS = frozenset(["id", "$schema", "title", "description",
+                             "default", "definitions", ])
+
+    # validation modes, i.e. all cells (``full``), structure of matrices
+    # (``structural``), or none for entities served by the cache (``trusted``)
+    MODES = ("full", "structural", "trusted", )
+
+    # number of rows of a matrix sampled by structural validation
+    SAMPLE_ROWS = 32
+
+    # number of digests of valid contents remembered
+    MAX_MEMO_ENTRIES = 4096
+
+    __slots__ = ['schema', '__interpreted', '__refs', '__kinds', '__root',
+                 '__lock', '__memo', ]
+
+    def __init__(self, schema):
+        """
+        :param schema: JSON schema (draft 4) of entities.
+        """
+        super(CompiledValidator, self).__init__()
+        self.schema = schema
+        self.__interpreted = jsonschema.Draft4Validator(schema)
+        self.__refs = {}
+        self.__kinds = {}
+        self.__lock = _thread.allocate_lock()
+        self.__memo = OrderedDict()
+        try:
+            self.__root = self._compile(schema)
+        except NotImplementedError as e:
+            _log.warning("cannot compile schema: {0}".format(e))
+            self.__root = self.__interpreted.is_valid
+        else:
+            # the schema of entities is a `oneOf` alternatives by kind
+            self.__kinds = getattr(self.__root, "kinds", {})
+        pass
+
+    @property
+    def kinds(self):
+        """
+        ``dict`` of compiled validation functions by entity kind
+        """
+        return dict(self.__kinds)
+
+    def _resolve(self, ref):
+        # only local JSON pointers (i.e. ``#/definitions/...``) are supported
+        if not ref.startswith("#"):
+            raise NotImplementedError("remote reference '{0}'".format(ref))
+        node = self.schema
+        for part in ref[1:].split("/")[1:]:
+            part = part.replace("~1", "/").replace("~0", "~")
+            try:
+                node = node[part]
+            except (KeyError, TypeError):
+                raise NotImplementedError(
+                    "unresolvable reference '{0}'".format(ref))
+        return node
+
+    def _ref(self, ref):
+        # compiled once per reference, recursive references (e.g. `Page`)
+        # are bound upon their first use
+        if ref not in self.__refs:
+            self.__refs[ref] = None
+            self.__refs[ref] = self._compile(self._resolve(ref))
+        refs = self.__refs
+        return (lambda x: refs[ref](x))
+
+    def _kinds(self, schema, seen=()):
+        """
+        Set of entity kinds admitted by ``schema``, or ``None`` if unknown.
+        """
+        if "$ref" in schema:
+            ref = schema['$ref']
+            if ref in seen:
+                return None
+            return self._kinds(self._resolve(ref), seen + (ref, ))
+        if "oneOf" in schema:
+            kinds = set()
+            for sub in schema['oneOf']:
+                k = self._kinds(sub, seen)
+                if k is None:
+                    return None
+                kinds.update(k)
+            return kinds
+        enum = schema.get("properties", {}).get("kind", {}).get("enum", None)
+        if "kind" not in schema.get("required", ()) or enum is None:
+            return None
+        return set([k for k in enum if isinstance(k, _STRING)])
+
+    def _compile(self, schema):
+        """
+        Compile ``schema`` into a function telling whether an instance is
+        valid, i.e. a boolean predicate.
+        """
+        if not isinstance(schema, dict):
+            raise NotImplementedError("unexpected schema '{0}'".format(
+                schema))
+        if "$ref" in schema:
+            # sibling keywords of `$ref` are ignored in draft 4
+            return self._ref(schema['$ref'])
+        unknown = set(schema) - self.ANNOTATIONS - set([
+            "type", "enum", "properties", "required", "additionalProperties",
+            "items", "minItems", "maxItems", "uniqueItems", "minimum",
+            "maximum", "pattern", "minLength", "maxLength", "oneOf",
+            "anyOf", "allOf", ])
+        if unknown:
+            raise NotImplementedError("unsupported keywords {0}".format(
+                ", ".join(sorted(unknown))))
+        checks = []
+        types = schema.get("type", None)
+        if isinstance(types, _STRING):
+            types = [types]
+        if types is not None:
+            try:
+                tests = [_TYPES[t] for t in types]
+            except KeyError as e:
+                raise NotImplementedError("unknown type {0}".format(e))
+            checks.append(tests[0] if len(tests) == 1 else
+                          (lambda x: any([t(x) for t in tests])))
+        # keywords applicable to a given type are skipped for instances of
+        # other types, unless the type is already enforced
+        only = types[0] if types is not None and len(types) == 1 else None
+        for name, keywords in (
+                ("object", self._object(schema)),
+                ("array", self._array(schema)),
+                ("string", self._string(schema)),
+                ("number", self._number(schema)), ):
+            if not keywords:
+                continue
+            check = _all(keywords)
+            if only == name or (only == "integer" and name == "number"):
+                checks.append(check)
+            else:
+                test = _TYPES[name]
+                checks.append(
+                    lambda x, test=test, check=check: not test(x) or check(x))
+        if "enum" in schema:
+            enum = schema['enum']
+            if not all([isinstance(v, _STRING) for v in enum]):
+                raise NotImplementedError("non-string enum")
+            enum = frozenset(enum)
+            checks.append(lambda x: isinstance(x, _STRING) and x in enum)
+        if "allOf" in schema:
+            checks.extend([self._compile(s) for s in schema['allOf']])
+        if "anyOf" in schema:
+            subs = [self._compile(s) for s in schema['anyOf']]
+            checks.append(lambda x: any([s(x) for s in subs]))
+        if "oneOf" in schema:
+            checks.append(self._one_of(schema['oneOf']))
+        if not checks:
+            return (lambda x: True)
+        return _all(checks)
+
+    def _one_of(self, schemas):
+        subs = [self._compile(s) for s in schemas]
+
+        def count(x, candidates):
+            n = 0
+            for s in candidates:
+                if s(x):
+                    n += 1
+                    if n > 1:
+                        return False
+            return n == 1
+
+        kinds = [self._kinds(s) for s in schemas]
+        if any([k is None for k in kinds]):
+            return (lambda x: count(x, subs))
+        # every alternative requires a `kind` among a known set, so only
+        # alternatives admitting the `kind` of an object may match it
+        table = {}
+        for k, s in zip(kinds, subs):
+            for kind in k:
+                table.setdefault(kind, []).append(s)
+
+        def dispatch(x):
+            if not isinstance(x, dict):
+                return count(x, subs)
+            kind = x.get("kind", None)
+            if not isinstance(kind, _STRING):
+                return False
+            candidates = table.get(kind, None)
+            if candidates is None:
+                return False
+            if len(candidates) == 1:
+                return candidates[0](x)
+            return count(x, candidates)
+
+        # validation functions specialized for each kind
+        dispatch.kinds = dict([
+            (kind, c[0] if len(c) == 1 else (lambda x, c=c: count(x, c)))
+            for kind, c in table.items()])
+        return dispatch
+
+    def _object(self, schema):
+        checks = []
+        required = schema.get("required", ())
+        if required:
+            checks.append(lambda x: all([k in x for k in required]))
+        properties = [
+            (k, self._compile(s))
+            for k, s in schema.get("properties", {}).items()]
+        if properties:
+
+            def check(x):
+                for k, s in properties:
+                    if k in x and not s(x[k]):
+                        return False
+                return True
+
+            checks.append(check)
+        additional = schema.get("additionalProperties", True)
+        if additional is not True:
+            names = frozenset(schema.get("properties", {}))
+            if additional is False:
+                checks.append(lambda x: names.issuperset(x))
+            else:
+                extra = self._compile(additional)
+                checks.append(lambda x: all([
+                    extra(v) for k, v in x.items() if k not in names]))
+        return checks
+
+    def _array(self, schema):
+        checks = []
+        if schema.get("minItems", 0) > 0:
+            min_items = schema['minItems']
+            checks.append(lambda x: len(x) >= min_items)
+        if "maxItems" in schema:
+            max_items = schema['maxItems']
+            checks.append(lambda x: len(x) <= max_items)
+        if "items" in schema:
+            items = schema['items']
+            if not isinstance(items, dict):
+                raise NotImplementedError("tuple validation of items")
+            bare = set(items) - self.ANNOTATIONS - set(["minItems"]) \
+                if items.get("minItems", 0) == 0 else None
+            if bare == set(["type"]) and items['type'] in ("array",
+                                                           "object"):
+                # specialized for arrays of arrays (i.e. `rows` of matrix)
+                t = _ARRAY if items['type'] == "array" else dict
+                checks.append(lambda x: all([isinstance(v, t) for v in x]))
+            else:
+                item = self._compile(items)
+                checks.append(lambda x: all([item(v) for v in x]))
+        if schema.get("uniqueItems", False):
+            checks.append(
+                lambda x: len(set([_frozen(v) for v in x])) == len(x))
+        return checks
+
+    def _string(self, schema):
+        checks = []
+        if "pattern" in schema:
+            pattern = re.compile(schema['pattern'])
+            checks.append(lambda x: pattern.search(x) is not None)
+        if "minLength" in schema:
+            min_length = schema['minLength']
+            checks.append(lambda x: len(x) >= min_length)
+        if "maxLength" in schema:
+            max_length = schema['maxLength']
+            checks.append(lambda x: len(x) <= max_length)
+        return checks
+
+    def _number(self, schema):
+        checks = []
+        if "minimum" in schema:
+            minimum = schema['minimum']
+            checks.append(lambda x: x >= minimum)
+        if "maximum" in schema:
+            maximum = schema['maximum']
+            checks.append(lambda x: x <= maximum)
+        return checks
+
+    def is_valid(self, instance):
+        kind = instance.get("kind", None) \
+            if isinstance(instance, dict) else None
+        check = self.__kinds.get(kind, None) \
+            if isinstance(kind, _STRING) else None
+        return (check or self.__root)(instance)
+
+    def iter_errors(self, instance):
+        return self.__interpreted.iter_errors(instance)
+
+    def verifier(self, structural=False):
+        """
+        Function telling whether an instance, given the digest of its
+        serialized form, is valid (see :meth:`validate`).
+        """
+        def verify(instance, digest=None):
+            try:
+                self.validate(instance, digest, structural)
+            except jsonschema.ValidationError:
+                return False
+            return True
+        return verify
+
+    def _sampled(self, instance):
+        """
+        Matrix with a sample of its rows, or ``None`` if inconsistent with
+        its header and row / column counts.
+        """
+        rows = instance.get("rows", None)
+        if not isinstance(rows, _ARRAY) or not rows:
+            return instance
+        step = max(1, len(rows) // self.SAMPLE_ROWS)
+        sample = list(rows[::step])
+        if (len(rows) - 1) % step:
+            sample.append(rows[-1])
+        # malformed counts are left to the schema
+        count = (lambda k, default: instance[k]
+                 if _is_integer(instance.get(k, None)) else default)
+        columns_count = count("columnsCount", None)
+        if count("rowsCount", len(rows)) != len(rows) or \
+                count("columnHeaders", 0) > len(rows):
+            return None
+        if columns_count is not None and (
+                count("rowHeaders", 0) > columns_count or
+                not all([isinstance(r, _ARRAY) and len(r) == columns_count
+                         for r in sample])):
+            return None
+        instance = dict(instance)
+        instance['rows'] = sample
+        return instance
+
+    def iter_rows(self, rows, header):
+        """
+        Validate a matrix streamed one row at a time, i.e. the shape of each
+        row as it is yielded, and the ``header`` (all other members, which
+        are only complete upon exhaustion of ``rows``) along with a sample of
+        rows in the end, in constant memory.
+
+        :raises jsonschema.ValidationError: on invalid rows or header.
+        """
+        count, columns, sample = 0, None, []
+        for row in rows:
+            if not isinstance(row, _ARRAY) or \
+                    (columns is not None and len(row) != columns):
+                raise jsonschema.ValidationError(
+                    "row {0} of matrix inconsistent with others".format(
+                        count))
+            columns = len(row)
+            if count < self.SAMPLE_ROWS:
+                sample.append(row)
+            count += 1
+            yield row
+        instance = dict(header)
+        instance['rows'] = []
+        # malformed counts are left to the schema
+        get = (lambda k: instance[k]
+               if _is_integer(instance.get(k, None)) else None)
+        if get("rowsCount") not in (None, count) or \
+                get("columnsCount") not in (None, columns) or \
+                (get("columnHeaders") or 0) > count or \
+                (get("rowHeaders") or 0) > (columns or 0):
+            raise jsonschema.ValidationError(
+                "rows of matrix inconsistent with headers and counts")
+        # rows are validated in full by the schema as a whole
+        instance['rows'] = sample
+        self.validate(instance)
+        pass
+
+    def validate(self, instance, digest=None, structural=False):
+        """
+        Validate ``instance`` against the schema.
+
+        :param digest: digest of the serialized ``instance`` (i.e. the body
+            of a response), such that contents known to be valid are not
+            validated again.
+        :param structural: only validate the structure of matrices, i.e.
+            their headers and row / column counts, along with a sample of
+            their rows, rather than all cells.
+        :raises jsonschema.ValidationError: on invalid ``instance``.
+        """
+        if digest is not None:
+            with self.__lock:
+                # contents validated in full also pass structural validation
+                memo = self.__memo.get(digest, None)
+                if memo is True or (memo is not None and structural):
+                    return
+        if structural and isinstance(instance, dict) and \
+                instance.get("kind", None) == "datagator#Matrix":
+            sampled = self._sampled(instance)
+            if sampled is None:
+                raise jsonschema.ValidationError(
+                    "rows of matrix inconsistent with headers and counts")
+            instance = sampled
+        if not self.is_valid(instance):
+            # report the error in the same way as the interpreted validator
+            self.__interpreted.validate(instance)
+            _log.warning("compiled and interpreted validators disagree")
+        if digest is not None:
+            with self.__lock:
+                self.__memo[digest] = not structural or \
+                    self.__memo.get(digest, False)
+                while len(self.__memo) > self.MAX_MEMO_ENTRIES:
+                    self.__memo.popitem(last=False)
+        pass
+
+    pass
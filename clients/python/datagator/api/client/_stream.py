@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client._stream
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/24
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import codecs
+import json
+import re
+
+from ._compat import to_native
+
+
+__all__ = ['JsonArrayReader', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+# characters ending scalars (i.e. numbers and literals), or to be tracked in
+# strings and compound values (i.e. arrays and objects)
+_SCALAR_END = re.compile(r'[ \t\n\r,:\]}]')
+_STRING_END = re.compile(r'["\\]')
+_COMPOUND_END = re.compile(r'["\[\]{}]')
+
+
+class _Extent(object):
+    """
+    State of scanning a JSON value for its end, across chunks of text, such
+    that each character is scanned once regardless of the number of chunks
+    """
+
+    __slots__ = ['kind', 'depth', 'string', 'escape', ]
+
+    def __init__(self, c):
+        super(_Extent, self).__init__()
+        self.kind = "compound" if c in "[{" else \
+            "string" if c == '"' else "scalar"
+        self.depth = 0
+        self.string = False
+        self.escape = False
+        pass
+
+    def scan(self, text, pos):
+        """
+        Index of ``text`` past the end of the value, or ``None`` if the value
+        continues beyond ``text``.
+        """
+        if self.kind == "scalar":
+            m = _SCALAR_END.search(text, pos)
+            return m.start() if m is not None else None
+        while True:
+            if self.escape:
+                if pos >= len(text):
+                    return None
+                self.escape, pos = False, pos + 1
+            if self.string:
+                m = _STRING_END.search(text, pos)
+                if m is None:
+                    return None
+                pos = m.end()
+                if m.group() == "\\":
+                    self.escape = True
+                    continue
+                self.string = False
+                if self.kind == "string":
+                    return pos
+                continue
+            m = _COMPOUND_END.search(text, pos)
+            if m is None:
+                return None
+            pos, c = m.end(), m.group()
+            if c == '"':
+                self.string = True
+            elif c in "[{":
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    return pos
+        pass
+
+    pass
+
+
+class JsonArrayReader(object):
+    """
+    Incremental parser of a JSON object read from a binary file-like object,
+    or an iterable of binary chunks (UTF-8 encoded), yielding the elements of
+    one array member of the object (e.g. ``rows`` of a matrix) one at a time,
+    such that memory usage is bounded by the largest element rather than the
+    whole document.
+
+    Other members of the object are decoded as a whole, and collected in
+    :attr:`members` as they are encountered.
+    """
+
+    DEFAULT_CHUNK_SIZE = 2 ** 16  # 64KB
+
+    WHITESPACE = " \t\n\r"
+
+    __slots__ = ['__f', '__chunks', '__chunk_size', '__decoder', '__utf8',
+                 '__buf', '__pos', '__eof', 'members', ]
+
+    def __init__(self, f, chunk_size=DEFAULT_CHUNK_SIZE):
+        super(JsonArrayReader, self).__init__()
+        self.__f = f
+        self.__chunks = None if hasattr(f, "read") else iter(f)
+        self.__chunk_size = chunk_size
+        self.__decoder = json.JSONDecoder()
+        self.__utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.__buf = ""
+        self.__pos = 0
+        self.__eof = False
+        self.members = {}
+        pass
+
+    def _read(self):
+        """
+        Next chunk of text, or ``None`` upon EOF.
+        """
+        if self.__eof:
+            return None
+        if self.__chunks is not None:
+            chunk = next(self.__chunks, b"")
+        else:
+            chunk = self.__f.read(self.__chunk_size)
+        if not chunk:
+            self.__eof = True
+            return self.__utf8.decode(b"", True) or None
+        return self.__utf8.decode(chunk)
+
+    def _more(self):
+        """
+        Append the next chunk to the buffer, returns ``False`` upon EOF.
+        """
+        text = self._read()
+        # discard consumed text
+        self.__buf = self.__buf[self.__pos:]
+        self.__pos = 0
+        if text is None:
+            return False
+        self.__buf += text
+        return True
+
+    def _peek(self):
+        """
+        Next non-whitespace character (not consumed), or ``None`` upon EOF.
+        """
+        while True:
+            buf, pos = self.__buf, self.__pos
+            while pos < len(buf) and buf[pos] in self.WHITESPACE:
+                pos += 1
+            self.__pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._more():
+                return None
+        pass
+
+    def _expect(self, chars):
+        c = self._peek()
+        if c is None or c not in chars:
+            raise ValueError("expecting one of '{0}' but found '{1}'".format(
+                chars, c))
+        self.__pos += 1
+        return c
+
+    def _value(self):
+        """
+        Decode the next JSON value as a whole.
+        """
+        c = self._peek()
+        if c is None:
+            raise ValueError("unexpected end of JSON document")
+        # locate the end of the value before decoding, collecting the text
+        # of values spanning multiple chunks
+        extent = _Extent(c)
+        end = extent.scan(self.__buf, self.__pos)
+        if end is not None:
+            value, start = self.__buf, self.__pos
+            self.__pos = end
+        else:
+            parts = [self.__buf[self.__pos:]]
+            while end is None:
+                text = self._read()
+                if text is None:
+                    # scalars (i.e. numbers) may end with the document
+                    text, end = "", 0
+                    break
+                end = extent.scan(text, 0)
+                parts.append(text if end is None else text[:end])
+            value, start = "".join(parts), 0
+            self.__buf, self.__pos = text, end
+            end = len(value)
+        obj, stop = self.__decoder.raw_decode(value, start)
+        if stop != end:
+            raise ValueError("malformed JSON value near '{0}'".format(
+                value[stop:stop + 16]))
+        return obj
+
+    def iter_array(self, name):
+        """
+        Iterate over the elements of array member ``name`` of the object.
+        Members preceding the array are readily available in
+        :attr:`members`, and the others are collected upon exhaustion, i.e.
+        once the whole document is read.
+        """
+        self._expect("{")
+        while self._peek() != "}":
+            key = self._value()
+            self._expect(":")
+            if key == name and self._peek() == "[":
+                self._expect("[")
+                if self._peek() != "]":
+                    while True:
+                        yield self._value()
+                        if self._expect(",]") == "]":
+                            break
+                else:
+                    self._expect("]")
+            else:
+                self.members[key] = self._value()
+            if self._expect(",}") == "}":
+                break
+            # no trailing comma before the end of the object
+            if self._peek() == "}":
+                raise ValueError("expecting a member but found '}'")
+        else:
+            self._expect("}")
+        if self._peek() is not None:
+            raise ValueError("extra data after JSON document")
+        pass
+
+    pass
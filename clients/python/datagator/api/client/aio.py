@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client.aio
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Awaitable counterparts of the blocking entity accessors (Python 3.6+).
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/19
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import sys
+
+from ._compat import to_native
+
+# asynchronous generators and comprehensions fail to compile before Python
+# 3.6, thus the implementation is only imported on supported versions
+if sys.version_info < (3, 6):
+    raise ImportError("`datagator.api.client.aio` requires Python 3.6+")
+else:
+    from ._aio import fetch, fetch_many, getdataset, getitem, iter_repo, \
+        patch, service, walk
+
+
+__all__ = ['fetch', 'fetch_many', 'getdataset', 'getitem', 'iter_repo',
+           'patch', 'service', 'walk', ]
+__all__ = [to_native(n) for n in __all__]
@@ -12,8 +12,12 @@
 
 from __future__ import unicode_literals, with_statement
 
+import jsonschema
+
 from ._compat import OrderedDict, with_metaclass, to_native, to_unicode
-from ._entity import Entity, normalized
+from ._entity import Entity, normalized, validated
+from ._stream import JsonArrayReader
+from .task import TaskFuture
 
 
 __all__ = ['Matrix', 'Recipe', ]
@@ -79,11 +83,74 @@ class DataItem(Entity):
 
 class Matrix(DataItem):
 
+    # streamed bodies larger than this (in bytes) are not cached
+    MAX_STREAM_CACHED_BYTES = 2 ** 26  # 64MB
+
+    def iter_rows(self):
+        """
+        Iterate over the rows of the matrix, decoded one at a time from the
+        locally cached body, or straight from the response of the backend
+        service (spooled into the local cache along the way), without
+        materializing the whole matrix in memory.
+
+        Rows come in order, i.e. the first ``columnHeaders`` rows are the
+        column headers, and the first ``rowHeaders`` cells of each row are
+        the row headers. Streamed responses are validated structurally, i.e.
+        the shape of each row, along with the header of the matrix (and a
+        sample of rows) upon exhaustion.
+        """
+        body = Entity.store.get_raw(self.uri)
+        if body is not None:
+            try:
+                for row in JsonArrayReader(body).iter_array("rows"):
+                    yield row
+            finally:
+                body.close()
+            return
+        with validated(self._cache_request(), stream=True) as r:
+            reader = JsonArrayReader(r.iter_content(
+                JsonArrayReader.DEFAULT_CHUNK_SIZE,
+                Matrix.MAX_STREAM_CACHED_BYTES))
+            rows = Entity.schema.iter_rows(
+                reader.iter_array("rows"), reader.members)
+            try:
+                for row in rows:
+                    yield row
+            except (jsonschema.ValidationError, ValueError, IOError, ):
+                raise RuntimeError("invalid response from backend service")
+            # only bodies streamed (and validated) in whole are cached
+            self._cache_store(r, Matrix.MAX_STREAM_CACHED_BYTES)
+        pass
+
+    def convert(self, fmt="xlsx"):
+        """
+        Request conversion of the matrix to a downloadable file.
+
+        :param fmt: target file format.
+        :returns: :class:`TaskFuture` watching the conversion task, whose
+            ``url`` is that of the converted file when readily available.
+        """
+        with validated(Entity.service.post(
+                self.uri, data={"fmt": fmt}), (201, 202)) as r:
+            return TaskFuture(r.headers['Location'], r.status_code == 202)
+        pass
+
     pass
 
 
 class Recipe(DataItem):
 
+    def bake(self):
+        """
+        Request baking of the recipe into a matrix.
+
+        :returns: :class:`TaskFuture` watching the baking task.
+        """
+        with validated(Entity.service.post(
+                self.uri, data={"act": "bake"}), (202, )) as r:
+            return TaskFuture(r.headers['Location'])
+        pass
+
     pass
 
 
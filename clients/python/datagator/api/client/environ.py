@@ -22,7 +22,9 @@ class EnvironModule(types.ModuleType):
 
     __all__ = [to_native(n) for n in [
         'DATAGATOR_API_ACCEPT_ENCODING',
+        'DATAGATOR_API_CONTENT_ENCODING',
         'DATAGATOR_API_FOLLOW_REDIRECT',
+        'DATAGATOR_API_PIPELINE_DEPTH',
         'DATAGATOR_API_TIMEOUT',
         'DATAGATOR_API_HOST',
         'DATAGATOR_API_SCHEME',
@@ -31,18 +33,38 @@ class EnvironModule(types.ModuleType):
         'DATAGATOR_API_USER_AGENT',
         'DATAGATOR_HOME',
         'DATAGATOR_CACHE_BACKEND',
+        'DATAGATOR_CACHE_EVICTION',
+        'DATAGATOR_CACHE_MAX_BYTES',
+        'DATAGATOR_CACHE_MAX_ENTRIES',
+        'DATAGATOR_CACHE_MEMORY_BYTES',
+        'DATAGATOR_CACHE_NEGATIVE_TTL',
+        'DATAGATOR_CACHE_SOCKET',
+        'DATAGATOR_CACHE_TTL',
+        'DATAGATOR_JSON_CODEC',
+        'DATAGATOR_VALIDATION',
         'DEBUG', ]]
 
     # version tuple of the pythonic HTTP client library
     __client_version__ = (0, 1, 6)
 
     __slots__ = ["DATAGATOR_API_ACCEPT_ENCODING",
+                 "DATAGATOR_API_CONTENT_ENCODING",
                  "DATAGATOR_API_FOLLOW_REDIRECT",
                  "DATAGATOR_API_HOST",
+                 "DATAGATOR_API_PIPELINE_DEPTH",
                  "DATAGATOR_API_SCHEME",
                  "DATAGATOR_API_VERSION",
                  "DATAGATOR_HOME",
                  "DATAGATOR_CACHE_BACKEND",
+                 "DATAGATOR_CACHE_EVICTION",
+                 "DATAGATOR_CACHE_MAX_BYTES",
+                 "DATAGATOR_CACHE_MAX_ENTRIES",
+                 "DATAGATOR_CACHE_MEMORY_BYTES",
+                 "DATAGATOR_CACHE_NEGATIVE_TTL",
+                 "DATAGATOR_CACHE_SOCKET",
+                 "DATAGATOR_CACHE_TTL",
+                 "DATAGATOR_JSON_CODEC",
+                 "DATAGATOR_VALIDATION",
                  "DEBUG", ]
 
     def __init__(self, name, docs):
@@ -64,11 +86,47 @@ class EnvironModule(types.ModuleType):
         self.DATAGATOR_CACHE_BACKEND = os.environ.get(
             "DATAGATOR_CACHE_BACKEND",
             "datagator.api.client._cache.leveldb.LevelDbCache")
+        # Unix domain socket of the host-local cache daemon
+        self.DATAGATOR_CACHE_SOCKET = os.environ.get(
+            "DATAGATOR_CACHE_SOCKET",
+            os.path.join(self.DATAGATOR_HOME, "cache", "daemon.sock"))
+        # budgets of the cache manager backend (0 for no limit), i.e. total
+        # size of values, number of entities and seconds before expiration
+        self.DATAGATOR_CACHE_MAX_BYTES = int(os.environ.get(
+            "DATAGATOR_CACHE_MAX_BYTES", 2 ** 30))
+        self.DATAGATOR_CACHE_MAX_ENTRIES = int(os.environ.get(
+            "DATAGATOR_CACHE_MAX_ENTRIES", 0))
+        self.DATAGATOR_CACHE_TTL = int(os.environ.get(
+            "DATAGATOR_CACHE_TTL", 0))
+        # order of evicting entities over budget (``lru`` or ``lfu``)
+        self.DATAGATOR_CACHE_EVICTION = os.environ.get(
+            "DATAGATOR_CACHE_EVICTION", "lru")
+        # size limit of in-process cache of decoded entities (0 to disable)
+        self.DATAGATOR_CACHE_MEMORY_BYTES = int(os.environ.get(
+            "DATAGATOR_CACHE_MEMORY_BYTES", 2 ** 26))
+        # seconds to remember missing entities (0 to disable)
+        self.DATAGATOR_CACHE_NEGATIVE_TTL = int(os.environ.get(
+            "DATAGATOR_CACHE_NEGATIVE_TTL", 30))
+        # JSON codec, i.e. ``stdlib``, ``orjson``, ``ujson``, ``simplejson``
+        # or ``auto`` (the fastest available), falls back to ``stdlib``
+        self.DATAGATOR_JSON_CODEC = os.environ.get(
+            "DATAGATOR_JSON_CODEC", "stdlib")
+        # validation of entities against the schema, i.e. ``full``,
+        # ``structural`` (matrices are sampled), or ``trusted`` (structural
+        # for the backend service, none for entities served by the cache)
+        self.DATAGATOR_VALIDATION = os.environ.get(
+            "DATAGATOR_VALIDATION", "full")
         # debugging mode (``NDEBUG=1`` takes precedence over ``DEBUG=1``)
         self.DEBUG = int(os.environ.get("DEBUG", 0)) and \
             not int(os.environ.get("NDEBUG", 0))
         # encodings recognized by the HTTP library (favors gzip over identity)
         self.DATAGATOR_API_ACCEPT_ENCODING = "gzip, deflate, identity"
+        # encoding of revision payloads (``gzip`` or ``identity``)
+        self.DATAGATOR_API_CONTENT_ENCODING = os.environ.get(
+            "DATAGATOR_API_CONTENT_ENCODING", "identity")
+        # number of full revision payloads to be committed in background
+        self.DATAGATOR_API_PIPELINE_DEPTH = int(os.environ.get(
+            "DATAGATOR_API_PIPELINE_DEPTH", 0))
         # allow server-side redirection
         self.DATAGATOR_API_FOLLOW_REDIRECT = True
         # timeout of HTTP connection
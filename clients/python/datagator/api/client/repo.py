@@ -13,17 +13,20 @@
 from __future__ import unicode_literals, with_statement
 
 import fcntl
+import gzip
 import io
-import json
 import jsonschema
 import logging
 import tempfile
+import threading
 
 from . import environ
-from ._compat import to_native, to_unicode, to_bytes, _thread
-from ._entity import Entity, validated
+from ._compat import json_dumps, to_native, to_unicode, to_bytes
+from ._compat import _queue, _thread
+from ._entity import Entity, normalized, validated
 
 from .data import DataItem
+from .task import TaskFuture
 
 
 __all__ = ['DataSet', 'Repo', ]
@@ -43,30 +46,83 @@ class ChangeSet(object):
     MAX_PAYLOAD_BYTES = 2 ** 24  # 16 MB
     MAX_BUFFER_BYTES = 2 ** 21   # 2 MB
 
-    __slots__ = ['__uri', '__lock', '__tmp', '__cnt', ]
+    COMPRESS_LEVEL = 6
 
-    def __init__(self, dataset):
+    __slots__ = ['__uri', '__prefix', '__lock', '__tmp', '__out', '__cnt',
+                 '__encoding', '__pipeline', '__queue', '__committer',
+                 '__error', '__tasks', '__pending', '__service', ]
+
+    def __init__(self, dataset, encoding=None, pipeline=None, service=None):
+        """
+        :param dataset: :class:`DataSet` to be revised.
+        :param encoding: content encoding of revision payloads, i.e. ``gzip``
+            or ``identity``, defaults to ``DATAGATOR_API_CONTENT_ENCODING``.
+        :param pipeline: maximal number of full revision payloads queued for
+            committing in a background thread while new revisions are being
+            written, defaults to ``DATAGATOR_API_PIPELINE_DEPTH``. ``0``
+            means committing in the calling thread.
+        :param service: :class:`DataGatorService` (and its HTTP session) for
+            committing revisions, defaults to ``Entity.service``.
+        """
         if not isinstance(dataset, DataSet):
             raise TypeError("invalid dataset")
         self.__uri = dataset.uri
+        # URI shared by all revisions (and data items) of the dataset
+        self.__prefix = "{0}/{1}".format(dataset.repo.uri, dataset.name)
+        self.__encoding = encoding or environ.DATAGATOR_API_CONTENT_ENCODING
+        if self.__encoding not in ("gzip", "identity"):
+            raise ValueError("unsupported content encoding '{0}'".format(
+                self.__encoding))
+        self.__pipeline = environ.DATAGATOR_API_PIPELINE_DEPTH \
+            if pipeline is None else pipeline
+        self.__service = service
         super(ChangeSet, self).__init__()
         self.__lock = _thread.allocate_lock()
         self.__tmp = None
+        self.__out = None
         self.__cnt = 0
+        self.__queue = _queue.Queue(maxsize=max(1, self.__pipeline))
+        self.__committer = None
+        self.__error = None
+        self.__tasks = []
+        # sealed payloads (and their entries count) failed to be committed,
+        # which are retried in order before any consecutive revision
+        self.__pending = []
         self._rewind()
         pass
 
+    @property
+    def encoding(self):
+        return self.__encoding
+
+    @property
+    def pipeline(self):
+        return self.__pipeline
+
+    @property
+    def tasks(self):
+        """
+        ``list`` of :class:`TaskFuture` objects watching the backend tasks
+        of all revisions committed so far, in the order of commit
+        """
+        return list(self.__tasks)
+
     def commit(self):
         """
-        commit all pending revisions to the backend service
+        commit all pending revisions to the backend service, retrying those
+        failed before (in order)
+
+        :returns: ``list`` of :class:`TaskFuture` objects (see :attr:`tasks`).
         """
-        if len(self) > 0 and self.__tmp is not None:
+        if self.__cnt > 0 and self.__tmp is not None:
             self._commit()
-        pass
+        self._drain()
+        self._retry()
+        return self.tasks
 
     def _rewind(self):
 
-        if len(self) > 0:
+        if self.__cnt > 0:
             raise AssertionError("cannot rewind a pending revision")
         elif self.__tmp is not None:
             _log.debug("attempting to rewind an empty revision")
@@ -81,14 +137,22 @@ class ChangeSet(object):
         self.__tmp = tempfile.SpooledTemporaryFile(
             max_size=ChangeSet.MAX_BUFFER_BYTES, suffix=".DataGatorCache")
         fcntl.lockf(self.__tmp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # revisions are compressed while being written, such that the size
+        # of `self.__tmp` always reflects the (compressed) payload size
+        if self.encoding == "gzip":
+            self.__out = gzip.GzipFile(
+                fileobj=self.__tmp, mode="wb",
+                compresslevel=ChangeSet.COMPRESS_LEVEL)
+        else:
+            self.__out = self.__tmp
         self.__cnt = 0
-        self.__tmp.write(to_bytes("{"))
+        self.__out.write(to_bytes("{"))
 
         pass
 
     def _commit(self):
 
-        if len(self) == 0:
+        if self.__cnt == 0:
             _log.debug("attempting to commit an empty revision")
             # which is unnecessary, thus the short-cut return
             return
@@ -97,54 +161,150 @@ class ChangeSet(object):
         elif self.__tmp is None:
             raise AssertionError("cannot commit an uninitialized revision")
 
-        self.__tmp.write(to_bytes("}"))
+        # detach the full payload, and prepare for consecutive revisions
+        payload = self._seal()
+        self._rewind()
+
+        if self.pipeline > 0 and self.__error is None and not self.__pending:
+            self._enqueue(payload)
+        else:
+            # failed revisions (if any) are retried in the calling thread,
+            # once the background committer has stopped, to keep the order
+            self._drain(reraise=False)
+            self.__pending.append(payload)
+            self._retry()
+
+        pass
+
+    def _seal(self):
+
+        self.__out.write(to_bytes("}"))
+        if self.__out is not self.__tmp:
+            # flush compressed data and trailer (`self.__tmp` is kept open)
+            self.__out.close()
         self.__tmp.flush()
-        self.__tmp.seek(0, SEEK_END)
+
+        payload = (self.__tmp, self.__cnt)
+        self.__tmp = self.__out = None
+        self.__cnt = 0
+        self.__lock.release()
+
+        return payload
+
+    def _upload(self, tmp, cnt):
+
+        tmp.seek(0, SEEK_END)
 
         _log.debug("committing revision")
-        _log.debug("  - entries count: {0}".format(len(self)))
-        _log.debug("  - payload size: {0}".format(self.__tmp.tell()))
+        _log.debug("  - entries count: {0}".format(cnt))
+        _log.debug("  - payload size: {0}".format(tmp.tell()))
+        _log.debug("  - content encoding: {0}".format(self.encoding))
+
+        headers = {}
+        if self.encoding != "identity":
+            headers['Content-Encoding'] = self.encoding
+
+        # data items of the new revision are no longer missing
+        Entity.missing.discard(self.__prefix)
 
         try:
-            self.__tmp.seek(0, SEEK_SET)
-            with validated(Entity.service.patch(
-                    self.__uri, data=self.__tmp), (202, )) as r:
-                # TODO watch task for completion
-                pass
+            tmp.seek(0, SEEK_SET)
+            with validated((self.__service or Entity.service).patch(
+                    self.__uri, data=tmp, headers=headers), (202, )) as r:
+                # the revision is committed asynchronously by the backend
+                if "Location" in r.headers:
+                    self.__tasks.append(TaskFuture(r.headers['Location']))
         except Exception as e:
             _log.error(e)
             raise
         else:
-            # prepare for consecutive revisions
-            fcntl.lockf(self.__tmp, fcntl.LOCK_UN)
-            self.__tmp.close()
-            self.__tmp = None
-            self.__cnt = 0
-            self.__lock.release()
-            self._rewind()
+            # failed payloads are kept (intact) for retrying
+            self._discard(tmp, cnt)
+
+        pass
+
+    def _retry(self):
+        """
+        commit pending (i.e. previously failed) payloads in order, and stop at
+        the first failure
+        """
+        while self.__pending:
+            self._upload(*self.__pending[0])
+            self.__pending.pop(0)
+        pass
+
+    def _discard(self, tmp, cnt):
+        fcntl.lockf(tmp, fcntl.LOCK_UN)
+        tmp.close()
+        pass
+
+    def _enqueue(self, payload):
+
+        if self.__committer is None:
+            self.__committer = threading.Thread(target=self._background)
+            self.__committer.daemon = True
+            self.__committer.start()
+
+        # blocks while the pipeline is full
+        self.__queue.put(payload)
+
+        # fail early if a preceding revision failed in background, whereas
+        # `payload` is kept pending after it (in order) for retrying
+        if self.__error is not None:
+            self._drain()
+
+        pass
+
+    def _background(self):
+        while True:
+            payload = self.__queue.get()
+            if payload is None:
+                break
+            if self.__error is not None:
+                # revisions following a failed one are kept pending, too
+                self.__pending.append(payload)
+                continue
+            try:
+                self._upload(*payload)
+            except Exception as e:
+                self.__pending.append(payload)
+                self.__error = e
+        pass
 
+    def _drain(self, reraise=True):
+        """
+        wait for background commits, and re-raise the first failure (if any)
+        """
+        if self.__committer is not None:
+            self.__queue.put(None)
+            self.__committer.join()
+            self.__committer = None
+        error, self.__error = self.__error, None
+        if error is not None and reraise:
+            raise error
         pass
 
     def __setitem__(self, key, value):
         _log.debug("appending to revision")
-        key = json.dumps(key)
-        value = value.read() if hasattr(value, "read") else json.dumps(value)
-        _log.debug("  - key: {0}".format(key))
+        key = json_dumps(key)
+        value = value.read() if hasattr(value, "read") else json_dumps(value)
+        _log.debug("  - key: {0}".format(to_unicode(key, "utf-8")))
         _log.debug("  - size: {0}".format(len(value)))
         # write serialized value to temporary file
-        f = self.__tmp
-        if len(self):
+        f = self.__out
+        if self.__cnt:
             f.write(to_bytes(", "))
         f.write(to_bytes(key))
         f.write(to_bytes(": "))
         f.write(to_bytes(value))
         self.__cnt += 1
-        if f.tell() < ChangeSet.MAX_PAYLOAD_BYTES:
+        if self.__tmp.tell() < ChangeSet.MAX_PAYLOAD_BYTES:
             return
         self._commit()
 
     def __len__(self):
-        return self.__cnt
+        # entries not yet committed, including those of failed revisions
+        return self.__cnt + sum([cnt for tmp, cnt in self.__pending])
 
     def __enter__(self):
         self._rewind()
@@ -152,16 +312,16 @@ class ChangeSet(object):
 
     def __exit__(self, ext_type, exc_value, traceback):
         if isinstance(exc_value, Exception):
-            pass
+            self._drain(reraise=False)
         else:
-            self._commit()
+            self.commit()
         return False  # re-raise exception
 
     def __del__(self):
         try:
             if len(self) > 0:
                 _log.warning("pending revision left until garbage collection")
-                self._commit()
+            self.commit()
         except:
             _log.error("failed to commit pending revisions")
             raise
@@ -190,7 +350,6 @@ class DataSet(Entity):
                 try:
                     with validated(Entity.service.get(uri)) as r:
                         data = r.json()
-                        Entity.schema.validate(data)
                         assert(data['kind'] == "datagator#DataSet")
                         name = data['name']
                 except (jsonschema.ValidationError, AssertionError):
@@ -208,7 +367,7 @@ class DataSet(Entity):
 
     __slots__ = ['__name', '__repo', '__rev', '__writer', '__items_dict', ]
 
-    def __init__(self, repo, name, rev=None):
+    def __init__(self, repo, name, rev=None, service=None):
         super(DataSet, self).__init__(self.__class__.__name__)
         self.__name = to_unicode(name)
         self.__repo = repo
@@ -227,11 +386,11 @@ class DataSet(Entity):
         # when `rev` is not `None`, the dataset is SHOULD exist in the backend
         # service (i.e. we are pulling remote data for use).
         else:
-            # when `rev` is -1, we always invalidate the cached dataset, and
-            # pull the remote revision from the backend service.
+            # when `rev` is -1, we always revalidate the cached dataset with
+            # the backend service, and pull the remote revision if changed.
             if rev == -1:
-                del self.cache
-            remote_rev = self.cache.get("rev", None)
+                self._cache_revalidate(None, service)
+            remote_rev = self._cache_getter(service).get("rev", None)
             assert(rev == remote_rev or rev == -1), \
                 "inconsistent revision '{0}' != '{1}'".format(remote_rev, rev)
             # when invoking `self.cache`, `self.rev` is already synchronized,
@@ -267,17 +426,21 @@ class DataSet(Entity):
     def rev(self):
         return self.__rev
 
-    @property
-    def cache(self):
-        content = super(DataSet, self)._cache_getter()
+    def _cache_getter(self, service=None):
+        content = super(DataSet, self)._cache_getter(service)
         # synchronize with the remote revision upon cache overwrite
         if self.__rev is None:
             self.__rev = content.get("rev", None)
         return content
 
-    @cache.deleter
-    def cache(self):
+    def _cache_deleter(self):
         super(DataSet, self)._cache_deleter()
+        self._reset()
+        pass
+
+    cache = property(_cache_getter, None, _cache_deleter)
+
+    def _reset(self):
         self.__items_dict = None
         self.__rev = None
         pass
@@ -297,8 +460,14 @@ class DataSet(Entity):
     def __exit__(self, ext_type, exc_value, traceback):
         assert(self.__writer is not None), "committer not initialized"
         res = self.__writer.__exit__(ext_type, exc_value, traceback)
-        del self.cache
-        del self.repo.cache
+        # invalidate the dataset (both the revision in use and the latest
+        # revision) along with the repo in one batch
+        keys = self._cache_keys() + self.repo._cache_keys()
+        if self.rev is not None:
+            latest = "{0}/{1}".format(self.repo.uri, self.name)
+            keys += [latest, Entity.store.meta_key(latest)]
+        Entity.store.delete_many(keys)
+        self._reset()
         return res
 
     def __contains__(self, key):
@@ -331,17 +500,31 @@ class DataSet(Entity):
     def __len__(self):
         return len(self.items_dict)
 
-    def patch(self, changes):
+    def patch(self, changes, service=None):
         """
         :param items: `dict` or sequence of key-value pairs, representing
             create / update / delete operations to be committed.
+        :param service: :class:`DataGatorService` (and its HTTP session) for
+            committing the revisions, defaults to ``Entity.service``.
+        :returns: ``list`` of :class:`TaskFuture` objects watching the
+            backend tasks of the committed revisions.
         """
         if not isinstance(changes, dict):
             changes = dict(changes)
-        with self as c:
-            for key, value in changes.items():
-                c[key] = value
-        pass
+        writer = self.__writer
+        if service is not None:
+            # revisions pending in the writer of this dataset (if any) are
+            # not committed through a different service
+            self.__writer = ChangeSet(self, service=service)
+        try:
+            with self as c:
+                committed = len(c.tasks)
+                for key, value in changes.items():
+                    c[key] = value
+        finally:
+            if service is not None:
+                self.__writer = writer
+        return c.tasks[committed:]
 
     def clear(self):
         self.patch([(key, None) for key in self])
@@ -405,19 +588,46 @@ class Repo(Entity):
             # because the latter may trigger connection to the backend service
             if Entity.store.exists(ref.uri):
                 return True
+            # datasets listed by the repo exist, which is also known offline
+            if self._latest_rev(dsname) is not None:
+                return True
             return ref.cache is not None
         except (AssertionError, RuntimeError, ):
             return False
         return False  # should NOT reach here
 
     def __getitem__(self, dsname):
+        return self._dataset(dsname)
+
+    def _dataset(self, dsname, service=None):
+        """
+        Dataset ``dsname`` fetched through ``service`` (if given).
+        """
         try:
-            # always return the latested revision
-            return DataSet(self, dsname, -1)
+            # always return the latested revision, as advertised by the
+            # revalidated listing of datasets, so that a cached (immutable)
+            # revision is reused without downloading the dataset again.
+            rev = self._latest_rev(dsname, service)
+            if rev is not None:
+                return DataSet(self, dsname, rev, service)
+            return DataSet(self, dsname, -1, service)
         except (AssertionError, RuntimeError, ):
             pass
         raise KeyError("invalid dataset '{0}'".format(dsname))
 
+    def _latest_rev(self, dsname, service=None):
+        """
+        Revision of dataset ``dsname`` in the listing of datasets, which is
+        revalidated with a conditional request (unless the backend service
+        is unreachable), or ``None`` if not listed.
+        """
+        listing = self._cache_revalidate(
+            Entity.store.get(self.uri, None), service)
+        for ref in listing.get("items", []):
+            if ref.get("name") == dsname:
+                return ref.get("rev", None)
+        return None
+
     def __setitem__(self, dsname, items):
         ref = None
         try:
@@ -425,6 +635,7 @@ class Repo(Entity):
         except (AssertionError, ):
             raise KeyError("invalid dataset name")
         # create / update dataset
+        Entity.missing.discard(ref.uri)
         with validated(Entity.service.put(ref.uri, ref.ref), (200, 201)) as r:
             # since v2, data set creation / update is a synchronized
             # operation, no task will be created whatsoever
@@ -445,4 +656,102 @@ class Repo(Entity):
     def __len__(self):
         return self.cache.get("itemsCount", 0)
 
+    DEFAULT_PREFETCH_WORKERS = 8
+
+    def prefetch(self, workers=DEFAULT_PREFETCH_WORKERS, kinds=None):
+        """
+        Warm up the local cache with the latest revision of all datasets in
+        the repo, and their data items, fetched by a pool of worker threads.
+
+        :param workers: number of concurrent worker threads.
+        :param kinds: ``list`` or ``tuple`` of data item kinds to prefetch,
+            e.g. ``("Matrix", )``, defaults to all kinds. Pass an empty
+            sequence to prefetch datasets only.
+        :returns: number of entities fetched into the local cache.
+        :raises RuntimeError: if any entity failed to be fetched, listing the
+            URIs of all failed entities once the pool of workers drains.
+        """
+
+        if kinds is not None:
+            kinds = set([normalized(k) for k in kinds])
+
+        # always start from the latest listing of datasets
+        self._cache_revalidate()
+        names = list(self)
+
+        tasks = _queue.Queue()
+        state = {'count': 0, 'errors': []}
+        lock = _thread.allocate_lock()
+
+        def fetch_dataset(ds):
+            uri = ds.uri
+            ds._cache_revalidate()
+            content = ds.cache
+            meta = Entity.store.get_meta(uri, None) or {}
+            # `ds.uri` now bears the synchronized revision, keep an immutable
+            # copy for `DataSet(repo, name, rev)` lookups
+            Entity.store.put_many([
+                (ds.uri, content),
+                (Entity.store.meta_key(ds.uri), meta), ])
+            for key, item in ds.items_dict.items():
+                if kinds is None or normalized(item.get("kind")) in kinds:
+                    tasks.put((fetch_item, (ds[key], )))
+            pass
+
+        def fetch_item(item):
+            item.cache
+            pass
+
+        def worker():
+            while True:
+                task = tasks.get()
+                if task is None:
+                    break
+                func, args = task
+                uri = args[0].uri
+                try:
+                    func(*args)
+                except Exception as e:
+                    _log.warning("failed to prefetch '{0}': {1}".format(
+                        uri, e))
+                    with lock:
+                        state['errors'].append(uri)
+                else:
+                    with lock:
+                        state['count'] += 1
+                finally:
+                    tasks.task_done()
+            pass
+
+        for name in names:
+            tasks.put((fetch_dataset, (DataSet(self, name), )))
+
+        pool = [threading.Thread(target=worker)
+                for i in range(max(1, workers))]
+        for t in pool:
+            t.daemon = True
+            t.start()
+
+        # items are enqueued by dataset tasks before they are marked done, so
+        # the queue is only drained when all entities have been fetched
+        tasks.join()
+
+        # stop the worker threads
+        for t in pool:
+            tasks.put(None)
+        for t in pool:
+            t.join()
+
+        _log.debug("prefetched repo '{0}'".format(self.name))
+        _log.debug("  - entities: {0}".format(state['count']))
+        _log.debug("  - failures: {0}".format(len(state['errors'])))
+
+        if state['errors']:
+            raise RuntimeError(
+                "failed to prefetch {0} entities of repo '{1}': {2}".format(
+                    len(state['errors']), self.name,
+                    ", ".join(sorted(state['errors']))))
+
+        return state['count']
+
     pass
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+    datagator.api.client.task
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/20
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from ._compat import to_native, _queue, _thread
+from ._entity import Entity, validated
+
+
+__all__ = ['TaskFuture', 'as_completed', 'wait', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger(__name__)
+
+
+class TaskPoller(object):
+    """
+    Background thread polling the status of pending tasks in the order of
+    their scheduled time, shared by all :class:`TaskFuture` objects
+    """
+
+    # the thread quits after idling for a while, and restarts on demand
+    IDLE_TIMEOUT = 60.0
+
+    __slots__ = ['__cond', '__heap', '__seq', '__thread', ]
+
+    def __init__(self):
+        super(TaskPoller, self).__init__()
+        self.__cond = threading.Condition()
+        self.__heap = []
+        self.__seq = itertools.count()
+        self.__thread = None
+        pass
+
+    def schedule(self, future, delay):
+        """
+        poll ``future`` after ``delay`` seconds
+        """
+        with self.__cond:
+            heapq.heappush(
+                self.__heap, (time.time() + delay, next(self.__seq), future))
+            self._start()
+            self.__cond.notify()
+        pass
+
+    def _start(self):
+        # invoked with `self.__cond` acquired
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self._run)
+            self.__thread.daemon = True
+            self.__thread.start()
+        pass
+
+    def _run(self):
+        while True:
+            with self.__cond:
+                while True:
+                    if not self.__heap:
+                        self.__cond.wait(TaskPoller.IDLE_TIMEOUT)
+                        if not self.__heap:
+                            self.__thread = None
+                            return
+                        continue
+                    due, seq, future = self.__heap[0]
+                    delay = due - time.time()
+                    if delay <= 0:
+                        heapq.heappop(self.__heap)
+                        break
+                    self.__cond.wait(delay)
+            # poll outside the lock, which may re-schedule the future
+            try:
+                future._poll()
+            except BaseException as e:
+                # the failed future is resolved, and the thread is replaced
+                # for polling the remaining ones (if any)
+                future._resolve(None, e)
+                with self.__cond:
+                    self.__thread = None
+                    if self.__heap:
+                        self._start()
+                raise
+        pass
+
+    pass
+
+
+class TaskFuture(object):
+    """
+    Handle to an asynchronous task of the backend service (i.e. committing
+    a revision, baking a recipe, or converting a matrix), whose status is
+    polled with exponential backoff until the task succeeds or fails.
+    """
+
+    INITIAL_DELAY = 0.5
+    BACKOFF_FACTOR = 1.5
+    MAX_DELAY = 30.0
+    MAX_ERRORS = 5
+
+    poller = TaskPoller()
+
+    __slots__ = ['__url', '__lock', '__done', '__task', '__error',
+                 '__callbacks', '__delay', '__errors', ]
+
+    def __init__(self, url, pending=True):
+        """
+        :param url: URL of the task (i.e. the ``Location`` header of a
+            ``202 Accepted`` response).
+        :param pending: ``False`` if the outcome is readily available (i.e.
+            ``201 Created``), in which case the task is never polled.
+        """
+        super(TaskFuture, self).__init__()
+        self.__url = url
+        self.__lock = _thread.allocate_lock()
+        self.__done = threading.Event()
+        self.__task = None
+        self.__error = None
+        self.__callbacks = []
+        self.__delay = TaskFuture.INITIAL_DELAY
+        self.__errors = 0
+        if pending:
+            TaskFuture.poller.schedule(self, self.__delay)
+        else:
+            self._resolve(None, None)
+        pass
+
+    @property
+    def url(self):
+        return self.__url
+
+    @property
+    def task(self):
+        """
+        last known status of the task (``datagator#Task``)
+        """
+        return self.__task
+
+    def done(self):
+        return self.__done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Block until the task succeeds or fails, returns ``True`` if the task
+        completed within ``timeout`` seconds.
+        """
+        self.__done.wait(timeout)
+        return self.__done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Block until the task succeeds or fails, returns the final status of
+        the task (``None`` if the outcome was readily available).
+        """
+        if not self.wait(timeout):
+            raise RuntimeError("timeout waiting for task '{0}'".format(
+                self.url))
+        if self.__error is not None:
+            raise self.__error
+        return self.__task
+
+    def add_done_callback(self, func):
+        """
+        Call ``func(future)`` upon completion of the task.
+        """
+        with self.__lock:
+            if not self.__done.is_set():
+                self.__callbacks.append(func)
+                return
+        func(self)
+        pass
+
+    def _poll(self):
+        try:
+            with validated(Entity.service.get(self.url)) as r:
+                task = r.json()
+                assert(task.get("kind") == "datagator#Task"), \
+                    "unexpected entity kind '{0}'".format(task.get("kind"))
+        except Exception as e:
+            self.__errors += 1
+            _log.warning("failed to poll task '{0}': {1}".format(self.url, e))
+            if self.__errors >= TaskFuture.MAX_ERRORS:
+                self._resolve(None, e)
+                return
+        else:
+            self.__task = task
+            status = task.get("status")
+            if status == "SUC":
+                self._resolve(task, None)
+                return
+            elif status == "ERR":
+                self._resolve(task, RuntimeError(
+                    "failed task '{0}'".format(self.url)))
+                return
+        self.__delay = min(
+            self.__delay * TaskFuture.BACKOFF_FACTOR, TaskFuture.MAX_DELAY)
+        TaskFuture.poller.schedule(self, self.__delay)
+        pass
+
+    def _resolve(self, task, error):
+        with self.__lock:
+            self.__task = task
+            self.__error = error
+            self.__done.set()
+            callbacks, self.__callbacks = self.__callbacks, []
+        for func in callbacks:
+            try:
+                func(self)
+            except Exception as e:
+                _log.error(e)
+        pass
+
+    def __repr__(self):
+        return "<{0} '{1}' at 0x{2:x}>".format(
+            self.__class__.__name__, self.url, id(self))
+
+    pass
+
+
+def as_completed(futures, timeout=None):
+    """
+    Iterate over ``futures`` in the order of completion.
+
+    :param timeout: maximal number of seconds to wait for all futures.
+    """
+    futures = list(futures)
+    done = _queue.Queue()
+    for f in futures:
+        f.add_done_callback(done.put)
+    deadline = None if timeout is None else time.time() + timeout
+    for i in range(len(futures)):
+        try:
+            yield done.get(
+                timeout=None if deadline is None else
+                max(0.0, deadline - time.time()))
+        except _queue.Empty:
+            raise RuntimeError("timeout waiting for tasks")
+    pass
+
+
+def wait(futures, timeout=None):
+    """
+    Wait for ``futures`` to complete, returns a 2-``tuple`` of ``set`` of
+    completed and pending futures (after ``timeout`` seconds).
+    """
+    futures = set(futures)
+    deadline = None if timeout is None else time.time() + timeout
+    for f in futures:
+        f.wait(None if deadline is None else max(0.0, deadline - time.time()))
+    done = set([f for f in futures if f.done()])
+    return done, futures - done
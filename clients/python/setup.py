@@ -63,7 +63,8 @@ pkg = __import__('datagator.api.client', fromlist=["datagator.api"])
 
 setup(
     name=PACKAGE,
-    packages=["datagator.api.client", "datagator.api.client._backend"],
+    packages=["datagator.api.client", "datagator.api.client._backend",
+              "datagator.api.client._cache"],
     package_dir={
         "datagator": join(".", "datagator", ),
         "datagator.api": join(".", "datagator", "api"),
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    tests.bench_validation
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Benchmark of the compiled schema validator against the interpreted
+    ``jsonschema.Draft4Validator`` on the ``data/json`` fixtures, i.e.
+
+    .. code-block:: bash
+
+        $ python -m tests.bench_validation [repeat]
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/25
+"""
+
+from __future__ import print_function, unicode_literals
+
+import hashlib
+import json
+import jsonschema
+import os
+import sys
+import timeit
+
+try:
+    from . import config
+    from .config import *
+except (ValueError, ImportError):
+    import config
+    from config import *
+
+from datagator.api.client._schema import CompiledValidator
+
+
+__all__ = ['main', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+SCHEMA = os.path.join(os.path.dirname(__file__), "..", "clients", "python",
+                      "datagator", "api", "client", "schema.json")
+
+
+def fixtures():
+    root = os.path.join(config.DATA_DIR, "json")
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.endswith(".json"):
+                continue
+            name = os.path.relpath(os.path.join(dirpath, filename), root)
+            raw = load_data(os.path.join("json", name))
+            yield name, raw, json.loads(to_unicode(raw, "utf-8"))
+    pass
+
+
+def best(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(repeat=5):
+    with open(SCHEMA, "r") as f:
+        schema = json.load(f)
+    interpreted = jsonschema.Draft4Validator(schema)
+    compiled = CompiledValidator(schema)
+
+    row = "{0:<36} {1:>10} {2:>10} {3:>10} {4:>10} {5:>8}"
+    print(row.format("fixture", "bytes", "draft4/ms", "compiled", "memoized",
+                     "speedup"))
+    total = [0.0, 0.0, 0.0]
+    for name, raw, data in fixtures():
+        assert(interpreted.is_valid(data) == compiled.is_valid(data)), \
+            "validators disagree on '{0}'".format(name)
+        digest = hashlib.sha1(raw).digest()
+        compiled.validate(data, digest)
+        t = [best(lambda: interpreted.validate(data), repeat),
+             best(lambda: compiled.validate(data), repeat),
+             best(lambda: compiled.validate(data, digest), repeat), ]
+        total = [a + b for a, b in zip(total, t)]
+        print(row.format(name, len(raw), *(
+            ["{0:.3f}".format(x * 1000) for x in t] +
+            ["{0:.1f}x".format(t[0] / t[1])])))
+    print(row.format("total", "", *(
+        ["{0:.3f}".format(x * 1000) for x in total] +
+        ["{0:.1f}x".format(total[0] / total[1])])))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(a) for a in sys.argv[1:2]]))
@@ -18,8 +18,16 @@ import jsonschema
 import logging
 import os
 import sys
+import threading
 import time
 
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
 try:
     from . import config
     from .config import *
@@ -28,7 +36,9 @@ except (ValueError, ImportError):
     from config import *
 
 from datagator.api.client import environ
-from datagator.api.client._backend import DataGatorService
+from datagator.api.client._backend import DataGatorService, RequestMetrics
+from datagator.api.client._backend import RateLimitGovernor
+from datagator.api.client._backend.metrics import uri_template
 
 
 __all__ = ['TestBackendStatus',
@@ -37,7 +47,9 @@ __all__ = ['TestBackendStatus',
            'TestDataItemOperations',
            'TestRecipeOperations',
            'TestSearchOperations',
-           'TestRateLimit', ]
+           'TestRateLimit',
+           'TestRateLimitGovernor',
+           'TestRequestMetrics', ]
 __all__ = [to_native(n) for n in __all__]
 
 
@@ -83,6 +95,15 @@ class TestBackendStatus(unittest.TestCase):
         self.assertEqual(msg.get("version"), environ.DATAGATOR_API_VERSION)
         pass  # void return
 
+    def test_backend_metrics(self):
+        service = DataGatorService(hooks=[RequestMetrics()])
+        msg = service.status
+        metrics = service.metrics
+        self.assertTrue("GET /" in metrics)
+        self.assertEqual(metrics["GET /"].get("count"), 1)
+        self.assertEqual(metrics["GET /"].get("status"), {"200": 1})
+        pass  # void return
+
     pass
 
 
@@ -684,6 +705,189 @@ class TestRateLimit(unittest.TestCase):
 
         pass
 
+    def test_ratelimit_governor(self):
+
+        r = self.service.get("/")
+        status = self.service.ratelimit
+
+        self.assertEqual(status['limit'], int(r.headers["X-RateLimit-Limit"]))
+        self.assertEqual(status['reset'], int(r.headers["X-RateLimit-Reset"]))
+        self.assertTrue(
+            status['remaining'] <= int(r.headers["X-RateLimit-Remaining"]))
+
+        pass
+
+    pass
+
+
+class TestRateLimitGovernor(unittest.TestCase):
+    """
+    Test pacing of requests with rate limiting headers (offline)
+    """
+
+    def headers(self, remaining, reset, limit=2000):
+        return {"X-RateLimit-Limit": str(limit),
+                "X-RateLimit-Remaining": str(remaining),
+                "X-RateLimit-Reset": str(int(reset))}
+
+    def grants(self, governor, n=1000):
+        count = 0
+        while count < n and governor.acquire(False):
+            count += 1
+        return count
+
+    def test_burst(self):
+        # no pacing without (or beyond the reset of) a reported budget
+        governor = RateLimitGovernor(burst=8)
+        self.assertEqual(self.grants(governor, 100), 100)
+        governor.update(self.headers(0, time.time() - 1))
+        self.assertEqual(self.grants(governor, 100), 100)
+        # ample budget is paced by the size of the bucket
+        governor.update(self.headers(2000, time.time() + 3600))
+        self.assertEqual(self.grants(governor), 8)
+        pass  # void return
+
+    def test_remaining(self):
+        governor = RateLimitGovernor(burst=64)
+        governor.update(self.headers(5, time.time() + 3600))
+        self.assertEqual(self.grants(governor), 5)
+        self.assertEqual(governor.status['remaining'], 0)
+        pass  # void return
+
+    def test_exhausted(self):
+        governor = RateLimitGovernor(burst=64)
+        governor.update(self.headers(0, time.time() + 3600))
+        self.assertEqual(self.grants(governor), 0)
+        # blocks until the (imminent) reset of the budget
+        governor = RateLimitGovernor(burst=64)
+        reset = int(time.time()) + 2
+        governor.update(self.headers(0, reset))
+        self.assertEqual(self.grants(governor), 0)
+        self.assertTrue(governor.acquire())
+        self.assertTrue(time.time() >= reset)
+        pass  # void return
+
+    pass
+
+
+class Chunked(BaseHTTPRequestHandler):
+    """
+    Backend service (offline) replying with a chunked body, whose chunks are
+    sent ``DELAY`` seconds apart
+    """
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+        pass
+
+    CHUNKS = [b"[", b"1, 2, 3", b"]"]
+    DELAY = 0.1
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.flush()
+        try:
+            for chunk in self.CHUNKS + [b""]:
+                time.sleep(self.DELAY)
+                self.wfile.write(to_bytes("{0:x}\r\n".format(len(chunk))))
+                self.wfile.write(chunk + b"\r\n")
+                self.wfile.flush()
+        except IOError:
+            # abandoned by the client
+            self.close_connection = True
+        pass
+
+    def log_message(self, *args):
+        pass
+
+    pass
+
+
+class TestRequestMetrics(unittest.TestCase):
+    """
+    Test per-endpoint metrics of requests (offline)
+    """
+
+    def setUp(self):
+        self.env = environ.DATAGATOR_API_SCHEME, environ.DATAGATOR_API_HOST
+        self.server = Chunked.Server(("127.0.0.1", 0), Chunked)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        environ.DATAGATOR_API_SCHEME = "http"
+        environ.DATAGATOR_API_HOST = "127.0.0.1:{0}".format(
+            self.server.server_address[1])
+        self.service = DataGatorService(governor=None,
+                                        hooks=[RequestMetrics()])
+        pass  # void return
+
+    def tearDown(self):
+        environ.DATAGATOR_API_SCHEME, environ.DATAGATOR_API_HOST = self.env
+        self.service.http.close()
+        self.server.shutdown()
+        self.server.server_close()
+        pass  # void return
+
+    def test_uri_template(self):
+        for url, template in (
+                ("", "/"),
+                ("schema", "schema"),
+                ("repo/Pardee", "repo/{repo}"),
+                ("repo/Pardee/IGO_Members.1", "repo/{repo}/{dataset}"),
+                ("repo/Pardee/IGO_Members/UN", "repo/{repo}/{dataset}/{item}"),
+                ("task/42", "task/{id}"), ):
+            self.assertEqual(uri_template("{0}/{1}".format(
+                environ.DATAGATOR_API_URL, url)), template)
+        pass  # void return
+
+    def test_streamed(self):
+        body = b"".join(Chunked.CHUNKS)
+        elapsed = Chunked.DELAY * (len(Chunked.CHUNKS) + 1)
+        r = self.service.get("repo/Pardee/IGO_Members/UN", stream=True)
+        # reported once the body is read through
+        self.assertEqual(self.service.metrics, {})
+        self.assertEqual(r.json(), [1, 2, 3])
+        stats = self.service.metrics["GET repo/{repo}/{dataset}/{item}"]
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['status'], {"200": 1})
+        self.assertEqual(stats['bytes'], len(body))
+        self.assertTrue(stats['latency']['sum'] >= elapsed)
+        self.assertTrue(stats['ttfb']['sum'] < elapsed)
+        # or closed, and only once
+        r = self.service.get("repo/Pardee", stream=True)
+        r.close()
+        r.close()
+        self.assertEqual(self.service.metrics["GET repo/{repo}"]['count'], 1)
+        # as is a request without streaming
+        self.service.get("repo/Pardee")
+        stats = self.service.metrics["GET repo/{repo}"]
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['bytes'], len(body))
+        pass  # void return
+
+    def test_prometheus(self):
+        self.service.get("repo/Pardee")
+        environ.DATAGATOR_API_HOST = "127.0.0.1:9"
+        self.assertRaises(IOError, self.service.get, "repo/Pardee")
+        text = self.service.hooks[0].prometheus()
+        labels = '{method="GET",uri="repo/{repo}"'
+        for line in (
+                "# TYPE datagator_client_requests_total counter",
+                'datagator_client_requests_total{0},status="200"}} 1',
+                'datagator_client_requests_total{0},status="error"}} 1',
+                "# TYPE datagator_client_request_seconds histogram",
+                'datagator_client_request_seconds_bucket{0},le="+Inf"}} 2',
+                "datagator_client_request_seconds_count{0}}} 2",
+                "datagator_client_ttfb_seconds_count{0}}} 1",
+                "datagator_client_response_bytes_total{0}}} 9", ):
+            self.assertTrue(line.format(labels) in text.splitlines(), line)
+        pass  # void return
+
     pass
 
 
@@ -0,0 +1,634 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    tests.test_cache
+    ~~~~~~~~~~~~~~~~
+
+    :copyright: 2015 by `University of Denver <http://pardee.du.edu/>`_
+    :license: Apache 2.0, see LICENSE for more details.
+
+    :author: `LIU Yu <liuyu@opencps.net>`_
+    :date: 2015/10/27
+"""
+
+from __future__ import unicode_literals, with_statement
+
+import errno
+import gc
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+try:
+    from . import config
+    from .config import *
+except (ValueError, ImportError):
+    import config
+    from config import *
+
+from datagator.api.client import environ
+from datagator.api.client import Repo
+from datagator.api.client.__main__ import main
+from datagator.api.client._cache.archive import export_cache, import_cache
+from datagator.api.client._cache.archive import seed_cache
+from datagator.api.client._cache.daemon import CacheDaemon, DaemonCache
+from datagator.api.client._cache.leveldb import LevelDbCache
+from datagator.api.client._cache.leveldb import PersistentLevelDbCache
+from datagator.api.client._cache import leveldb
+from datagator.api.client._cache.memory import MemoryCache
+from datagator.api.client._cache.policy import EvictionPolicy
+from datagator.api.client._cache.sqlite import SqliteCache
+from datagator.api.client._entity import Entity
+
+
+__all__ = ['TestSqliteCache',
+           'TestLevelDbCache',
+           'TestMemoryCache',
+           'TestEvictionPolicy',
+           'TestArchive',
+           'TestCacheDaemon', ]
+__all__ = [to_native(n) for n in __all__]
+
+
+_log = logging.getLogger("datagator.{0}".format(__name__))
+
+
+def load_json(name):
+    return json.loads(to_unicode(load_data(os.path.join("json", name))))
+
+
+class TestSqliteCache(unittest.TestCase):
+    """
+    SQLite cache backend (offline)
+    """
+
+    def setUp(self):
+        self.fs = tempfile.mktemp(suffix=".sqlite3", dir=config.TEMP_DIR)
+        self.cache = SqliteCache(self.fs, max_bytes=None)
+        pass  # void return
+
+    def test_get_put_delete(self):
+        data = load_json(os.path.join("IGO_Members", "UN.json"))
+        self.assertEqual(self.cache.get("repo/A", None), None)
+        self.cache.put("repo/A", data)
+        self.assertTrue(self.cache.exists("repo/A"))
+        self.assertEqual(self.cache.get("repo/A"), data)
+        self.assertEqual(json.loads(to_unicode(
+            self.cache.get_raw("repo/A").read())), data)
+        self.cache.put_meta("repo/A", {"ETag": "x"})
+        self.assertEqual(self.cache.get_meta("repo/A"), {"ETag": "x"})
+        self.assertEqual(sorted(self.cache.keys()),
+                         ["repo/A", "repo/A#meta"])
+        # shared by other connections (i.e. processes) to the same database
+        self.assertEqual(SqliteCache(self.fs).get("repo/A"), data)
+        self.cache.delete("repo/A")
+        self.assertFalse(self.cache.exists("repo/A"))
+        pass  # void return
+
+    def test_many(self):
+        items = dict([("repo/{0}".format(i), {"n": i}) for i in range(600)])
+        self.cache.put_many(items)
+        self.assertEqual(self.cache.get_many(
+            list(items) + ["repo/missing"]), items)
+        self.cache.delete_many(list(items)[:300])
+        self.assertEqual(len(self.cache.get_many(items)), 300)
+        pass  # void return
+
+    def test_atomic(self):
+        self.cache.put_many([("repo/A", {"n": 1}), ("repo/A#meta", {})])
+        # fail the second row of each batch within the database
+        self.cache.db.execute(
+            "CREATE TEMP TRIGGER fail_insert BEFORE INSERT ON entries "
+            "WHEN NEW.key = 'repo/C' BEGIN SELECT RAISE(ABORT, 'fail'); END")
+        self.cache.db.execute(
+            "CREATE TEMP TRIGGER fail_delete BEFORE DELETE ON entries "
+            "WHEN OLD.key = 'repo/A#meta' "
+            "BEGIN SELECT RAISE(ABORT, 'fail'); END")
+        self.assertRaises(sqlite3.DatabaseError, self.cache.put_many,
+                          [("repo/B", {"n": 2}), ("repo/C", {"n": 3})])
+        self.assertFalse(self.cache.exists("repo/B"))
+        self.assertRaises(sqlite3.DatabaseError, self.cache.delete_many,
+                          ["repo/A", "repo/A#meta"])
+        self.assertTrue(self.cache.exists("repo/A"))
+        # values failing to encode never reach the database
+        self.assertRaises(TypeError, self.cache.put_many,
+                          [("repo/B", {"n": 2}), ("repo/D", object())])
+        self.assertFalse(self.cache.exists("repo/B"))
+        pass  # void return
+
+    def test_evict(self):
+        for i in range(8):
+            self.cache.put("repo/{0}".format(i), {"value": "x" * 1000})
+            self.cache.put_meta("repo/{0}".format(i), {"ETag": str(i)})
+        # entries are evicted along with their metadata
+        self.assertTrue(self.cache.evict(self.cache.size // 2) > 0)
+        keys = set(self.cache.keys())
+        for i in range(8):
+            key = "repo/{0}".format(i)
+            self.assertEqual(key in keys, self.cache.meta_key(key) in keys)
+        self.assertTrue(0 < len(keys) < 16)
+        self.assertEqual(self.cache.evict(0), len(keys) // 2)
+        self.assertEqual(self.cache.size, 0)
+        pass  # void return
+
+    pass
+
+
+class TestLevelDbCache(unittest.TestCase):
+    """
+    LevelDB cache backend (offline)
+    """
+
+    def test_get_raw(self):
+        data = load_json(os.path.join("IGO_Members", "UN.json"))
+        for compression in (None, "zlib", ):
+            cache = LevelDbCache(compression=compression)
+            cache.put("repo/A", data)
+            # compressed values are streamed in pieces of any size
+            for size in (1, 1000, -1):
+                raw = cache.get_raw("repo/A")
+                chunks = [raw.read(size)]
+                while chunks[-1]:
+                    chunks.append(raw.read(size))
+                raw.close()
+                self.assertEqual(json.loads(to_unicode(b"".join(chunks))),
+                                 data)
+            # and served as-is through the memory tier
+            self.assertEqual(json.loads(to_unicode(MemoryCache(
+                cache).get_raw("repo/A").read())), data)
+            self.assertEqual(cache.get_raw("repo/B"), None)
+        pass  # void return
+
+    def stored(self, cache, key):
+        """
+        record of ``key`` as stored, i.e. the packed value of shared bodies
+        """
+        raw = bytes(cache.db.Get(to_bytes(key)))
+        if raw[:1] == leveldb.REFERENCE:
+            raw = bytes(cache.db.Get(to_bytes(
+                cache.BLOB_PREFIX + to_unicode(raw[1:]))))
+        return raw
+
+    def test_compression(self):
+        fs = tempfile.mktemp(suffix=".DataGatorCache", dir=config.TEMP_DIR)
+        data = load_json(os.path.join("IGO_Members", "UN.json"))
+        cache = PersistentLevelDbCache(fs, compression="zlib")
+        cache.put_many([("repo/A", data), ("repo/B", {"n": 1})])
+        # large values are compressed, and small ones stored as-is
+        self.assertEqual(self.stored(cache, "repo/A")[:1], leveldb.ZLIB)
+        self.assertTrue(len(self.stored(cache, "repo/A")) < len(
+            json.dumps(data)) // 2)
+        self.assertEqual(self.stored(cache, "repo/B")[:1], leveldb.IDENTITY)
+        del cache
+        gc.collect()
+        # values are readable regardless of the codec in use
+        cache = PersistentLevelDbCache(fs, compression=None)
+        self.assertEqual(cache.get("repo/A"), data)
+        self.assertEqual(cache.get_many(["repo/A", "repo/B"]),
+                         {"repo/A": data, "repo/B": {"n": 1}})
+        self.assertRaises(ValueError, LevelDbCache, compression="unknown")
+        pass  # void return
+
+    def test_dedup(self):
+        data = load_json(os.path.join("IGO_Members", "UN.json"))
+        cache = LevelDbCache()
+
+        def blobs():
+            return [to_unicode(bytes(k)) for k in cache.db.RangeIter(
+                to_bytes(cache.BLOB_PREFIX), include_value=False)
+                if to_unicode(bytes(k)).startswith(cache.BLOB_PREFIX)]
+
+        # identical bodies (i.e. revisions of an entity) share one blob
+        cache.put_many([("repo/A.1/UN", data), ("repo/A.2/UN", data)])
+        cache.put("repo/A.3/UN", data)
+        self.assertEqual(len(blobs()), 1)
+        self.assertEqual(cache.get("repo/A.3/UN"), data)
+        self.assertEqual(sorted(cache.keys()),
+                         ["repo/A.1/UN", "repo/A.2/UN", "repo/A.3/UN"])
+        # which is reference-counted through updates and deletions
+        cache.put("repo/A.1/UN", {"n": 1})
+        cache.delete("repo/A.2/UN")
+        self.assertEqual(len(blobs()), 1)
+        self.assertEqual(cache.get("repo/A.3/UN"), data)
+        cache.delete_many(["repo/A.3/UN", "repo/A.3/UN"])
+        self.assertEqual(blobs(), [])
+        # including keys updated more than once within one batch
+        cache.put_many([("repo/B", data), ("repo/B", data), ("repo/C", data)])
+        cache.delete_many(["repo/B", "repo/C"])
+        self.assertEqual(blobs(), [])
+        pass  # void return
+
+    def test_persistent(self):
+        fs = tempfile.mktemp(suffix=".DataGatorCache", dir=config.TEMP_DIR)
+        data = load_json(os.path.join("IGO_Members", "UN.json"))
+        cache = PersistentLevelDbCache(fs)
+        self.assertTrue(cache.persistent)
+        cache.put_many([("repo/A.1", data), ("repo/A.1#meta", {"ETag": "x"})])
+        # the database is locked by one process (i.e. cache) at a time
+        other = PersistentLevelDbCache(fs)
+        self.assertEqual(other.get("repo/A.1"), None)
+        self.assertFalse(other.persistent)
+        del cache, other
+        gc.collect()
+        # and survives the process (i.e. the cache) otherwise
+        cache = PersistentLevelDbCache(fs)
+        self.assertTrue(cache.persistent)
+        self.assertEqual(cache.get("repo/A.1"), data)
+        self.assertEqual(cache.get_meta("repo/A.1"), {"ETag": "x"})
+        cache.put("repo/A", {"n": 1})
+        del cache
+        gc.collect()
+        # caches over the size limit are pruned upon opening
+        cache = PersistentLevelDbCache(fs, max_bytes=1)
+        self.assertEqual(cache.get("repo/A"), None)
+        del cache
+        gc.collect()
+        self.assertTrue(os.path.isdir(fs))
+        pass  # void return
+
+    def test_version(self):
+        fs = tempfile.mktemp(suffix=".DataGatorCache", dir=config.TEMP_DIR)
+        cache = PersistentLevelDbCache(fs)
+        cache.put("repo/A.1", {"n": 1})
+        cache.db.Put(to_bytes(cache.VERSION_KEY), to_bytes("0"))
+        del cache
+        gc.collect()
+        # incompatible layouts are discarded upon opening
+        cache = PersistentLevelDbCache(fs)
+        self.assertEqual(cache.get("repo/A.1"), None)
+        self.assertEqual(list(cache.keys()), [])
+        pass  # void return
+
+    pass
+
+
+class TestMemoryCache(unittest.TestCase):
+    """
+    In-process tier of decoded entities (offline)
+    """
+
+    def setUp(self):
+        self.backend = LevelDbCache()
+        pass  # void return
+
+    def test_tier(self):
+        data = load_json(os.path.join("IGO_Members", "UN.json"))
+        cache = MemoryCache(self.backend)
+        cache.put("repo/A", data)
+        # decoded once, then shared by all callers
+        obj = cache.get("repo/A")
+        self.assertEqual(obj, data)
+        self.assertTrue(cache.get("repo/A") is obj)
+        self.assertTrue(cache.size > 0)
+        # served from the tier until forgotten, i.e. updated by others
+        self.backend.put("repo/A", {"n": 1})
+        self.assertTrue(cache.get("repo/A") is obj)
+        cache.forget("repo/A")
+        self.assertEqual(cache.get("repo/A"), {"n": 1})
+        cache.delete("repo/A")
+        self.assertEqual(cache.get("repo/A"), None)
+        self.assertFalse(self.backend.exists("repo/A"))
+        self.assertEqual(cache.size, 0)
+        pass  # void return
+
+    def test_max_bytes(self):
+        cache = MemoryCache(self.backend, max_bytes=100)
+        keys = ["repo/{0}".format(i) for i in range(4)]
+        cache.put_many([(k, {"value": "x" * 20}) for k in keys])
+        self.assertEqual(len(cache.get_many(keys)), 4)
+        self.assertTrue(cache.size <= 100)
+        # least recently used entries are evicted from the tier only
+        objs = dict([(k, cache.get(k)) for k in keys])
+        cache.get(keys[-1])
+        cache.put("repo/new", {"value": "y" * 20})
+        cache.get("repo/new")
+        self.assertTrue(cache.get(keys[-1]) is objs[keys[-1]])
+        self.assertFalse(cache.get(keys[0]) is objs[keys[0]])
+        self.assertEqual(cache.get(keys[0]), objs[keys[0]])
+        # objects larger than the budget are never kept
+        cache.put("repo/big", {"value": "z" * 200})
+        self.assertFalse(cache.get("repo/big") is cache.get("repo/big"))
+        self.assertTrue(cache.size <= 100)
+        pass  # void return
+
+    pass
+
+
+class TestEvictionPolicy(unittest.TestCase):
+    """
+    Budgets of cache backends (offline)
+    """
+
+    def setUp(self):
+        self.fs = tempfile.mktemp(suffix=".sqlite3", dir=config.TEMP_DIR)
+        pass  # void return
+
+    def test_ttl(self):
+        store = EvictionPolicy(MemoryCache(LevelDbCache()), ttl=1)
+        store.put("repo/R", {"n": 1})
+        store.put_meta("repo/R", {"ETag": "x"})
+        self.assertEqual(store.get("repo/R"), {"n": 1})
+        time.sleep(1.2)
+        # expired entities are dropped from the memory tier as well
+        self.assertEqual(store.get("repo/R"), None)
+        self.assertFalse(store.backend.exists("repo/R"))
+        self.assertEqual(store.get_meta("repo/R"), None)
+        self.assertEqual(store.stats['expirations'], 1)
+        pass  # void return
+
+    def test_max_entries(self):
+        store = EvictionPolicy(MemoryCache(LevelDbCache()), max_entries=2)
+        keys = ["repo/{0}".format(i) for i in range(5)]
+        for i, key in enumerate(keys):
+            store.put(key, {"n": i})
+            store.get(key)
+        found = store.get_many(keys)
+        self.assertTrue(len(found) <= 2)
+        self.assertEqual(len([k for k in keys if store.get(k)]), len(found))
+        self.assertEqual(store.stats['entries'], len(found))
+        pass  # void return
+
+    def test_max_bytes(self):
+        store = EvictionPolicy(LevelDbCache(), max_bytes=10000, order="lfu")
+        store.put("repo/hot", {"value": "x" * 1000})
+        for i in range(20):
+            store.get("repo/hot")
+            store.put("repo/{0}".format(i), {"value": "x" * 1000})
+        self.assertTrue(store.stats['bytes'] <= 10000)
+        self.assertTrue(store.exists("repo/hot"))
+        self.assertFalse(store.exists("repo/0"))
+        pass  # void return
+
+    def test_expired_first(self):
+        store = EvictionPolicy(
+            LevelDbCache(), max_entries=3, ttl=1, order="lfu")
+        store.put("repo/old", {"n": 0})
+        for i in range(5):
+            store.get("repo/old")
+        time.sleep(1.2)
+        for key in ("repo/a", "repo/b", "repo/c"):
+            store.put(key, {"n": 1})
+        # the expired entry is evicted ahead of less frequently used ones
+        self.assertFalse(store.backend.exists("repo/old"))
+        self.assertFalse(store.backend.exists("repo/a"))
+        self.assertTrue(store.backend.exists("repo/b"))
+        self.assertTrue(store.backend.exists("repo/c"))
+        self.assertEqual(store.stats['expirations'], 1)
+        self.assertEqual(store.stats['evictions'], 1)
+        pass  # void return
+
+    def test_shared(self):
+        # index of each process is reconciled with the shared backend
+        a = EvictionPolicy(SqliteCache(self.fs, None), max_entries=100)
+        b = EvictionPolicy(SqliteCache(self.fs, None), max_entries=100)
+        a.put("repo/A", {"n": 1})
+        b.put("repo/B", {"n": 2})
+        a.flush()
+        b.flush()
+        c = EvictionPolicy(SqliteCache(self.fs, None), max_entries=1)
+        self.assertEqual(c.stats['entries'], 2)
+        # untracked entries (i.e. index lost) are tracked upon loading
+        SqliteCache(self.fs, None).put("repo/C", {"n": 3})
+        SqliteCache(self.fs, None).delete(EvictionPolicy.INDEX_KEY)
+        d = EvictionPolicy(SqliteCache(self.fs, None), max_entries=10)
+        self.assertEqual(d.stats['entries'], 3)
+        c.put("repo/D", {"n": 4})
+        self.assertEqual(len([k for k in "ABCD" if c.exists(
+            "repo/{0}".format(k))]), 1)
+        pass  # void return
+
+    pass
+
+
+class TestArchive(unittest.TestCase):
+    """
+    Export, import and seeding of the cache for offline use
+    """
+
+    def setUp(self):
+        self.fs = tempfile.mktemp(suffix=".sqlite3", dir=config.TEMP_DIR)
+        self.path = os.path.join(config.DATA_DIR, "json")
+        pass  # void return
+
+    def test_roundtrip(self):
+        store = SqliteCache(self.fs, None)
+        count = seed_cache(store, self.path, "TestArchive")
+        meta = store.get_meta("repo/TestArchive")
+        self.assertTrue(meta.get("Last-Modified"))
+        self.assertEqual(meta.get("X-DataGator-Entity"), "datagator#Repo")
+        archive = tempfile.mktemp(suffix=".zip", dir=config.TEMP_DIR)
+        self.assertEqual(export_cache(store, archive), count)
+        # bodies are archived as stored, i.e. without re-encoding
+        uri = "repo/TestArchive/IGO_Members.1/UN"
+        with open_data(os.path.join("json", "IGO_Members", "UN.json")) as f:
+            body = f.read()
+        zf = zipfile.ZipFile(archive, "r")
+        try:
+            index = json.loads(to_unicode(zf.read(to_native("index.json"))))
+            entry = [e for e in index['entries'] if e['uri'] == uri][0]
+            self.assertEqual(entry['rev'], 1)
+            self.assertEqual(entry['kind'], "datagator#Matrix")
+            self.assertEqual(zf.read(to_native(
+                "blobs/{0}.json".format(entry['blob']))), body)
+        finally:
+            zf.close()
+        other = SqliteCache(tempfile.mktemp(dir=config.TEMP_DIR), None)
+        self.assertEqual(import_cache(other, archive), count)
+        self.assertEqual(sorted(other.keys()), sorted(store.keys()))
+        self.assertEqual(other.get(uri), json.loads(to_unicode(body)))
+        self.assertEqual(other.get_meta(uri), store.get_meta(uri))
+        self.assertEqual(import_cache(other, archive, False), 0)
+        pass  # void return
+
+    def test_main(self):
+        archive = tempfile.mktemp(suffix=".zip", dir=config.TEMP_DIR)
+        self.assertEqual(main(["cache", "seed", "TestMain", self.path]), 0)
+        self.assertEqual(main(["cache", "export", archive]), 0)
+        self.assertEqual(main(["cache", "import", "--keep", archive]), 0)
+        self.assertEqual(main(["cache", "unknown"]), 2)
+        self.assertEqual(main(["cache", "seed", "TestMain"]), 2)
+        pass  # void return
+
+    def test_offline(self):
+        store, Entity.store = Entity.store, SqliteCache(self.fs, None)
+        host = environ.DATAGATOR_API_HOST
+        try:
+            seed_cache(Entity.store, self.path, "TestOffline")
+            # the backend service is unreachable (i.e. connection refused)
+            environ.DATAGATOR_API_HOST = "127.0.0.1:9"
+            repo = Repo("TestOffline")
+            ds = repo["IGO_Members"]
+            self.assertEqual(ds.rev, 1)
+            self.assertEqual(ds["UN"].cache, load_json(
+                os.path.join("IGO_Members", "UN.json")))
+            self.assertTrue("IGO_Members" in repo)
+            self.assertEqual(len(repo), len(list(repo)))
+        finally:
+            environ.DATAGATOR_API_HOST = host
+            Entity.store = store
+        pass  # void return
+
+    pass
+
+
+class TestCacheDaemon(unittest.TestCase):
+    """
+    Cache shared with other processes through the cache daemon (offline)
+    """
+
+    class NotFound(BaseHTTPRequestHandler):
+
+        # paths requested from the backend service
+        requests = []
+
+        def do_GET(self):
+            self.requests.append(self.path)
+            body = to_bytes(json.dumps({
+                "kind": "datagator#Error",
+                "code": 404,
+                "message": "not found", }))
+            self.send_response(404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "{0}".format(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            pass
+
+        def log_message(self, *args):
+            pass
+
+        pass
+
+    def setUp(self):
+        self.path = tempfile.mktemp(suffix=".sock", dir=config.TEMP_DIR)
+        self.daemon = CacheDaemon(LevelDbCache(), self.path)
+        thread = threading.Thread(target=self.daemon.serve_forever)
+        thread.daemon = True
+        thread.start()
+        pass  # void return
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.daemon.server_close()
+        pass  # void return
+
+    def test_ops(self):
+        cache = DaemonCache(self.path)
+        data = load_json(os.path.join("IGO_Members", "UN.json"))
+        cache.put_many([("repo/A", data), ("repo/A#meta", {"ETag": "x"})])
+        self.assertEqual(cache.get("repo/A"), data)
+        self.assertEqual(cache.get_meta("repo/A"), {"ETag": "x"})
+        self.assertEqual(json.loads(to_unicode(
+            cache.get_raw("repo/A").read())), data)
+        self.assertEqual(sorted(cache.keys()), ["repo/A", "repo/A#meta"])
+        self.assertTrue(cache.exists("repo/A"))
+        cache.delete_many(["repo/A", "repo/A#meta"])
+        self.assertFalse(cache.exists("repo/A"))
+        # unavailable daemon degrades to cache misses
+        cache = DaemonCache(tempfile.mktemp(dir=config.TEMP_DIR))
+        self.assertEqual(cache.get("repo/A", "miss"), "miss")
+        self.assertEqual(cache.fetch("repo/A", "Repo"), None)
+        pass  # void return
+
+    def test_socket(self):
+        # the socket of a running daemon is left intact
+        try:
+            CacheDaemon(LevelDbCache(), self.path)
+        except IOError as e:
+            self.assertEqual(e.errno, errno.EADDRINUSE)
+        else:
+            self.fail("socket of a running daemon replaced")
+        cache = DaemonCache(self.path)
+        cache.put("repo/A", {})
+        self.assertEqual(cache.get("repo/A"), {})
+        # while that of a crashed daemon (i.e. nobody listening) is replaced
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        path = tempfile.mktemp(suffix=".sock", dir=config.TEMP_DIR)
+        sock.bind(to_native(path))
+        sock.close()
+        CacheDaemon(LevelDbCache(), path).server_close()
+        pass  # void return
+
+    def test_permission(self):
+        umask = os.umask(0o022)
+        try:
+            path = os.path.join(tempfile.mkdtemp(dir=config.TEMP_DIR),
+                                "cache", "daemon.sock")
+            daemon = CacheDaemon(LevelDbCache(), path)
+            self.assertEqual(os.umask(0o022), 0o022)
+        finally:
+            os.umask(umask)
+        try:
+            # never accessible by others, not even before being chmod'ed
+            self.assertEqual(os.stat(path).st_mode & 0o077, 0)
+            self.assertEqual(
+                os.stat(os.path.dirname(path)).st_mode & 0o777, 0o700)
+        finally:
+            daemon.server_close()
+        pass  # void return
+
+    def test_timeout(self):
+        # connections are accepted (by the backlog), but never served
+        path = tempfile.mktemp(suffix=".sock", dir=config.TEMP_DIR)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(to_native(path))
+        sock.listen(1)
+        try:
+            cache = DaemonCache(path, timeout=0.2)
+            start = time.time()
+            self.assertEqual(cache.get("repo/A", "miss"), "miss")
+            self.assertFalse(cache.exists("repo/A"))
+            self.assertTrue(time.time() - start < 5)
+        finally:
+            sock.close()
+            os.unlink(path)
+        pass  # void return
+
+    def test_missing(self):
+        server = HTTPServer(("127.0.0.1", 0), TestCacheDaemon.NotFound)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        scheme, host = environ.DATAGATOR_API_SCHEME, environ.DATAGATOR_API_HOST
+        proxy, Entity.proxy = Entity.proxy, DaemonCache(self.path)
+        try:
+            environ.DATAGATOR_API_SCHEME = "http"
+            environ.DATAGATOR_API_HOST = "127.0.0.1:{0}".format(
+                server.server_address[1])
+            del TestCacheDaemon.NotFound.requests[:]
+            # found missing by the daemon, and recorded by this process
+            for i in range(2):
+                self.assertRaises(RuntimeError, Repo, "TestCacheDaemon")
+            self.assertTrue("repo/TestCacheDaemon" in Entity.missing)
+            self.assertEqual(len(TestCacheDaemon.NotFound.requests), 1)
+        finally:
+            environ.DATAGATOR_API_SCHEME = scheme
+            environ.DATAGATOR_API_HOST = host
+            Entity.proxy = proxy
+            Entity.missing.discard("repo/TestCacheDaemon")
+            server.shutdown()
+            server.server_close()
+        pass  # void return
+
+    pass
+
+
+def test_suite():
+    return unittest.TestSuite([
+        unittest.TestLoader().loadTestsFromTestCase(eval(c)) for c in __all__])
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest=to_native("test_suite"))
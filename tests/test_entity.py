@@ -13,14 +13,26 @@
 
 from __future__ import unicode_literals
 
+import contextlib
+import gzip
+import hashlib
 import io
 import json
 import jsonschema
 import logging
 import os
 import sys
+import tempfile
+import threading
 import time
 
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
 try:
     from . import config
     from .config import *
@@ -30,10 +42,41 @@ except (ValueError, ImportError):
 
 from datagator.api.client import environ
 from datagator.api.client import Repo, DataSet
+from datagator.api.client._buffer import ResponseBuffer
+from datagator.api.client._cache.archive import seed_cache
+from datagator.api.client._cache.leveldb import LevelDbCache
+from datagator.api.client._cache.sqlite import SqliteCache
+from datagator.api.client._compat import JSON_CODECS, json_codec
+from datagator.api.client._compat import memoryview
+from datagator.api.client._entity import Entity, NegativeCache, validated
+from datagator.api.client.repo import ChangeSet
+from datagator.api.client._stream import JsonArrayReader
+from datagator.api.client.task import TaskFuture, TaskPoller
+from datagator.api.client.task import as_completed, wait
+
+try:
+    import asyncio
+    from datagator.api.client import aio, _aio
+    from datagator.api.client._backend.aio import AsyncDataGatorService
+except ImportError:
+    aio = None
 
 
 __all__ = ['TestRepo',
-           'TestDataSet']
+           'TestDataSet',
+           'TestChangeSet',
+           'TestRevalidate',
+           'TestLatestRevision',
+           'TestNegativeCache',
+           'TestSingleFlight',
+           'TestPrefetch',
+           'TestTaskFuture',
+           'TestTaskPoller',
+           'TestSchema',
+           'TestResponseBuffer',
+           'TestJsonArrayReader',
+           'TestJsonCodec',
+           'TestAsync']
 __all__ = [to_native(n) for n in __all__]
 
 
@@ -150,6 +193,972 @@ class TestDataSet(unittest.TestCase):
 
         pass  # void return
 
+    def test_DataSet_patch(self):
+        repo = Repo(self.repo, self.secret)
+        ds = repo['IGO_Members']
+        tasks = ds.patch({
+            "OPEC": json.loads(to_unicode(
+                load_data(os.path.join("json", "IGO_Members", "OPEC.json")))),
+        })
+        self.assertEqual(len(tasks), 1)
+        for t in as_completed(tasks):
+            self.assertEqual(t.result().get("status"), "SUC")
+        pass  # void return
+
+    def test_Matrix_iter_rows(self):
+        repo = Repo(self.repo, self.secret)
+        m = repo['IGO_Members']['UN']
+        rows = json.loads(to_unicode(load_data(
+            os.path.join("json", "IGO_Members", "UN.json"))))['rows']
+        # streamed from the backend service, then from the local cache
+        self.assertEqual(list(m.iter_rows()), rows)
+        self.assertEqual(list(m.iter_rows()), rows)
+        pass  # void return
+
+    pass
+
+
+class Backend(BaseHTTPRequestHandler):
+    """
+    Backend service (offline) serving the entities in :attr:`store`, i.e.
+    fixtures seeded as revision 1 of all datasets, and accepting revisions
+    """
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+        pass
+
+    # persistent connections, as with the backend service
+    protocol_version = "HTTP/1.1"
+
+    # cache manager holding the entities (and their kinds) served
+    store = None
+
+    # `(method, path)` and status codes of all requests, `(content encoding,
+    # payload)` of all committed revisions, and client addresses of all
+    # connections
+    requests = []
+    replies = []
+    patches = []
+    connections = set()
+
+    # number of upcoming revisions dropped (without response) as if the
+    # connection was lost
+    failures = 0
+
+    # seconds to wait before serving each entity, i.e. a slow connection
+    delay = 0
+
+    @classmethod
+    def start(cls, repo):
+        cls.store = LevelDbCache()
+        seed_cache(cls.store, os.path.join(config.DATA_DIR, "json"), repo)
+        del cls.requests[:]
+        del cls.replies[:]
+        del cls.patches[:]
+        cls.connections.clear()
+        cls.failures = 0
+        cls.delay = 0
+        server = Backend.Server(("127.0.0.1", 0), cls)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        server.env = environ.DATAGATOR_API_SCHEME, environ.DATAGATOR_API_HOST
+        environ.DATAGATOR_API_SCHEME = "http"
+        environ.DATAGATOR_API_HOST = "127.0.0.1:{0}".format(
+            server.server_address[1])
+        return server
+
+    @classmethod
+    def stop(cls, server):
+        environ.DATAGATOR_API_SCHEME, environ.DATAGATOR_API_HOST = server.env
+        server.shutdown()
+        server.server_close()
+        pass
+
+    @classmethod
+    def count(cls, uri):
+        return len([p for m, p in cls.requests if p == uri])
+
+    def reply(self, code, data=None, kind=None, headers={}):
+        body = to_bytes(json.dumps(data)) if data is not None else b""
+        self.replies.append(code)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        if kind is not None:
+            self.send_header("X-DataGator-Entity", kind)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", "{0}".format(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        pass
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.connections.add(self.client_address)
+        pass
+
+    def do_GET(self):
+        uri = self.path.split("/", 3)[-1]
+        self.requests.append(("GET", uri))
+        time.sleep(Backend.delay)
+        # unversioned datasets refer to their (only) revision
+        for key in (uri, "{0}.1".format(uri)):
+            data = self.store.get(key, None)
+            if data is not None:
+                break
+        if data is None:
+            return self.reply(404, {
+                "kind": "datagator#Error",
+                "code": 404,
+                "message": "not found", })
+        etag = "\"{0}\"".format(hashlib.sha1(to_bytes(json.dumps(
+            data, sort_keys=True))).hexdigest())
+        if self.headers.get("If-None-Match") == etag:
+            return self.reply(304, headers={"ETag": etag})
+        self.reply(200, data, data['kind'], {"ETag": etag})
+        pass
+
+    def do_PATCH(self):
+        self.requests.append(("PATCH", self.path.split("/", 3)[-1]))
+        if "Content-Length" in self.headers:
+            body = self.rfile.read(int(self.headers['Content-Length']))
+        else:
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+                if size == 0:
+                    break
+            body = b"".join(chunks)
+        if Backend.failures > 0:
+            Backend.failures -= 1
+            self.close_connection = True
+            return
+        self.patches.append((self.headers.get("Content-Encoding"), body))
+        self.reply(202, {
+            "kind": "datagator#Status",
+            "code": 202,
+            "message": "accepted", })
+        pass
+
+    def log_message(self, *args):
+        pass
+
+    pass
+
+
+class TestChangeSet(unittest.TestCase):
+    """
+    Spooling and committing of revision payloads (offline)
+    """
+
+    def setUp(self):
+        self.server = Backend.start("TestChangeSet")
+        self.ds = DataSet(Repo("TestChangeSet"), "IGO_Members")
+        self.items = dict([(name[:-5], json.loads(to_unicode(load_data(
+            os.path.join("json", "IGO_Members", name)))))
+            for name in ("UN.json", "OPEC.json", "WTO.json")])
+        pass  # void return
+
+    def tearDown(self):
+        Backend.stop(self.server)
+        pass  # void return
+
+    def revisions(self):
+        for encoding, body in Backend.patches:
+            if encoding == "gzip":
+                body = gzip.GzipFile(fileobj=io.BytesIO(body)).read()
+            yield json.loads(to_unicode(body))
+        pass
+
+    def test_encoding(self):
+        for encoding in ("gzip", "identity"):
+            del Backend.patches[:]
+            with ChangeSet(self.ds, encoding, 0) as c:
+                for key, value in self.items.items():
+                    c[key] = value
+            self.assertEqual(Backend.patches[0][0],
+                             encoding if encoding != "identity" else None)
+            self.assertEqual(list(self.revisions()), [self.items])
+        pass  # void return
+
+    def test_retry(self):
+        # failed revisions are kept intact (compressed) for retrying
+        Backend.failures = 1
+        c = ChangeSet(self.ds, "gzip", 0)
+        for key, value in self.items.items():
+            c[key] = value
+        self.assertRaises(IOError, c.commit)
+        self.assertEqual(len(c), len(self.items))
+        self.assertEqual(Backend.patches, [])
+        c["WTO"] = self.items["WTO"]
+        self.assertEqual(c.commit(), [])
+        self.assertEqual(len(c), 0)
+        self.assertEqual(list(self.revisions()),
+                         [self.items, {"WTO": self.items["WTO"]}])
+        pass  # void return
+
+    def test_split(self):
+        # payloads are split into revisions by their (compressed) size, and
+        # committed in order by the background committer
+        limit = ChangeSet.MAX_PAYLOAD_BYTES
+        ChangeSet.MAX_PAYLOAD_BYTES = 1
+        try:
+            with ChangeSet(self.ds, "gzip", 2) as c:
+                for key in sorted(self.items):
+                    c[key] = self.items[key]
+        finally:
+            ChangeSet.MAX_PAYLOAD_BYTES = limit
+        revisions = list(self.revisions())
+        self.assertEqual(len(revisions), len(self.items))
+        self.assertEqual([list(r)[0] for r in revisions], sorted(self.items))
+        pass  # void return
+
+    def test_pipeline(self):
+        # revisions failed in background are kept pending (in order), along
+        # with all revisions following them
+        limit = ChangeSet.MAX_PAYLOAD_BYTES
+        ChangeSet.MAX_PAYLOAD_BYTES = 1
+        Backend.failures = 1
+        try:
+            c = ChangeSet(self.ds, "identity", 1)
+            errors = []
+            for key in sorted(self.items):
+                try:
+                    c[key] = self.items[key]
+                except IOError as e:
+                    errors.append(e)
+            try:
+                c.commit()
+            except IOError as e:
+                errors.append(e)
+                self.assertTrue(len(c) > 0)
+                c.commit()
+            # retried along with a following revision, or by the commit
+            self.assertTrue(len(errors) <= 1)
+        finally:
+            ChangeSet.MAX_PAYLOAD_BYTES = limit
+        self.assertEqual(len(c), 0)
+        self.assertEqual(len([m for m, p in Backend.requests
+                              if m == "PATCH"]), len(self.items) + 1)
+        revisions = list(self.revisions())
+        self.assertEqual([list(r)[0] for r in revisions], sorted(self.items))
+        pass  # void return
+
+    pass
+
+
+class TestRevalidate(unittest.TestCase):
+    """
+    Conditional requests of cached entities (offline)
+    """
+
+    def setUp(self):
+        self.server = Backend.start("TestRevalidate")
+        pass  # void return
+
+    def tearDown(self):
+        Backend.stop(self.server)
+        pass  # void return
+
+    def test_not_modified(self):
+        uri = "repo/TestRevalidate"
+        repo = Repo("TestRevalidate")
+        with contextlib.closing(Entity.store.get_raw(uri)) as f:
+            raw = f.read()
+        meta = Entity.store.get_meta(uri)
+        self.assertTrue(meta.get("ETag"))
+        for i in range(3):
+            self.assertEqual(repo._cache_revalidate(), repo.cache)
+        self.assertEqual(Backend.replies, [200, 304, 304, 304])
+        # cached bytes and metadata are reused, and so is the connection
+        with contextlib.closing(Entity.store.get_raw(uri)) as f:
+            self.assertEqual(f.read(), raw)
+        self.assertEqual(Entity.store.get_meta(uri), meta)
+        self.assertEqual(len(Backend.connections), 1)
+        pass  # void return
+
+    def test_unexpected(self):
+        repo = Repo("TestRevalidate")
+        etag = Entity.store.get_meta(repo.uri)['ETag']
+        r = Entity.service.get(repo.uri, {"If-None-Match": etag}, stream=True)
+        self.assertEqual(r.status_code, 304)
+        self.assertRaises(RuntimeError, validated(r, (200, )).__enter__)
+        with validated(Entity.service.get(
+                repo.uri, {"If-None-Match": etag}), (200, 304)) as r:
+            self.assertRaises(RuntimeError, r.json)
+        self.assertEqual(len(Backend.connections), 1)
+        pass  # void return
+
+    pass
+
+
+class TestLatestRevision(unittest.TestCase):
+    """
+    Datasets resolved to the revisions listed by their repo (offline)
+    """
+
+    def setUp(self):
+        self.server = Backend.start("TestLatestRevision")
+        pass  # void return
+
+    def tearDown(self):
+        Backend.stop(self.server)
+        pass  # void return
+
+    def test_getitem(self):
+        uri = "repo/TestLatestRevision"
+        repo = Repo("TestLatestRevision")
+        ds = repo["IGO_Members"]
+        self.assertEqual(ds.rev, 1)
+        self.assertEqual(Backend.count("{0}/IGO_Members".format(uri)), 0)
+        # the cached revision is reused once the listing is revalidated
+        n = len(Backend.requests)
+        self.assertEqual(repo["IGO_Members"].cache, ds.cache)
+        self.assertEqual(Backend.requests[n:], [("GET", uri)])
+        # while a new revision is fetched once listed
+        listing = Backend.store.get(uri)
+        for ref in listing['items']:
+            if ref['name'] == "IGO_Members":
+                ref['rev'] = 2
+        data = dict(ds.cache)
+        data['rev'] = 2
+        Backend.store.put_many([
+            ("{0}/IGO_Members.2".format(uri), data), (uri, listing)])
+        self.assertEqual(repo["IGO_Members"].rev, 2)
+        self.assertEqual(repo["IGO_Members"].cache, data)
+        self.assertEqual(Backend.count("{0}/IGO_Members.2".format(uri)), 1)
+        self.assertEqual(Backend.count("{0}/IGO_Members".format(uri)), 0)
+        pass  # void return
+
+    pass
+
+
+class TestNegativeCache(unittest.TestCase):
+    """
+    Entities recently found missing are not requested again (offline)
+    """
+
+    def setUp(self):
+        self.server = Backend.start("TestNegativeCache")
+        pass  # void return
+
+    def tearDown(self):
+        Backend.stop(self.server)
+        Entity.missing.discard("repo/TestNegativeCache")
+        Entity.missing.discard("repo/NoSuchRepo")
+        pass  # void return
+
+    def test_dataset(self):
+        uri = "repo/TestNegativeCache/Missing"
+        repo = Repo("TestNegativeCache")
+        for i in range(3):
+            self.assertRaises(KeyError, repo.__getitem__, "Missing")
+            self.assertFalse("Missing" in repo)
+        self.assertEqual(Backend.count(uri), 1)
+        self.assertTrue(uri in Entity.missing)
+        # forgotten once (about to be) created by this process
+        Entity.missing.discard("repo/TestNegativeCache")
+        self.assertFalse(uri in Entity.missing)
+        self.assertRaises(KeyError, repo.__getitem__, "Missing")
+        self.assertEqual(Backend.count(uri), 2)
+        pass  # void return
+
+    def test_repo(self):
+        for i in range(3):
+            self.assertRaises(
+                (AssertionError, RuntimeError), Repo, "NoSuchRepo")
+        self.assertEqual(Backend.count("repo/NoSuchRepo"), 1)
+        pass  # void return
+
+    def test_ttl(self):
+        missing = NegativeCache(0.2)
+        missing.add("repo/A/B")
+        missing.add("repo/C")
+        self.assertTrue("repo/A/B" in missing)
+        self.assertFalse("repo/A" in missing)
+        missing.discard("repo/A")
+        self.assertFalse("repo/A/B" in missing)
+        self.assertTrue("repo/C" in missing)
+        time.sleep(0.3)
+        self.assertFalse("repo/C" in missing)
+        # records are disabled with zero ttl
+        missing = NegativeCache(0)
+        missing.add("repo/C")
+        self.assertFalse("repo/C" in missing)
+        pass  # void return
+
+    pass
+
+
+class TestSingleFlight(unittest.TestCase):
+    """
+    Concurrent requests of the same entity share one round trip (offline)
+    """
+
+    THREADS = 8
+
+    def setUp(self):
+        self.server = Backend.start("TestSingleFlight")
+        self.repo = Repo("TestSingleFlight")
+        Backend.delay = 0.2
+        pass  # void return
+
+    def tearDown(self):
+        Backend.stop(self.server)
+        Entity.missing.discard("repo/TestSingleFlight")
+        pass  # void return
+
+    def race(self, func):
+        results = [None] * self.THREADS
+
+        def run(i):
+            try:
+                results[i] = (func(), None)
+            except Exception as e:
+                results[i] = (None, e)
+            pass
+
+        pool = [threading.Thread(target=run, args=(i, ))
+                for i in range(self.THREADS)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        return results
+
+    def test_cold(self):
+        item = self.repo["IGO_Members"]["UN"]
+        Entity.store.delete_many(item._cache_keys())
+        Entity.fresh.discard(item.uri)
+        results = self.race(lambda: item.cache)
+        self.assertEqual(Backend.count(item.uri), 1)
+        self.assertTrue(all([data == results[0][0] and e is None
+                             for data, e in results]))
+        self.assertEqual(results[0][0]['kind'], "datagator#Matrix")
+        pass  # void return
+
+    def test_missing(self):
+        uri = "repo/TestSingleFlight/Missing"
+        ds = DataSet(self.repo, "Missing")
+        results = self.race(lambda: ds.cache)
+        self.assertEqual(Backend.count(uri), 1)
+        self.assertTrue(all([data is None and e is results[0][1]
+                             for data, e in results]))
+        self.assertTrue(isinstance(results[0][1], RuntimeError))
+        pass  # void return
+
+    def test_revalidate(self):
+        uri = "repo/TestSingleFlight/IGO_Members"
+        results = self.race(
+            lambda: DataSet(self.repo, "IGO_Members", -1).rev)
+        self.assertEqual(Backend.count(uri), 1)
+        self.assertEqual(results, [(1, None)] * self.THREADS)
+        pass  # void return
+
+    pass
+
+
+class TestPrefetch(unittest.TestCase):
+    """
+    Warm up the local cache with all datasets in a repo (offline)
+    """
+
+    def setUp(self):
+        # prefetched entities stay in the local cache across test cases
+        self.name = "TestPrefetch_{0}".format(self._testMethodName)
+        self.server = Backend.start(self.name)
+        pass  # void return
+
+    def tearDown(self):
+        Backend.stop(self.server)
+        pass  # void return
+
+    def items(self, kind=None):
+        uris = []
+        listing = Backend.store.get("repo/{0}".format(self.name))
+        for ref in listing['items']:
+            uri = "repo/{0}/{1}.1".format(self.name, ref['name'])
+            for item in Backend.store.get(uri)['items']:
+                if kind is None or item['kind'] == kind:
+                    uris.append("{0}/{1}".format(uri, item['name']))
+        return len(listing['items']), uris
+
+    def test_kinds(self):
+        n, uris = self.items("datagator#Matrix")
+        self.assertTrue(len(uris) > 0)
+        repo = Repo(self.name)
+        self.assertEqual(repo.prefetch(workers=2, kinds=("Matrix", )),
+                         n + len(uris))
+        for uri in uris:
+            self.assertTrue(Entity.store.exists(uri))
+            self.assertEqual(Backend.count(uri), 1)
+        n, others = self.items()
+        for uri in set(others) - set(uris):
+            self.assertEqual(Backend.count(uri), 0)
+        # datasets only
+        self.assertEqual(repo.prefetch(kinds=()), n)
+        pass  # void return
+
+    def test_prefetch(self):
+        n, uris = self.items()
+        repo = Repo(self.name)
+        self.assertEqual(repo.prefetch(workers=4), n + len(uris))
+        for uri in uris:
+            self.assertTrue(Entity.store.exists(uri))
+        # prefetched entities are served from the local cache
+        count = len(Backend.requests)
+        for name in repo:
+            ds = repo[name]
+            self.assertEqual(ds.rev, 1)
+            for key in ds:
+                ds[key].cache
+        uri = "repo/{0}".format(self.name)
+        self.assertTrue(all([m == "GET" and p == uri
+                             for m, p in Backend.requests[count:]]))
+        pass  # void return
+
+    def test_failures(self):
+        n, uris = self.items()
+        missing = sorted(uris[:2])
+        Backend.store.delete_many(missing)
+        repo = Repo(self.name)
+        try:
+            repo.prefetch(workers=4)
+        except RuntimeError as e:
+            self.assertTrue("failed to prefetch 2 entities" in str(e))
+            self.assertTrue(", ".join(missing) in str(e))
+        else:
+            self.fail("RuntimeError not raised by prefetch")
+        # the other entities are prefetched regardless
+        for uri in uris:
+            self.assertEqual(Entity.store.exists(uri), uri not in missing)
+        pass  # void return
+
+    pass
+
+
+class TestTaskFuture(unittest.TestCase):
+    """
+    Tasks of the backend service watched by futures (offline)
+    """
+
+    class Poller(object):
+        """
+        Records the delays of scheduled polls, which are left to the test
+        """
+
+        def __init__(self):
+            self.delays = []
+            pass
+
+        def schedule(self, future, delay):
+            self.delays.append(delay)
+            pass
+
+        pass
+
+    def setUp(self):
+        self.server = Backend.start("TestTaskFuture")
+        self.poller, TaskFuture.poller = TaskFuture.poller, self.Poller()
+        pass  # void return
+
+    def tearDown(self):
+        TaskFuture.poller = self.poller
+        Backend.stop(self.server)
+        pass  # void return
+
+    def task(self, uri, status):
+        Backend.store.put(uri, {
+            "kind": "datagator#Task",
+            "status": status,
+            "options": {},
+            "handler": "commit",
+            "args": [],
+            "kwargs": {}, })
+        return TaskFuture(uri)
+
+    def test_backoff(self):
+        delay = TaskFuture.MAX_DELAY
+        TaskFuture.MAX_DELAY = 2.0
+        try:
+            f = self.task("task/backoff", "RUN")
+            for i in range(6):
+                f._poll()
+        finally:
+            TaskFuture.MAX_DELAY = delay
+        self.assertEqual(TaskFuture.poller.delays,
+                         [0.5, 0.75, 1.125, 1.6875, 2.0, 2.0, 2.0])
+        self.assertEqual(f.task['status'], "RUN")
+        self.assertFalse(f.done())
+        self.assertEqual(Backend.count("task/backoff"), 6)
+        pass  # void return
+
+    def test_result(self):
+        f = self.task("task/SUC", "SUC")
+        f._poll()
+        self.assertEqual(f.result(0)['status'], "SUC")
+        f = self.task("task/ERR", "ERR")
+        f._poll()
+        self.assertTrue(f.done())
+        self.assertRaises(RuntimeError, f.result, 0)
+        self.assertEqual(f.task['status'], "ERR")
+        # readily available outcomes are never polled
+        f = TaskFuture("task/none", pending=False)
+        self.assertEqual(f.result(0), None)
+        self.assertEqual(len(TaskFuture.poller.delays), 2)
+        pass  # void return
+
+    def test_errors(self):
+        f = TaskFuture("task/missing")
+        for i in range(TaskFuture.MAX_ERRORS):
+            self.assertFalse(f.done())
+            f._poll()
+        self.assertRaises(RuntimeError, f.result, 0)
+        self.assertEqual(f.task, None)
+        self.assertEqual(Backend.count("task/missing"),
+                         TaskFuture.MAX_ERRORS)
+        self.assertEqual(len(TaskFuture.poller.delays), TaskFuture.MAX_ERRORS)
+        pass  # void return
+
+    def test_timeout(self):
+        done = self.task("task/done", "SUC")
+        done._poll()
+        pending = self.task("task/pending", "RUN")
+        self.assertRaises(RuntimeError, pending.result, 0.1)
+        self.assertEqual(wait([done, pending], 0.1), (set([done]),
+                                                      set([pending])))
+        completed = []
+        try:
+            for f in as_completed([pending, done], 0.1):
+                completed.append(f)
+        except RuntimeError:
+            pass
+        else:
+            self.fail("RuntimeError not raised by as_completed")
+        self.assertEqual(completed, [done])
+        pass  # void return
+
+    pass
+
+
+class TestTaskPoller(unittest.TestCase):
+    """
+    Background thread polling tasks (offline)
+    """
+
+    class Future(object):
+
+        def __init__(self, error=None):
+            self.polled = threading.Event()
+            self.error = error
+            self.resolved = None
+            pass
+
+        def _poll(self):
+            self.polled.set()
+            if self.error is not None:
+                raise self.error
+            pass
+
+        def _resolve(self, task, error):
+            self.resolved = error
+            pass
+
+        pass
+
+    class Fatal(BaseException):
+        pass
+
+    def setUp(self):
+        self.timeout = TaskPoller.IDLE_TIMEOUT
+        TaskPoller.IDLE_TIMEOUT = 0.1
+        self.excepthook = getattr(threading, "excepthook", None)
+        if self.excepthook is not None:
+            threading.excepthook = lambda args: None
+        pass  # void return
+
+    def tearDown(self):
+        TaskPoller.IDLE_TIMEOUT = self.timeout
+        if self.excepthook is not None:
+            threading.excepthook = self.excepthook
+        pass  # void return
+
+    def alive(self, poller):
+        thread = poller._TaskPoller__thread
+        return thread is not None and thread.is_alive()
+
+    def test_idle(self):
+        poller = TaskPoller()
+        f = self.Future()
+        poller.schedule(f, 0)
+        self.assertTrue(f.polled.wait(5))
+        time.sleep(0.3)
+        self.assertEqual(poller._TaskPoller__thread, None)
+        # restarted on demand
+        f = self.Future()
+        poller.schedule(f, 0)
+        self.assertTrue(f.polled.wait(5))
+        self.assertTrue(self.alive(poller))
+        pass  # void return
+
+    def test_fatal(self):
+        poller = TaskPoller()
+        fatal = self.Future(self.Fatal())
+        f = self.Future()
+        poller.schedule(fatal, 0)
+        poller.schedule(f, 0.1)
+        self.assertTrue(fatal.polled.wait(5))
+        # the failed future is resolved, and the remaining ones are polled by
+        # a replacement thread
+        self.assertTrue(f.polled.wait(5))
+        self.assertTrue(isinstance(fatal.resolved, self.Fatal))
+        f = self.Future()
+        poller.schedule(f, 0)
+        self.assertTrue(f.polled.wait(5))
+        pass  # void return
+
+    pass
+
+
+class TestSchema(unittest.TestCase):
+    """
+    Compiled entity schema
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.validator = jsonschema.Draft4Validator(Entity.schema.schema)
+        pass  # void return
+
+    def test_fixtures(self):
+        for dsname in ("IGO_Members", "Treaties", ):
+            path = os.path.join(config.DATA_DIR, "json", dsname)
+            for filename in sorted(os.listdir(path)):
+                data = json.loads(to_unicode(load_data(
+                    os.path.join("json", dsname, filename))))
+                self.assertTrue(Entity.schema.is_valid(data))
+                Entity.schema.validate(data)
+                # invalidate the fixture in ways caught by the schema
+                for key, value in (("kind", "datagator#Unknown"),
+                                   ("name", "#"),
+                                   ("rows", [])):
+                    invalid = dict(data)
+                    invalid[key] = value
+                    self.assertEqual(Entity.schema.is_valid(invalid),
+                                     self.validator.is_valid(invalid))
+                    self.assertRaises(jsonschema.ValidationError,
+                                      Entity.schema.validate, invalid)
+        pass  # void return
+
+    def test_structural(self):
+        data = json.loads(to_unicode(load_data(
+            os.path.join("json", "Embassies", "2010.json"))))
+        Entity.schema.validate(data, structural=True)
+        # rows inconsistent with the counts of the matrix
+        for key, value in (("rowsCount", 1),
+                           ("columnHeaders", len(data['rows']) + 1),
+                           ("rows", data['rows'][:-1] + [[]])):
+            invalid = dict(data)
+            invalid[key] = value
+            self.assertRaises(jsonschema.ValidationError,
+                              Entity.schema.validate, invalid, None, True)
+        pass  # void return
+
+    def test_iter_rows(self):
+        data = json.loads(to_unicode(load_data(
+            os.path.join("json", "Embassies", "2010.json"))))
+        header = dict([(k, v) for k, v in data.items() if k != "rows"])
+        rows = Entity.schema.iter_rows(iter(data['rows']), header)
+        self.assertEqual(list(rows), data['rows'])
+        # rows of inconsistent shape are rejected as they are streamed
+        invalid = data['rows'][:2] + [[]] + data['rows'][2:]
+        rows = Entity.schema.iter_rows(iter(invalid), header)
+        self.assertEqual(next(rows), invalid[0])
+        self.assertEqual(next(rows), invalid[1])
+        self.assertRaises(jsonschema.ValidationError, next, rows)
+        # header inconsistent with the rows, or invalid against the schema
+        for key, value in (("rowsCount", 1), ("kind", "datagator#Unknown")):
+            invalid = dict(header)
+            invalid[key] = value
+            rows = Entity.schema.iter_rows(iter(data['rows']), invalid)
+            self.assertRaises(jsonschema.ValidationError, list, rows)
+        pass  # void return
+
+    pass
+
+
+class TestResponseBuffer(unittest.TestCase):
+    """
+    Buffer of response bodies shared by the JSON decoder and the cache
+    """
+
+    def test_buffer(self):
+        body = load_data(os.path.join("json", "IGO_Members", "UN.json"))
+        # held in memory, and spilled to a memory-mapped file
+        for threshold in (len(body), len(body) // 4):
+            with ResponseBuffer(threshold) as f:
+                for i in range(0, len(body), 4096):
+                    f.write(body[i:i + 4096])
+                self.assertEqual(len(f), len(body))
+                self.assertEqual(f.mapped, threshold < len(body))
+                self.assertEqual(f.read(), body)
+                self.assertEqual(bytes(f.getbuffer()), body)
+                f.seek(0)
+                Entity.store.put("TestResponseBuffer", f)
+            self.assertEqual(Entity.store.get("TestResponseBuffer"),
+                             json.loads(to_unicode(body)))
+            Entity.store.delete("TestResponseBuffer")
+        pass  # void return
+
+    pass
+
+
+class TestJsonArrayReader(unittest.TestCase):
+    """
+    Incremental parser of array members of JSON objects
+    """
+
+    def test_chunks(self):
+        body = load_data(os.path.join("json", "IGO_Members", "UN.json"))
+        data = json.loads(to_unicode(body))
+        header = dict([(k, v) for k, v in data.items() if k != "rows"])
+        # values (and UTF-8 sequences) span across chunks of any size
+        for size in (1, 7, 4096, len(body)):
+            chunks = [body[i:i + size] for i in range(0, len(body), size)]
+            for f in (io.BytesIO(body), iter(chunks)):
+                reader = JsonArrayReader(f, size)
+                self.assertEqual(list(reader.iter_array("rows")),
+                                 data['rows'])
+                self.assertEqual(reader.members, header)
+        pass  # void return
+
+    def test_malformed(self):
+        for body in (b'{"rows": [[1, 2], [3, 4]', b'{"rows": [[1, 2]] [',
+                     b'{"rows": [[1, 2}]]}', b'{"rows": [1 2]}', b'{"a": 1,}',
+                     b'{"rows": []} []', b'[]'):
+            for size in (1, len(body)):
+                reader = JsonArrayReader(io.BytesIO(body), size)
+                self.assertRaises(ValueError, list, reader.iter_array("rows"))
+        pass  # void return
+
+    pass
+
+
+class TestJsonCodec(unittest.TestCase):
+    """
+    JSON codecs of bytes-like objects
+    """
+
+    def test_codecs(self):
+        body = load_data(os.path.join("json", "IGO_Members", "UN.json"))
+        data = json.loads(to_unicode(body))
+        for name in list(JSON_CODECS) + ["auto"]:
+            codec = json_codec(name)
+            for raw in (body, bytearray(body), memoryview(body)):
+                self.assertEqual(codec.loads(raw), data)
+            self.assertTrue(isinstance(codec.dumps(data), bytes))
+            self.assertEqual(codec.loads(codec.dumps(data)), data)
+        self.assertRaises(AssertionError, json_codec, "unknown")
+        pass  # void return
+
+    pass
+
+
+@unittest.skipIf(aio is None, "asyncio front-end requires Python 3.6+")
+class TestAsync(unittest.TestCase):
+    """
+    Awaitable entity accessors (offline)
+    """
+
+    def run_until_complete(self, coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+        pass
+
+    def test_service(self):
+        http = Entity.service.http
+        adapter = http.get_adapter("https://")
+        service = AsyncDataGatorService(Entity.service, 2)
+        try:
+            # blocking requests of the front-end are issued in its own
+            # session, while that of `Entity.service` is left intact
+            self.assertFalse(service.http is http)
+            self.assertTrue(http.get_adapter("https://") is adapter)
+            self.assertEqual(service.http.auth, http.auth)
+            # and its connection pool blocks (at its size) for either scheme
+            for prefix in ("http://", "https://"):
+                bounded = service.http.get_adapter(prefix)
+                self.assertTrue(bounded._pool_block)
+                self.assertEqual(bounded._pool_maxsize, 2)
+            # the service outlives event loops
+            for i in range(2):
+                self.assertEqual(self.run_until_complete(
+                    service.run(sum, [1, 2, 3])), 6)
+        finally:
+            service.close()
+        pass  # void return
+
+    def test_walk(self):
+        fs = tempfile.mktemp(suffix=".sqlite3", dir=config.TEMP_DIR)
+        path = os.path.join(config.DATA_DIR, "json")
+        store, Entity.store = Entity.store, SqliteCache(fs, None)
+        host = environ.DATAGATOR_API_HOST
+        try:
+            seed_cache(Entity.store, path, "TestAsync")
+            # served from the local cache, i.e. with the backend unreachable
+            environ.DATAGATOR_API_HOST = "127.0.0.1:9"
+            repo = Repo("TestAsync")
+            datasets = self.run_until_complete(aio.walk(repo))
+            self.assertEqual(sorted([ds.name for ds in datasets]),
+                             sorted(list(repo)))
+            ds = [ds for ds in datasets if ds.name == "IGO_Members"][0]
+            item = self.run_until_complete(aio.getitem(ds, "UN"))
+            self.assertEqual(item.cache, json.loads(to_unicode(load_data(
+                os.path.join("json", "IGO_Members", "UN.json")))))
+            data = self.run_until_complete(aio.fetch_many([repo, ds]))
+            self.assertEqual(data, [repo.cache, ds.cache])
+        finally:
+            environ.DATAGATOR_API_HOST = host
+            Entity.store = store
+        pass  # void return
+
+    def test_backend(self):
+        server = Backend.start("TestAsync_backend")
+        shared, _aio._service = _aio._service, \
+            AsyncDataGatorService(Entity.service, 2)
+        urls = []
+        aio.service().http.request_hooks.append(
+            lambda method, url, r, elapsed: urls.append(url))
+        try:
+            repo = Repo("TestAsync_backend")
+            count = len(Backend.requests)
+            datasets = self.run_until_complete(aio.walk(repo))
+            self.assertEqual(sorted([ds.name for ds in datasets]),
+                             sorted(list(repo)))
+            self.assertTrue(all([ds.rev == 1 for ds in datasets]))
+            # all requests of the front-end are issued in its own session,
+            # whose (bounded) pool holds one connection per worker
+            self.assertEqual(len(urls), len(Backend.requests) - count)
+            self.assertTrue(len(urls) > len(datasets))
+            self.assertTrue(len(Backend.connections) <= 1 + 2)
+            ds = datasets[0]
+            uri = ds.uri
+            self.run_until_complete(aio.patch(ds, {"UN": None}))
+            self.assertEqual(Backend.requests[-1], ("PATCH", uri))
+            self.assertEqual(len(urls), len(Backend.requests) - count)
+        finally:
+            aio.service().close()
+            _aio._service = shared
+            Backend.stop(server)
+        pass  # void return
+
     pass
 
 